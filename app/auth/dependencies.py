@@ -1,24 +1,20 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
-import os
-
-SECRET_KEY = os.getenv("JWT_SECRET", "change_this_secret")
-ALGORITHM = "HS256"
+from app.auth.jwt_handler import verify_token
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+
+def get_token_claims(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """
-    Extrae y valida el JWT de la cabecera Authorization: Bearer <token>
+    Claims del JWT de la cabecera Authorization: Bearer <token>.
+    Usa la caché de tokens verificados y la lista de revocados (ver jwt_handler).
     """
-    token = credentials.credentials
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        role: str = payload.get("role")
-        if email is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
-        return {"email": email, "role": role}
-    except JWTError:
+    claims = verify_token(credentials.credentials)
+    if claims is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido")
+    return claims
+
+
+def get_current_user(claims: dict = Depends(get_token_claims)):
+    return {"email": claims["sub"], "role": claims.get("role")}
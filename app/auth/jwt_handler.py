@@ -1,13 +1,70 @@
+import hashlib
 import os
+import time
+import uuid
 from datetime import datetime, timedelta
-from jose import jwt
+from typing import Optional
+from jose import jwt, JWTError
+from app.auth.revocation import revocations
+from app.services.cache import TTLCache
 
 SECRET_KEY = os.getenv("JWT_SECRET", "change_this_secret")
 ALGORITHM = "HS256"
-TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 horas
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
 
-def create_access_token(data: dict):
+# Tokens ya verificados, por hash del token: cada entrada caduca cuando caduca el token
+_verified = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+
+def _create_token(data: dict, token_type: str, expires_delta: timedelta) -> str:
+    now = datetime.utcnow()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": now + expires_delta, "iat": now, "jti": uuid.uuid4().hex, "type": token_type})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def create_access_token(data: dict):
+    return _create_token(data, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+
+def create_refresh_token(data: dict):
+    return _create_token(data, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+
+def verify_token(token: str, token_type: str = "access") -> Optional[dict]:
+    """
+    Claims del token si es válido, del tipo pedido y no está revocado; None si no.
+    La firma se verifica una vez por token: después es una búsqueda en la caché
+    y en la lista de revocados.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = _verified.get(key)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        ttl = claims.get("exp", 0) - time.time()
+        if ttl <= 0 or not claims.get("sub"):
+            return None
+        _verified.set(key, claims, ttl=ttl)
+    # Los tokens emitidos antes de existir "type" eran de acceso
+    if claims.get("type", "access") != token_type or revocations.is_revoked(claims.get("jti")):
+        return None
+    return claims
+
+
+def revoke_token(claims: dict) -> bool:
+    """
+    Revoca el token de estos claims hasta su caducidad (logout o refresh ya usado).
+    Devuelve True solo si lo ha revocado esta llamada.
+    """
+    if not claims.get("jti"):
+        return False
+    return revocations.revoke(claims["jti"], datetime.utcfromtimestamp(claims["exp"]))
+
+
+def token_cache_stats() -> dict:
+    return {**_verified.stats(), **revocations.stats()}
@@ -0,0 +1,121 @@
+"""
+Hash y verificación de contraseñas con bcrypt.
+
+Un solo CryptContext para la API y la web. El coste se ajusta con
+BCRYPT_ROUNDS; como el contexto solo acepta ese coste, un hash creado con
+otro valor se regenera al iniciar sesión (verify_and_update).
+
+bcrypt consume ~250 ms de CPU por verificación con el coste por defecto: las
+versiones async lo ejecutan en un pool de procesos acotado
+(PASSWORD_HASH_WORKERS) para que un pico de inicios de sesión no bloquee el
+event loop ni compita por el GIL. Con PASSWORD_HASH_WORKERS=0 se usa un hilo.
+
+Este módulo no importa nada de la aplicación: los procesos del pool solo
+cargan passlib.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+BCRYPT_MAX_BYTES = 72  # bcrypt ignora lo que pase de 72 bytes
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _truncate(password) -> str:
+    # El límite es en bytes UTF-8, no en caracteres; un carácter cortado a medias se descarta
+    if isinstance(password, str):
+        password = password.encode("utf-8")
+    return password[:BCRYPT_MAX_BYTES].decode("utf-8", errors="ignore")
+
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(_truncate(password))
+
+
+def verify_and_update(password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+    """(válida, hash_nuevo): hash_nuevo no es None si el hash guardado usa otros parámetros."""
+    try:
+        return pwd_context.verify_and_update(_truncate(password), password_hash)
+    except (ValueError, TypeError):
+        # Hash vacío o con formato desconocido
+        return False, None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PASSWORD_HASH_WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: los hijos no heredan hilos ni conexiones del proceso web (y funciona igual en Windows)
+                _pool = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def _run(func, *args):
+    pool = _get_pool()
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # Un proceso murió (p. ej. por memoria): se descarta el pool, se recrea en la
+        # siguiente llamada y esta se resuelve en un hilo
+        _discard_pool(pool)
+        return await asyncio.to_thread(func, *args)
+
+
+async def ahash_password(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def averify_and_update(password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+    return await _run(verify_and_update, password, password_hash)
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up_pool():
+    """Arranca los procesos del pool para que el primer login no pague el arranque."""
+    pool = _get_pool()
+    if pool is None:
+        return
+    try:
+        for future in [pool.submit(_truncate, "") for _ in range(PASSWORD_HASH_WORKERS)]:
+            future.result()
+    except BrokenProcessPool:
+        _discard_pool(pool)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,95 @@
+"""
+Lista de JWT revocados.
+
+La comprobación en cada petición es una búsqueda en un dict en memoria. La
+tabla revoked_token es la fuente de verdad compartida entre procesos: cada
+REVOCATION_SYNC_INTERVAL segundos se recargan los revocados que aún no han
+caducado y se borran las filas caducadas. Un logout hecho en otro proceso
+tarda como mucho ese intervalo en aplicarse aquí; en el propio proceso es
+inmediato.
+"""
+import asyncio
+import os
+import threading
+from datetime import datetime
+from traceback import print_exc
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import RevokedToken
+
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "30"))  # segundos
+
+
+class RevocationList:
+    def __init__(self):
+        self._revoked: dict[str, datetime] = {}  # jti -> caducidad del token
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        return jti is not None and jti in self._revoked
+
+    def revoke(self, jti: str, expires_at: datetime) -> bool:
+        """
+        Revoca el token hasta expires_at (en memoria al momento y en la base para
+        el resto de procesos). Devuelve False si ya estaba revocado: la clave
+        única de la tabla decide entre peticiones y procesos concurrentes.
+        """
+        with self._lock:
+            self._revoked[jti] = expires_at
+        with Session(engine) as session:
+            session.add(RevokedToken(jti=jti, expires_at=expires_at))
+            try:
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                return False
+        return True
+
+    def sync(self):
+        """Recarga los revocados vigentes desde la base y purga los caducados."""
+        now = datetime.utcnow()
+        with Session(engine) as session:
+            session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            session.commit()
+            rows = session.exec(select(RevokedToken.jti, RevokedToken.expires_at)
+                                .where(RevokedToken.expires_at > now)).all()
+        with self._lock:
+            # Se conservan los revocados localmente por si la base aún no los refleja
+            local = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            self._revoked = {**local, **dict(rows)}
+
+    def stats(self) -> dict:
+        return {"revoked": len(self._revoked)}
+
+    async def _run(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception:
+                print("ERROR SINCRONIZANDO TOKENS REVOCADOS")
+                print_exc()
+
+    def start(self, interval: float = REVOCATION_SYNC_INTERVAL):
+        """Carga inicial y sincronización periódica (llamar desde el startup)."""
+        self.sync()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+revocations = RevocationList()
@@ -0,0 +1,57 @@
+import asyncio
+import os
+from typing import Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.auth.passwords import averify_and_update
+from app.database import engine
+from app.models import User
+from app.services.cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # segundos
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1000"))
+
+# Usuarios por email: en un pico de logins la mayoría repite la misma consulta
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def get_user_by_email(email: str) -> Optional[User]:
+    """Usuario por email, cacheado USER_CACHE_TTL segundos (los que no existen no se cachean)."""
+    user = _users.get(email)
+    if user is not None:
+        return user
+    with Session(engine) as session:
+        user = session.exec(select(User).where(User.email == email)).first()
+    if user is not None:
+        _users.set(email, user)
+    return user
+
+
+def invalidate_user(email: str):
+    """Llamar tras crear, borrar o cambiar un usuario."""
+    _users.delete(email)
+
+
+def _store_rehash(user: User, new_hash: str):
+    with Session(engine) as session:
+        session.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+        session.commit()
+    invalidate_user(user.email)
+
+
+async def authenticate(email: str, password: str) -> Optional[User]:
+    """
+    Devuelve el usuario si la contraseña es correcta. bcrypt corre fuera del
+    event loop; si el hash usa otro coste que BCRYPT_ROUNDS se guarda el nuevo.
+    """
+    user = _users.get(email) or await asyncio.to_thread(get_user_by_email, email)
+    if user is None:
+        return None
+    valid, new_hash = await averify_and_update(password, user.password_hash)
+    if not valid:
+        return None
+    if new_hash:
+        await asyncio.to_thread(_store_rehash, user, new_hash)
+    return user
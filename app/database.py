@@ -1,7 +1,95 @@
-from sqlmodel import SQLModel, create_engine
+import os
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlmodel import create_engine
+from app.services.metrics import Histogram
 
-DATABASE_URL = "sqlite:///./dev.db"
-engine = create_engine(DATABASE_URL, echo=True)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+
+# Pool de conexiones (PostgreSQL y SQLite en fichero)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos; por debajo del idle timeout del servidor
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Pragmas de SQLite
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Tiempo de ejecución de las sentencias SQL",
+                             ("operation",))
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+
+def _sqlite_pragmas(in_memory: bool):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            # WAL: los lectores no bloquean al escritor (webhook, outbox y log writer a la vez)
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # negativo = KiB
+        cursor.close()
+    return on_connect
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop("query_start", None)
+    if start is None:
+        return
+    operation = statement.lstrip()[:6].upper()
+    DB_QUERY_SECONDS.observe(time.perf_counter() - start,
+                             operation=operation if operation in _OPERATIONS else "OTHER")
+
+
+def _instrument(engine: Engine) -> Engine:
+    """Tiempo de cada sentencia en db_query_duration_seconds (lo que tarda el driver, sin el ORM)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+def make_engine(url: str = DATABASE_URL, echo: bool = DB_ECHO) -> Engine:
+    """
+    Crea el engine según DATABASE_URL: SQLite con WAL y pragmas de rendimiento,
+    o cualquier otro backend (PostgreSQL) con un pool de conexiones ajustado.
+    """
+    backend = make_url(url).get_backend_name()
+
+    if backend == "sqlite":
+        database = make_url(url).database
+        in_memory = not database or database == ":memory:"
+        options = {"connect_args": {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}}
+        if not in_memory:
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+        sqlite_engine = create_engine(url, echo=echo, **options)
+        event.listen(sqlite_engine, "connect", _sqlite_pragmas(in_memory))
+        return _instrument(sqlite_engine)
+
+    return _instrument(create_engine(
+        url,
+        echo=echo,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    ))
+
+
+engine = make_engine()
 
 def init_db():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    # El esquema lo gestionan las migraciones versionadas (app/migrations.py)
+    from app.migrations import run_migrations
+    run_migrations(engine)
@@ -1,10 +1,22 @@
+import asyncio
 from fastapi import FastAPI
-from app.routes import webhook, tickets, auth, simulate_flow, logs, web
+from app.routes import webhook, tickets, auth, simulate_flow, logs, web, outbox
 from app.database import init_db
+from app.soap.client import get_client_stats, shutdown_executor
+from app.services.outbox import start_workers, stop_workers, outbox_stats
+from app.services.logger import log_writer
+from app.services.log_retention import start_retention, stop_retention
+from app.services.attachments import migrate_inline_attachments
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
+from app.services import metrics
+from app.services.events import bus
+from app.auth.passwords import warm_up_pool, shutdown_pool
+from app.auth.revocation import revocations
+from app.auth.jwt_handler import token_cache_stats
 
 app = FastAPI(title="Ticketing Adamo - Ibiocom")
+app.add_middleware(metrics.MetricsMiddleware)
 
 @app.get("/")
 def root():
@@ -12,17 +24,43 @@ def root():
     return RedirectResponse("/web/login")
 
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     init_db()
+    migrate_inline_attachments()
+    log_writer.start()
+    start_workers()
+    metrics.start_loop_monitor()
+    bus.start()
+    revocations.start()
+    start_retention()
+    await asyncio.to_thread(warm_up_pool)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    bus.close()
+    await metrics.stop_loop_monitor()
+    await revocations.stop()
+    await stop_retention()
+    await stop_workers()
+    shutdown_executor()
+    shutdown_pool()
+    log_writer.stop()
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "soap": get_client_stats(), "logs": log_writer.stats(), "outbox": outbox_stats(),
+            "auth": token_cache_stats(), "events": bus.stats()}
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Formato de texto de Prometheus: latencias por ruta, SOAP, BD, colas y event loop
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 app.include_router(auth.router)
 app.include_router(webhook.router)
 app.include_router(tickets.router)
 app.include_router(simulate_flow.router)
 app.include_router(logs.router)
+app.include_router(outbox.router)
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 app.include_router(web.router)
\ No newline at end of file
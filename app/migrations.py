@@ -0,0 +1,408 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración es una función que recibe una conexión abierta dentro de una
+transacción. Las aplicadas se guardan en la tabla schema_migrations; init_db()
+ejecuta las pendientes en orden al arrancar. Para cambiar el esquema se añade
+una función nueva al final de MIGRATIONS, nunca se edita una ya publicada.
+"""
+import json
+from datetime import datetime
+from sqlalchemy import DateTime, bindparam, inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+
+def _is_sqlite(conn: Connection) -> bool:
+    return conn.dialect.name == "sqlite"
+
+
+# Las migraciones usan DDL y SQL explícitos, nunca app.models: un modelo que
+# cambia después no debe cambiar lo que crea una migración ya publicada.
+# {id} y {ts} dependen del motor (ver _run_ddl).
+
+
+def _run_ddl(conn: Connection, statements: list[str]):
+    if _is_sqlite(conn):
+        types = {"id": "INTEGER NOT NULL PRIMARY KEY", "ts": "DATETIME"}
+    else:
+        types = {"id": "SERIAL PRIMARY KEY", "ts": "TIMESTAMP WITHOUT TIME ZONE"}
+    for ddl in statements:
+        conn.execute(text(ddl.format(**types)))
+
+
+# Esquema anterior a las migraciones
+BASELINE_DDL = [
+    """CREATE TABLE IF NOT EXISTS ticket (
+        id {id},
+        primary_key VARCHAR(50) NOT NULL,
+        mirror_key VARCHAR(50),
+        state VARCHAR(50),
+        dialog VARCHAR,
+        clearance_person VARCHAR(50),
+        ticket_type VARCHAR(50) NOT NULL,
+        created_at {ts} NOT NULL,
+        updated_at {ts} NOT NULL,
+        local_requests VARCHAR,
+        local_resolutions VARCHAR,
+        local_reports VARCHAR
+    )""",
+    """CREATE TABLE IF NOT EXISTS "user" (
+        id {id},
+        email VARCHAR NOT NULL,
+        password_hash VARCHAR NOT NULL,
+        role VARCHAR NOT NULL,
+        created_at {ts} NOT NULL
+    )""",
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_user_email ON "user" (email)',
+    """CREATE TABLE IF NOT EXISTS log (
+        id {id},
+        event_type VARCHAR(50) NOT NULL,
+        ticket_primary_key VARCHAR,
+        user_email VARCHAR,
+        direction VARCHAR,
+        payload VARCHAR,
+        status VARCHAR,
+        created_at {ts} NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS outboxmessage (
+        id {id},
+        idempotency_key VARCHAR(64) NOT NULL,
+        ticket_primary_key VARCHAR(50),
+        env VARCHAR(10) NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        payload VARCHAR NOT NULL,
+        status VARCHAR(20) NOT NULL,
+        attempts INTEGER NOT NULL,
+        next_attempt_at {ts} NOT NULL,
+        last_error VARCHAR,
+        created_at {ts} NOT NULL,
+        delivered_at {ts}
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_outboxmessage_idempotency_key ON outboxmessage (idempotency_key)",
+    "CREATE INDEX IF NOT EXISTS ix_outboxmessage_status ON outboxmessage (status)",
+    "CREATE INDEX IF NOT EXISTS ix_outboxmessage_ticket_primary_key ON outboxmessage (ticket_primary_key)",
+    """CREATE TABLE IF NOT EXISTS attachment (
+        id {id},
+        sha256 VARCHAR(64) NOT NULL,
+        size INTEGER NOT NULL,
+        content_type VARCHAR(100) NOT NULL,
+        filename VARCHAR,
+        created_at {ts} NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_attachment_sha256 ON attachment (sha256)",
+]
+
+
+def baseline(conn: Connection):
+    """Tablas que existían antes de las migraciones (en bases ya creadas no hace nada)."""
+    _run_ddl(conn, BASELINE_DDL)
+
+
+def ticket_lookup_indexes(conn: Connection):
+    """
+    primary_key único: el webhook y handle_incoming_ticket buscan por él en cada
+    notificación y sin restricción dos webhooks simultáneos creaban duplicados.
+    Antes de crear el índice se conserva el ticket actualizado más recientemente
+    de cada primary_key; los demás se copian enteros al log
+    (migration_duplicate_ticket) antes de borrarlos.
+    """
+    duplicates = conn.execute(text(
+        "SELECT * FROM ticket WHERE primary_key IN "
+        "(SELECT primary_key FROM ticket GROUP BY primary_key HAVING COUNT(*) > 1) "
+        "ORDER BY primary_key, updated_at DESC, id DESC"
+    )).mappings().all()
+    kept = {}
+    removed = []
+    for row in duplicates:
+        if row["primary_key"] not in kept:
+            kept[row["primary_key"]] = row["id"]
+            continue
+        removed.append(row)
+        conn.execute(text(
+            "INSERT INTO log (event_type, ticket_primary_key, direction, payload, status, created_at) "
+            "VALUES ('migration_duplicate_ticket', :primary_key, 'in', :payload, 'warning', :now)"
+        ), {
+            "primary_key": row["primary_key"],
+            "payload": json.dumps({"kept_id": kept[row["primary_key"]], "removed": dict(row)},
+                                  ensure_ascii=False, default=str),
+            "now": datetime.utcnow(),
+        })
+    if removed:
+        conn.execute(text("DELETE FROM ticket WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                     {"ids": [row["id"] for row in removed]})
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ix_ticket_primary_key ON ticket (primary_key)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ticket_created_at ON ticket (created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ticket_state_type ON ticket (state, ticket_type)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ticket_state_created ON ticket (state, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ticket_type_created ON ticket (ticket_type, created_at)"))
+
+
+def log_indexes(conn: Connection):
+    """Las páginas de logs ordenan por created_at y filtran por ticket."""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_created_at ON log (created_at)"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_log_ticket_created ON log (ticket_primary_key, created_at)"
+    ))
+
+
+TICKET_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_ai AFTER INSERT ON ticket BEGIN
+        INSERT INTO ticket_fts(rowid, primary_key, mirror_key, dialog)
+        VALUES (new.id, new.primary_key, new.mirror_key, new.dialog);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_ad AFTER DELETE ON ticket BEGIN
+        INSERT INTO ticket_fts(ticket_fts, rowid, primary_key, mirror_key, dialog)
+        VALUES ('delete', old.id, old.primary_key, old.mirror_key, old.dialog);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS ticket_fts_au AFTER UPDATE OF primary_key, mirror_key, dialog ON ticket BEGIN
+        INSERT INTO ticket_fts(ticket_fts, rowid, primary_key, mirror_key, dialog)
+        VALUES ('delete', old.id, old.primary_key, old.mirror_key, old.dialog);
+        INSERT INTO ticket_fts(rowid, primary_key, mirror_key, dialog)
+        VALUES (new.id, new.primary_key, new.mirror_key, new.dialog);
+    END""",
+]
+
+
+def ticket_fts(conn: Connection):
+    """Índice FTS5 para la búsqueda del listado web (solo SQLite con FTS5)."""
+    if not _is_sqlite(conn):
+        return
+    if not conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar():
+        return
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'ticket_fts'")).first()
+    if not exists:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE ticket_fts USING fts5("
+            "primary_key, mirror_key, dialog, content='ticket', content_rowid='id')"
+        ))
+        conn.execute(text("INSERT INTO ticket_fts(ticket_fts) VALUES ('rebuild')"))
+    for ddl in TICKET_FTS_TRIGGERS:
+        conn.execute(text(ddl))
+
+
+# Columnas JSON del historial antiguo y el tipo de evento de cada una
+LEGACY_HISTORY_COLUMNS = {
+    "local_requests": "request_info",
+    "local_resolutions": "propose_resolution",
+    "local_reports": "send_report",
+}
+
+
+def _legacy_events(ticket_id: int, column: str, raw: str, default_time: datetime) -> list[dict]:
+    try:
+        records = json.loads(raw)
+    except (TypeError, ValueError):
+        return []
+    events = []
+    for record in records if isinstance(records, list) else []:
+        try:
+            created_at = datetime.strptime(record.get("timestamp") or "", "%Y-%m-%d %H:%M")
+        except ValueError:
+            created_at = default_time
+        events.append({
+            "ticket_id": ticket_id,
+            "event_type": LEGACY_HISTORY_COLUMNS[column],
+            "dialog": record.get("dialog"),
+            "raw_resolution": record.get("raw_resolution"),
+            "attachments": json.dumps(record.get("attachments") or []),
+            "created_at": created_at,
+        })
+    return events
+
+
+TICKET_EVENT_DDL = [
+    """CREATE TABLE IF NOT EXISTS ticket_event (
+        id {id},
+        ticket_id INTEGER NOT NULL REFERENCES ticket (id),
+        event_type VARCHAR(30) NOT NULL,
+        dialog VARCHAR,
+        raw_resolution VARCHAR,
+        attachments VARCHAR,
+        user_email VARCHAR,
+        created_at {ts} NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_ticket_event_ticket_id ON ticket_event (ticket_id, id)",
+]
+
+_INSERT_LEGACY_EVENT = text(
+    "INSERT INTO ticket_event (ticket_id, event_type, dialog, raw_resolution, attachments, created_at) "
+    "VALUES (:ticket_id, :event_type, :dialog, :raw_resolution, :attachments, :created_at)"
+).bindparams(bindparam("created_at", type_=DateTime))
+
+
+def ticket_events(conn: Connection):
+    """
+    Historial de acciones en la tabla ticket_event (solo inserciones). Los
+    registros de las columnas JSON local_* pasan a filas en orden cronológico
+    y después se eliminan las columnas.
+    """
+    _run_ddl(conn, TICKET_EVENT_DDL)
+    existing = {column["name"] for column in inspect(conn).get_columns("ticket")}
+    legacy = [column for column in LEGACY_HISTORY_COLUMNS if column in existing]
+    if not legacy:
+        return
+
+    rows = conn.execute(
+        text(f"SELECT id, updated_at, {', '.join(legacy)} FROM ticket WHERE "
+             + " OR ".join(f"{column} IS NOT NULL" for column in legacy))
+        .columns(updated_at=DateTime)
+    ).mappings().all()
+    for row in rows:
+        events = []
+        for column in legacy:
+            if row[column]:
+                events.extend(_legacy_events(row["id"], column, row[column], row["updated_at"] or datetime.utcnow()))
+        if events:
+            events.sort(key=lambda event: event["created_at"])
+            conn.execute(_INSERT_LEGACY_EVENT, events)
+
+    for column in legacy:
+        conn.execute(text(f"ALTER TABLE ticket DROP COLUMN {column}"))
+
+
+REVOKED_TOKEN_DDL = [
+    """CREATE TABLE IF NOT EXISTS revoked_token (
+        id {id},
+        jti VARCHAR(64) NOT NULL,
+        expires_at {ts} NOT NULL,
+        revoked_at {ts} NOT NULL
+    )""",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_revoked_token_jti ON revoked_token (jti)",
+    "CREATE INDEX IF NOT EXISTS ix_revoked_token_expires_at ON revoked_token (expires_at)",
+]
+
+
+def revoked_tokens(conn: Connection):
+    """Lista de JWT revocados (logout y rotación de refresh tokens)."""
+    _run_ddl(conn, REVOKED_TOKEN_DDL)
+
+
+def log_payload_compression(conn: Connection):
+    """
+    Payloads de log grandes comprimidos en payload_compressed. Las filas
+    existentes no se tocan aquí: las recomprime log_retention.compact_logs().
+    """
+    existing = {column["name"] for column in inspect(conn).get_columns("log")}
+    if "payload_compressed" not in existing:
+        blob = "BLOB" if _is_sqlite(conn) else "BYTEA"
+        conn.execute(text(f"ALTER TABLE log ADD COLUMN payload_compressed {blob}"))
+    if "payload_size" not in existing:
+        conn.execute(text("ALTER TABLE log ADD COLUMN payload_size INTEGER"))
+
+
+def log_filter_indexes(conn: Connection):
+    """
+    Filtros del listado de logs con paginación por (created_at, id): un índice
+    (columna, created_at) por filtro. En SQLite el id va implícito en cada
+    índice porque es el rowid.
+    """
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_event_type_created ON log (event_type, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_status_created ON log (status, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_direction_created ON log (direction, created_at)"))
+
+
+STATE_HISTORY_DDL = [
+    """CREATE TABLE IF NOT EXISTS ticket_state_change (
+        id {id},
+        ticket_id INTEGER NOT NULL REFERENCES ticket (id),
+        ticket_type VARCHAR(50) NOT NULL,
+        from_state VARCHAR(50),
+        to_state VARCHAR(50) NOT NULL,
+        seconds FLOAT,
+        source VARCHAR(20),
+        changed_at {ts} NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_ticket_state_change_ticket ON ticket_state_change (ticket_id, changed_at)",
+    "CREATE INDEX IF NOT EXISTS ix_ticket_state_change_changed ON ticket_state_change (changed_at)",
+    """CREATE TABLE IF NOT EXISTS ticket_state_time (
+        state VARCHAR(50) NOT NULL,
+        ticket_type VARCHAR(50) NOT NULL,
+        total_seconds FLOAT NOT NULL,
+        exits INTEGER NOT NULL,
+        PRIMARY KEY (state, ticket_type)
+    )""",
+]
+
+# Estados (TicketState) y etiquetas antiguas tal como estaban al publicar ticket_state_history
+STATE_NAMES = ("OPENQUEUED", "OPENACTIVE", "OPENHELD", "CLEARED", "CLOSED", "CANCELLED")
+LEGACY_STATE_LABELS = {"abierto": "OPENACTIVE", "proceso": "OPENHELD", "cerrado": "CLOSED"}
+
+
+def _normalized_state(value: str) -> str | None:
+    key = value.strip().replace("_", "").replace(" ", "").upper()
+    if key in STATE_NAMES:
+        return key
+    return LEGACY_STATE_LABELS.get(value.strip().lower())
+
+
+def ticket_state_history(conn: Connection):
+    """
+    Estados normalizados a TicketState, historial de cambios de estado y
+    tiempo acumulado por estado. Las etiquetas antiguas ("abierto", "cerrado",
+    "openActive"...) pasan a su TicketState; las que no se reconocen se dejan
+    como están. Cada ticket con estado empieza el historial con su estado
+    actual desde updated_at (el momento del cambio real no se conoce).
+    """
+    existing = {column["name"] for column in inspect(conn).get_columns("ticket")}
+    if "state_changed_at" not in existing:
+        conn.execute(text("ALTER TABLE ticket ADD COLUMN state_changed_at TIMESTAMP"))
+    _run_ddl(conn, STATE_HISTORY_DDL)
+
+    for (state,) in conn.execute(text("SELECT DISTINCT state FROM ticket WHERE state IS NOT NULL")).all():
+        normalized = _normalized_state(state)
+        if normalized and normalized != state:
+            conn.execute(text("UPDATE ticket SET state = :new WHERE state = :old"), {"new": normalized, "old": state})
+
+    conn.execute(text(
+        "UPDATE ticket SET state_changed_at = COALESCE(updated_at, created_at) "
+        "WHERE state IS NOT NULL AND state_changed_at IS NULL"
+    ))
+    conn.execute(text(
+        "INSERT INTO ticket_state_change (ticket_id, ticket_type, from_state, to_state, source, changed_at) "
+        "SELECT id, ticket_type, NULL, state, 'migration', state_changed_at FROM ticket "
+        "WHERE state IS NOT NULL AND id NOT IN (SELECT ticket_id FROM ticket_state_change)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ticket_state_changed ON ticket (state, state_changed_at)"))
+
+
+# (versión, nombre, función) en orden de aplicación
+MIGRATIONS = [
+    (1, "baseline", baseline),
+    (2, "ticket_lookup_indexes", ticket_lookup_indexes),
+    (3, "log_indexes", log_indexes),
+    (4, "ticket_fts", ticket_fts),
+    (5, "ticket_events", ticket_events),
+    (6, "revoked_tokens", revoked_tokens),
+    (7, "log_payload_compression", log_payload_compression),
+    (8, "log_filter_indexes", log_filter_indexes),
+    (9, "ticket_state_history", ticket_state_history),
+]
+
+
+def applied_versions(engine: Engine) -> set[int]:
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine: Engine, target: int | None = None) -> list[int]:
+    """
+    Aplica las migraciones pendientes (hasta target, si se indica), cada una en
+    su propia transacción. Devuelve las versiones aplicadas.
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, name, migration in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        with engine.begin() as conn:
+            migration(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()},
+            )
+        applied.append(version)
+    return applied
@@ -1,22 +1,77 @@
 from datetime import datetime
-from sqlmodel import SQLModel, Field, JSON
+from sqlmodel import SQLModel, Field, JSON, Index
 from typing import Optional
 
 class Ticket(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_ticket_state_type", "state", "ticket_type"),  # GROUP BY del dashboard
+        Index("ix_ticket_state_created", "state", "created_at"),  # listado filtrado por estado
+        Index("ix_ticket_type_created", "ticket_type", "created_at"),  # listado filtrado por tipo
+        Index("ix_ticket_state_changed", "state", "state_changed_at"),  # backlog: el más antiguo en cada estado
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    primary_key: str = Field(max_length=50)
+    primary_key: str = Field(max_length=50, unique=True, index=True)
     mirror_key: Optional[str] = Field(default=None, max_length=50)
-    state: Optional[str] = Field(default=None, max_length=50)
+    state: Optional[str] = Field(default=None, max_length=50)  # TicketState (app.services.ticket_states)
+    state_changed_at: Optional[datetime] = None  # desde cuándo está en el estado actual
     dialog: Optional[str] = None  # Datos de Adamo
     clearance_person: Optional[str] = Field(default="ibiocom", max_length=50)
     ticket_type: str = Field(default="ftth_cliente", max_length=50)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
-    # NUEVOS CAMPOS PARA DATOS ENVIADOS POR NOSOTROS
-    local_requests: Optional[str] = None  # JSON de request_info enviadas
-    local_resolutions: Optional[str] = None  # JSON de resolutions enviadas
-    local_reports: Optional[str] = None  # JSON de reportes enviados
+
+class TicketEvent(SQLModel, table=True):
+    """
+    Acción enviada por Ibiocom sobre un ticket (solicitud, resolución o reporte).
+    Solo se insertan filas: sustituye a los JSON local_requests/local_resolutions/local_reports.
+    """
+    __tablename__ = "ticket_event"
+    __table_args__ = (
+        Index("ix_ticket_event_ticket_id", "ticket_id", "id"),  # historial de un ticket, paginado por id
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ticket_id: int = Field(foreign_key="ticket.id")
+    event_type: str = Field(max_length=30)  # request_info, propose_resolution, send_report
+    dialog: Optional[str] = None
+    raw_resolution: Optional[str] = None  # Solo en propose_resolution
+    attachments: Optional[str] = None  # JSON con las referencias del almacén de adjuntos
+    user_email: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TicketStateChange(SQLModel, table=True):
+    """
+    Cambio de estado de un ticket (solo inserciones). seconds es el tiempo que
+    estuvo en from_state; None en el primer estado conocido.
+    """
+    __tablename__ = "ticket_state_change"
+    __table_args__ = (
+        Index("ix_ticket_state_change_ticket", "ticket_id", "changed_at"),  # historial de un ticket
+        Index("ix_ticket_state_change_changed", "changed_at"),  # informes por periodo
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ticket_id: int = Field(foreign_key="ticket.id")
+    ticket_type: str = Field(max_length=50)
+    from_state: Optional[str] = Field(default=None, max_length=50)
+    to_state: str = Field(max_length=50)
+    seconds: Optional[float] = None
+    source: Optional[str] = Field(default=None, max_length=20)  # webhook, simulate, migration
+    changed_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class TicketStateTime(SQLModel, table=True):
+    """Tiempo acumulado en cada estado por tipo de ticket: se suma cuando un ticket sale del estado."""
+    __tablename__ = "ticket_state_time"
+
+    state: str = Field(primary_key=True, max_length=50)
+    ticket_type: str = Field(primary_key=True, max_length=50)
+    total_seconds: float = Field(default=0)
+    exits: int = Field(default=0)  # veces que un ticket salió del estado
+
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -26,11 +81,55 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Log(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_log_ticket_created", "ticket_primary_key", "created_at"),  # logs de un ticket
+        Index("ix_log_event_type_created", "event_type", "created_at"),  # filtros del listado de logs
+        Index("ix_log_status_created", "status", "created_at"),
+        Index("ix_log_direction_created", "direction", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     event_type: str = Field(max_length=50)  # Ej: 'webhook_in', 'soap_out', 'user_action'
     ticket_primary_key: Optional[str] = None
     user_email: Optional[str] = None
     direction: Optional[str] = None  # 'in' o 'out'
-    payload: Optional[str] = None  # JSON serializado o texto
+    payload: Optional[str] = None  # JSON compacto o texto (None si está comprimido)
+    payload_compressed: Optional[bytes] = None  # payload grande comprimido con zlib
+    payload_size: Optional[int] = None  # bytes del payload sin comprimir
     status: Optional[str] = None  # success, error, pending
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class OutboxMessage(SQLModel, table=True):
+    """Mensaje pendiente de entregar a Adamo (outbox persistente)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    idempotency_key: str = Field(max_length=64, unique=True, index=True)
+    ticket_primary_key: Optional[str] = Field(default=None, max_length=50, index=True)
+    env: str = Field(default="PRE", max_length=10)
+    event_type: str = Field(max_length=50)  # Ej: 'ftth_send_report', 'retry'
+    payload: str  # JSON del mensaje SOAP
+    status: str = Field(default="pending", max_length=20, index=True)  # pending, sending, delivered, dead
+    attempts: int = Field(default=0)
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    delivered_at: Optional[datetime] = None
+
+
+class Attachment(SQLModel, table=True):
+    """Metadatos de un adjunto guardado en disco por su hash SHA-256 (sin duplicados)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    sha256: str = Field(max_length=64, unique=True, index=True)
+    size: int
+    content_type: str = Field(default="application/octet-stream", max_length=100)
+    filename: Optional[str] = None  # Nombre con el que se subió por primera vez
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class RevokedToken(SQLModel, table=True):
+    """JWT revocado (logout o refresh ya usado) hasta que caduque por sí mismo."""
+    __tablename__ = "revoked_token"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    jti: str = Field(max_length=64, unique=True, index=True)
+    expires_at: datetime = Field(index=True)  # pasada esta fecha el token ya no es válido y la fila sobra
+    revoked_at: datetime = Field(default_factory=datetime.utcnow)
@@ -1,57 +1,45 @@
-from fastapi import APIRouter, HTTPException
-from sqlmodel import Session, select
-from passlib.context import CryptContext
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import Session
 from app.database import engine
 from app.models import User
-from app.auth.jwt_handler import create_access_token  # ✅ import correcto
+from app.auth.jwt_handler import (create_access_token, create_refresh_token, verify_token, revoke_token,
+                                  ACCESS_TOKEN_EXPIRE_MINUTES)
+from app.auth.dependencies import get_token_claims
+from app.auth.passwords import ahash_password
+from app.auth.users import authenticate, get_user_by_email, invalidate_user
 from pydantic import BaseModel
 from traceback import print_exc
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
 
-# Contexto de contraseñas con bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-
-# ✅ Funciones auxiliares
-def get_password_hash(password: str):
-    # Aseguramos que password es str y no bytes
-    if isinstance(password, bytes):
-        password = password.decode("utf-8")
-
-    # bcrypt no admite más de 72 bytes → truncamos por seguridad
-    password = password[:72]
-
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verifica si una contraseña coincide con su hash."""
-    try:
-        return pwd_context.verify(plain_password[:72], hashed_password)
-    except Exception:
-        return False
+def _create_user(email: str, password_hash: str, role: str) -> dict:
+    with Session(engine) as session:
+        new_user = User(email=email, password_hash=password_hash, role=role)
+        session.add(new_user)
+        session.commit()
+        session.refresh(new_user)
+    invalidate_user(email)
+    return {"id": new_user.id, "email": new_user.email, "role": new_user.role}
 
 
 # ✅ Endpoint de registro (query params o Swagger UI)
 @router.post("/register")
-def register_user(email: str, password: str, role: str = "tecnico"):
+async def register_user(email: str, password: str, role: str = "tecnico"):
     print(f"ENTRAMOS EN REGISTER | email={email}, role={role}")
 
     try:
-        with Session(engine) as session:
-            existing = session.exec(select(User).where(User.email == email)).first()
-            if existing:
-                raise HTTPException(status_code=400, detail="Usuario ya existe")
-
-            hashed = get_password_hash(password)
-            new_user = User(email=email, password_hash=hashed, role=role)
-            session.add(new_user)
-            session.commit()
-            session.refresh(new_user)
+        if await asyncio.to_thread(get_user_by_email, email):
+            raise HTTPException(status_code=400, detail="Usuario ya existe")
 
-            return {"id": new_user.id, "email": new_user.email, "role": new_user.role}
+        # bcrypt en el pool de procesos: no bloquea el event loop
+        hashed = await ahash_password(password)
+        return await asyncio.to_thread(_create_user, email, hashed, role)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("ERROR REGISTRO USUARIO")
         print_exc()
@@ -64,15 +52,56 @@ class UserLogin(BaseModel):
     password: str
 
 
-# ✅ Endpoint de login
-@router.post("/login")
-def login(user: UserLogin):
-    with Session(engine) as session:
-        db_user = session.exec(select(User).where(User.email == user.email)).first()
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 
-        if not db_user or not verify_password(user.password, db_user.password_hash):
-            raise HTTPException(status_code=401, detail="Credenciales inválidas")
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
-        token = create_access_token({"sub": db_user.email, "role": db_user.role})
-        return {"access_token": token, "token_type": "bearer"}
 
+def _token_pair(email: str, role: str) -> dict:
+    claims = {"sub": email, "role": role}
+    return {
+        "access_token": create_access_token(claims),
+        "refresh_token": create_refresh_token(claims),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+# ✅ Endpoint de login
+@router.post("/login")
+async def login(user: UserLogin):
+    db_user = await authenticate(user.email, user.password)
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+
+    return _token_pair(db_user.email, db_user.role)
+
+
+# ✅ Renovación: el refresh token se usa una sola vez y se entrega uno nuevo
+@router.post("/refresh")
+def refresh(body: RefreshRequest):
+    claims = verify_token(body.refresh_token, token_type="refresh")
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Refresh token inválido")
+    db_user = get_user_by_email(claims["sub"])
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+
+    # La inserción en revoked_token es la que garantiza el uso único (también entre procesos)
+    if not revoke_token(claims):
+        raise HTTPException(status_code=401, detail="Refresh token ya utilizado")
+    return _token_pair(db_user.email, db_user.role)
+
+
+# ✅ Logout: revoca el access token usado y, si se envía, el refresh token
+@router.post("/logout")
+def logout(body: Optional[LogoutRequest] = None, claims: dict = Depends(get_token_claims)):
+    revoke_token(claims)
+    if body and body.refresh_token:
+        refresh_claims = verify_token(body.refresh_token, token_type="refresh")
+        if refresh_claims and refresh_claims["sub"] == claims["sub"]:
+            revoke_token(refresh_claims)
+    return {"status": "ok"}
@@ -1,24 +1,48 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
-from app.database import engine
-from app.models import Log
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
 from app.auth.dependencies import get_current_user
+from app.services.logger import read_payload
+from app.services.log_retention import size_report
+from app.services.log_search import search_logs, count_logs, get_log
+from app.services.ticket_search import parse_date_filter
 
 router = APIRouter(prefix="/logs", tags=["Logs"])
-templates = Jinja2Templates(directory="app/templates")
+
 
 @router.get("/", dependencies=[Depends(get_current_user)])
-def list_logs(request: Request, limit: int = 50, offset: int = 0):
-    with Session(engine) as session:
-        logs = session.exec(
-            select(Log)
-            .order_by(Log.created_at.desc())
-            .offset(offset)
-            .limit(limit)
-        ).all()
-    return templates.TemplateResponse(
-        "logs.html",
-        {"request": request, "logs": logs, "limit": limit, "offset": offset}
-    )
+def list_logs(event_type: Optional[str] = None, status: Optional[str] = None, direction: Optional[str] = None,
+              ticket_primary_key: Optional[str] = None, date_from: Optional[str] = None,
+              date_to: Optional[str] = None, cursor: Optional[str] = None, limit: int = 50):
+    """
+    Logs ordenados del más reciente al más antiguo, sin payload (ver /logs/{id}).
+    Para la página siguiente se pasa next_cursor como cursor. date_from/date_to
+    son un día (YYYY-MM-DD, date_to incluye el día entero) o una fecha y hora ISO.
+    """
+    try:
+        date_from, date_to = parse_date_filter(date_from), parse_date_filter(date_to)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date_from/date_to deben ser YYYY-MM-DD o fecha y hora ISO")
+    criteria = {"event_type": event_type, "status": status, "direction": direction,
+                "ticket_primary_key": ticket_primary_key, "date_from": date_from, "date_to": date_to}
+    logs, next_cursor = search_logs(cursor=cursor, limit=limit, **criteria)
+    total, total_exact = count_logs(**criteria)
+    return {
+        "items": [dict(log._mapping) for log in logs],
+        "next_cursor": next_cursor,
+        "total": total,
+        "total_exact": total_exact,
+    }
+
+
+@router.get("/size-report", dependencies=[Depends(get_current_user)])
+def logs_size_report():
+    """Bytes de payload por event_type (sin comprimir y guardados)."""
+    return size_report()
+
 
+@router.get("/{log_id}", dependencies=[Depends(get_current_user)])
+def get_log_detail(log_id: int):
+    log = get_log(log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Log no encontrado")
+    return {**log.model_dump(exclude={"payload", "payload_compressed"}), "payload": read_payload(log)}
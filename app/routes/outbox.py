@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Optional
+from app.auth.dependencies import get_current_user
+from app.services.outbox import get_message, list_messages, requeue
+
+router = APIRouter(prefix="/outbox", tags=["Outbox"])
+
+@router.get("/")
+def list_deliveries(status: Optional[str] = None, limit: int = 50, offset: int = 0, user=Depends(get_current_user)):
+    """
+    Lista mensajes del outbox. status=dead devuelve la cola de mensajes muertos.
+    """
+    return list_messages(status, limit, offset)
+
+@router.get("/{delivery_id}")
+def get_delivery(delivery_id: int, user=Depends(get_current_user)):
+    """
+    Estado de entrega de un mensaje a Adamo.
+    """
+    message = get_message(delivery_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Entrega no encontrada")
+    return message
+
+@router.post("/{delivery_id}/requeue")
+def requeue_delivery(delivery_id: int, user=Depends(get_current_user)):
+    """
+    Vuelve a encolar un mensaje muerto.
+    """
+    message = requeue(delivery_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Entrega no encontrada")
+    return {"status": message.status, "delivery_id": message.id}
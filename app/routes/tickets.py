@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File, Form, Header
+from typing import List, Optional
+from datetime import datetime
 from sqlmodel import Session, select
 from app.database import engine
 from app.models import Ticket
 from app.auth.dependencies import get_current_user
-from app.soap.client import set_trouble_ticket_by_value
-from app.services.logger import log_event
+from app.services.outbox import enqueue, requeue
+from app.services.ticket_history import list_ticket_events, HISTORY_PAGE_SIZE
+from app.services.attachments import store_uploads
+from app.services.flows import FlowError, run_action
+from app.services.ticket_states import list_state_changes, state_report
 
 router = APIRouter(prefix="/tickets", tags=["Tickets"])
 
@@ -17,6 +22,14 @@ def list_tickets(limit: int = 50, offset: int = 0, user=Depends(get_current_user
         tickets = session.exec(select(Ticket).offset(offset).limit(limit)).all()
     return tickets
 
+@router.get("/states/report")
+def get_state_report(user=Depends(get_current_user)):
+    """
+    SLA y backlog por estado y tipo: tickets en cada estado, antigüedad del más
+    antiguo y tiempo medio de permanencia (segundos) de los que ya salieron.
+    """
+    return {"items": state_report()}
+
 @router.get("/{ticket_id}")
 def get_ticket(ticket_id: int, user=Depends(get_current_user)):
     """
@@ -28,10 +41,29 @@ def get_ticket(ticket_id: int, user=Depends(get_current_user)):
             raise HTTPException(status_code=404, detail="Ticket no encontrado")
     return ticket
 
+@router.get("/{ticket_id}/events")
+def get_ticket_events(ticket_id: int, before: Optional[int] = None, limit: int = HISTORY_PAGE_SIZE,
+                      user=Depends(get_current_user)):
+    """
+    Historial de acciones del ticket, de la más reciente a la más antigua.
+    Para la página siguiente se pasa before=next_before.
+    """
+    events, next_before = list_ticket_events(ticket_id, before, limit)
+    return {"events": events, "next_before": next_before}
+
+@router.get("/{ticket_id}/states")
+def get_ticket_states(ticket_id: int, user=Depends(get_current_user)):
+    """
+    Historial de estados del ticket, del más antiguo al más reciente.
+    seconds es el tiempo que estuvo en from_state.
+    """
+    return {"changes": list_state_changes(ticket_id)}
+
 @router.post("/{ticket_id}/retry")
 def retry_ticket(ticket_id: int, user=Depends(get_current_user)):
     """
     Reintenta enviar un ticket a Adamo si falló previamente.
+    El envío se encola en el outbox; si ya estaba en la cola de muertos se reactiva.
     """
     with Session(engine) as session:
         ticket = session.get(Ticket, ticket_id)
@@ -45,10 +77,66 @@ def retry_ticket(ticket_id: int, user=Depends(get_current_user)):
             "clearancePerson": "ibiocom",
         }
 
-        response = set_trouble_ticket_by_value(payload)
-        if response.get("error"):
-            log_event("retry_error", response, ticket.primary_key, direction="out", status="error")
-            raise HTTPException(status_code=500, detail=f"Error al reintentar con Adamo: {response['error']}")
+    message = enqueue("retry", payload)
+    if message.status == "dead":
+        message = requeue(message.id)
+
+    return {"status": "ok", "message": "Ticket encolado para envío a Adamo", "delivery_id": message.id,
+            "delivery_status": message.status}
+
+
+async def _ticket_action(ticket_id: int, action: str, values: dict, attachments: Optional[List[UploadFile]],
+                         idempotency_key: Optional[str], user: dict):
+    """Encola la acción con el flujo del tipo de ticket (ver app.services.flows) y la añade al historial."""
+    attachments_data = await store_uploads(attachments) if attachments else []
+    with Session(engine) as session:
+        ticket = session.get(Ticket, ticket_id)
+        if not ticket:
+            raise HTTPException(status_code=404, detail="Ticket no encontrado")
+        try:
+            result = run_action(session, ticket, action, values, attachments_data,
+                                idempotency_key=idempotency_key, user_email=user["email"])
+        except FlowError as exc:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+        session.commit()
+    return result
+
+@router.post("/{ticket_id}/request_info")
+async def api_request_info(ticket_id: int, dialog: str = Form(...), attachments: Optional[List[UploadFile]] = File(None),
+                           idempotency_key: Optional[str] = Header(None), user=Depends(get_current_user)):
+    """
+    Pide información adicional a Adamo (cualquier tipo de ticket).
+    """
+    return await _ticket_action(ticket_id, "request_info", {"dialog": dialog}, attachments, idempotency_key, user)
+
+@router.post("/{ticket_id}/propose_resolution")
+async def api_propose_resolution(ticket_id: int,
+                                 date_restore_service: datetime = Form(...),
+                                 raw_resolution: str = Form(...),
+                                 dialog: Optional[str] = Form(None),
+                                 certification: Optional[str] = Form(None),
+                                 department: Optional[str] = Form(None),
+                                 raw_real_tipification: Optional[str] = Form(None),
+                                 attachments: Optional[List[UploadFile]] = File(None),
+                                 idempotency_key: Optional[str] = Header(None),
+                                 user=Depends(get_current_user)):
+    """
+    Propone una resolución a Adamo (cualquier tipo de ticket).
+    """
+    values = {
+        "date_restore_service": date_restore_service,
+        "raw_resolution": raw_resolution,
+        "dialog": dialog,
+        "certification": certification,
+        "department": department,
+        "raw_real_tipification": raw_real_tipification,
+    }
+    return await _ticket_action(ticket_id, "propose_resolution", values, attachments, idempotency_key, user)
 
-        log_event("retry_success", response, ticket.primary_key, direction="out", status="success")
-        return {"status": "ok", "message": "Ticket enviado correctamente a Adamo", "response": response}
+@router.post("/{ticket_id}/send_report")
+async def api_send_report(ticket_id: int, dialog: str = Form(...), attachments: Optional[List[UploadFile]] = File(None),
+                          idempotency_key: Optional[str] = Header(None), user=Depends(get_current_user)):
+    """
+    Envía un reporte a Adamo (cualquier tipo de ticket).
+    """
+    return await _ticket_action(ticket_id, "send_report", {"dialog": dialog}, attachments, idempotency_key, user)
@@ -1,84 +1,85 @@
 from fastapi import APIRouter, Request, Form, UploadFile, File
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
+from sqlmodel import Session
 from app.database import engine
-from app.models import User, Ticket
-from passlib.context import CryptContext
+from app.models import Ticket
 import os
 from datetime import datetime
 from typing import List, Optional
-import json
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi import HTTPException
-import mimetypes
-import base64
-from sqlmodel import func
-
-# Flujos específicos
-from app.services.ftth_flow import (
-    request_additional_info as ftth_request_info,
-    propose_resolution as ftth_propose_resolution,
-    send_report as ftth_send_report
-)
-
-from app.services.ftth_masive_flow import (
-    request_additional_info as massive_request_info,
-    propose_resolution as massive_propose_resolution,
-    send_report as massive_send_report
-)
-
-from app.services.workflows_flow import (
-    request_additional_info as wf_request_info,
-    propose_resolution as wf_propose_resolution,
-    send_report as wf_send_report
-)
-
-from app.models import Log  # asegúrate de importar tu modelo Log
+import uuid
+from urllib.parse import urlencode
+
+from app.services.flows import FlowError, run_action
+from app.services.logger import format_payload
+from app.services.log_search import search_logs, count_logs, distinct_values, get_log
+from app.services.events import bus, stream
+from app.services.attachments import store_uploads, stream_to_file, get_attachment, blob_path
+from app.services.ticket_stats import get_ticket_stats, latest_tickets
+from app.services.ticket_search import parse_date_filter, search_tickets
+from app.services.ticket_history import list_ticket_events
+from app.services.ticket_states import STATE_LABELS, state_group, state_label
+from app.auth.users import authenticate
 
 router = APIRouter(prefix="/web", tags=["Web"])
 templates = Jinja2Templates(directory="app/templates")
+templates.env.filters["state_label"] = state_label
+templates.env.filters["state_group"] = state_group
 
 
 @router.get("/logs", response_class=HTMLResponse)
-def web_list_logs(request: Request, limit: int = 3, offset: int = 0):
+def web_list_logs(request: Request, event_type: Optional[str] = None, status: Optional[str] = None,
+                  direction: Optional[str] = None, ticket: Optional[str] = None,
+                  date_from: Optional[str] = None, date_to: Optional[str] = None,
+                  cursor: Optional[str] = None, limit: int = 50):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
-    with Session(engine) as session:
-        total_logs = session.exec(select(func.count(Log.id))).one()  # total de registros
-        logs = session.exec(
-            select(Log).order_by(Log.created_at.desc()).offset(offset).limit(limit)
-        ).all()
-
-    current_page = offset // limit + 1
-    total_pages = (total_logs + limit - 1) // limit  # ceil division
-
-    return templates.TemplateResponse(
-        "logs.html",
-        {
-            "request": request,
-            "logs": logs,
-            "limit": limit,
-            "offset": offset,
-            "current_user": SESSION_USER,
-            "current_page": current_page,
-            "total_pages": total_pages
-        }
-    )
+    date_from, date_from_value = form_date(date_from)
+    date_to, date_to_value = form_date(date_to)
+    criteria = {
+        "event_type": event_type or None,
+        "status": status or None,
+        "direction": direction or None,
+        "ticket_primary_key": ticket.strip() if ticket and ticket.strip() else None,
+        "date_from": date_from_value,
+        "date_to": date_to_value,
+    }
+    logs, next_cursor = search_logs(cursor=cursor, limit=limit, **criteria)
+    total, total_exact = count_logs(**criteria)
+    filters = {"event_type": event_type or "", "status": status or "", "direction": direction or "",
+               "ticket": ticket or "", "date_from": date_from or "", "date_to": date_to or "", "limit": limit}
 
+    return templates.TemplateResponse("logs.html", {
+        "request": request,
+        "logs": logs,
+        "filters": filters,
+        "query": urlencode({k: v for k, v in filters.items() if v}),
+        "next_cursor": next_cursor,
+        "is_first_page": not cursor,
+        "total": total,
+        "total_exact": total_exact,
+        "filtered": any(criteria.values()),
+        "event_types": distinct_values("event_type"),
+        "statuses": distinct_values("status"),
+        "current_user": SESSION_USER
+    })
 
-# Filtro personalizado Jinja para convertir strings JSON
-def fromjson(value):
-    if not value:
-        return []
-    try:
-        return json.loads(value)
-    except Exception:
-        return []
 
-templates.env.filters["fromjson"] = fromjson
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@router.get("/logs/{log_id}/payload", response_class=PlainTextResponse)
+def web_log_payload(log_id: int):
+    """Payload de un log, descomprimido e indentado; el listado lo pide al desplegar la fila"""
+    if not SESSION_USER:
+        raise HTTPException(status_code=401, detail="Sesión no iniciada")
+    log = get_log(log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Log no encontrado")
+    return PlainTextResponse(format_payload(log))
+
+# Cada formulario de acción lleva su propia clave: un doble envío no duplica el mensaje a Adamo
+templates.env.globals["new_idempotency_key"] = lambda: uuid.uuid4().hex
 SESSION_USER = None  # Sesión simple
 
 # ---------- LOGIN / LOGOUT ----------
@@ -88,13 +89,12 @@ def login_form(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @router.post("/login", response_class=HTMLResponse)
-def login_action(request: Request, email: str = Form(...), password: str = Form(...)):
+async def login_action(request: Request, email: str = Form(...), password: str = Form(...)):
     global SESSION_USER
-    with Session(engine) as session:
-        user = session.exec(select(User).where(User.email == email)).first()
-        if not user or not pwd_context.verify(password, user.password_hash):
-            return templates.TemplateResponse("login.html", {"request": request, "error": "Credenciales inválidas"})
-        SESSION_USER = user
+    user = await authenticate(email, password)
+    if not user:
+        return templates.TemplateResponse("login.html", {"request": request, "error": "Credenciales inválidas"})
+    SESSION_USER = user
     return RedirectResponse("/web/dashboard", status_code=302)
 
 @router.get("/logout")
@@ -104,6 +104,23 @@ def logout():
     return RedirectResponse("/web/login", status_code=302)
 
 
+# ---------- ACTUALIZACIONES EN VIVO ----------
+
+@router.get("/events")
+async def web_events(request: Request, topics: str = "ticket,log,stats"):
+    """
+    Server-Sent Events con los cambios de tickets, los logs nuevos y las
+    estadísticas del dashboard: las páginas aplican los cambios sin recargar.
+    El navegador reconecta solo y con Last-Event-ID recibe lo que se perdió.
+    """
+    if not SESSION_USER:
+        raise HTTPException(status_code=401, detail="Sesión no iniciada")
+    last_event_id = request.headers.get("last-event-id", "")
+    subscription = bus.subscribe(set(topics.split(",")), int(last_event_id) if last_event_id.isdigit() else None)
+    return StreamingResponse(stream(subscription, request.is_disconnected), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
 # ---------- DASHBOARD / LISTADO ----------
 
 @router.get("/dashboard", response_class=HTMLResponse)
@@ -111,40 +128,58 @@ def dashboard(request: Request):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
-    with Session(engine) as session:
-        tickets = session.exec(select(Ticket).order_by(Ticket.created_at.desc())).all()
+    ticket_stats = get_ticket_stats()
+    by_group = ticket_stats["by_group"]
 
     stats = {
-        "total": len(tickets),
-        "abierto": sum(1 for t in tickets if t.state == "abierto"),
-        "proceso": sum(1 for t in tickets if t.state == "proceso"),
-        "cerrado": sum(1 for t in tickets if t.state == "cerrado"),
+        "total": ticket_stats["total"],
+        "abierto": by_group["abierto"],
+        "proceso": by_group["proceso"],
+        "cerrado": by_group["cerrado"],
+        "by_type": ticket_stats["by_type"],
     }
 
-    new_tickets_count = sum(1 for t in tickets if t.state == "abierto")
-    latest_tickets = tickets[:5]
+    new_tickets_count = stats["abierto"]
 
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
         "current_user": SESSION_USER,
         "stats": stats,
-        "latest_tickets": latest_tickets,
+        "latest_tickets": latest_tickets(5),
         "new_tickets_count": new_tickets_count
     })
 
 
 @router.get("/tickets", response_class=HTMLResponse)
-def list_tickets(request: Request):
+def list_tickets(request: Request, state: Optional[str] = None, ticket_type: Optional[str] = None,
+                 date_from: Optional[str] = None, date_to: Optional[str] = None, q: Optional[str] = None,
+                 cursor: Optional[str] = None, limit: int = 50):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
-    with Session(engine) as session:
-        tickets = session.exec(select(Ticket).order_by(Ticket.created_at.desc())).all()
-        tickets_data = [ticket_to_dict(t) for t in tickets]
+    # Una fecha mal escrita en la URL no rompe el listado: el filtro se ignora
+    date_from, date_from_value = form_date(date_from)
+    date_to, date_to_value = form_date(date_to)
+    tickets, next_cursor = search_tickets(
+        state=state or None,
+        ticket_type=ticket_type or None,
+        date_from=date_from_value,
+        date_to=date_to_value,
+        q=q,
+        cursor=cursor,
+        limit=limit,
+    )
+    filters = {"state": state or "", "ticket_type": ticket_type or "", "date_from": date_from or "",
+               "date_to": date_to or "", "q": q or "", "limit": limit}
 
     return templates.TemplateResponse("tickets.html", {
         "request": request,
-        "tickets": tickets_data,
+        "tickets": tickets,
+        "filters": filters,
+        "states": [(state.value, label) for state, label in STATE_LABELS.items()],
+        "query": urlencode({k: v for k, v in filters.items() if v}),
+        "next_cursor": next_cursor,
+        "is_first_page": not cursor,
         "current_user": SESSION_USER
     })
 
@@ -152,7 +187,7 @@ def list_tickets(request: Request):
 # ---------- DETALLE DEL TICKET ----------
 
 @router.get("/tickets/{ticket_id}", response_class=HTMLResponse)
-def ticket_detail(request: Request, ticket_id: int, msg: Optional[str] = None):
+def ticket_detail(request: Request, ticket_id: int, msg: Optional[str] = None, before: Optional[int] = None):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
@@ -170,15 +205,38 @@ def ticket_detail(request: Request, ticket_id: int, msg: Optional[str] = None):
         "ticket": ticket_data,
         "current_user": SESSION_USER,
         "message": msg,
-        "message_type": "info"
+        "message_type": "info",
+        **history_context(ticket_id, before)
     })
 
+def _file_response(request: Request, path: str, etag: str, cache_control: str,
+                   media_type: Optional[str] = None, filename: Optional[str] = None):
+    """FileResponse con ETag propio y respuesta 304 si el navegador ya tiene el archivo (Range lo resuelve Starlette)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=304, headers={"etag": etag, "cache-control": cache_control})
+    return FileResponse(path, media_type=media_type, filename=filename, content_disposition_type="inline",
+                        headers={"etag": etag, "cache-control": cache_control})
+
 @router.get("/files/{ticket_id}/{filename}")
-def get_file(ticket_id: int, filename: str):
-    path = os.path.join("uploads", str(ticket_id), filename)
-    if not os.path.exists(path):
+def get_file(request: Request, ticket_id: int, filename: str):
+    path = os.path.join("uploads", str(ticket_id), os.path.basename(filename))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    stat = os.stat(path)
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    return _file_response(request, path, etag, "private, no-cache")
+
+@router.get("/attachments/{sha256}/{filename}")
+def get_attachment_file(request: Request, sha256: str, filename: str):
+    attachment = get_attachment(sha256)
+    if not attachment or not os.path.exists(blob_path(sha256)):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
-    return FileResponse(path)
+    # El contenido de un hash nunca cambia: el navegador puede guardarlo indefinidamente
+    return _file_response(request, blob_path(sha256), f'"{sha256}"', "private, max-age=31536000, immutable",
+                          media_type=attachment.content_type, filename=filename)
 
 # ---------- SUBIDA DE ARCHIVO ----------
 
@@ -189,15 +247,13 @@ async def upload_file(request: Request, ticket_id: int, file: UploadFile = File(
 
     # Carpeta específica del ticket
     upload_dir = os.path.join("uploads", str(ticket_id))
-    os.makedirs(upload_dir, exist_ok=True)
-    filepath = os.path.join(upload_dir, file.filename)
+    filename = os.path.basename(file.filename)
 
-    contents = await file.read()
-    with open(filepath, "wb") as f:
-        f.write(contents)
+    tmp_path, _, _ = await stream_to_file(file, upload_dir)
+    os.replace(tmp_path, os.path.join(upload_dir, filename))
 
     return RedirectResponse(
-        f"/web/tickets/{ticket_id}?msg=Archivo '{file.filename}' subido correctamente",
+        f"/web/tickets/{ticket_id}?msg=Archivo '{filename}' subido correctamente",
         status_code=302
     )
 
@@ -205,23 +261,21 @@ async def upload_file(request: Request, ticket_id: int, file: UploadFile = File(
 
 # ---------- UTILIDADES ----------
 
-def get_ticket_flow(ticket: Ticket):
-    tipo = getattr(ticket, "ticket_type", None)
-    if tipo == "ftth_masivo":
-        return massive_request_info, massive_propose_resolution, massive_send_report
-    elif tipo == "trabajos_programados":
-        return wf_request_info, wf_propose_resolution, wf_send_report
-    return ftth_request_info, ftth_propose_resolution, ftth_send_report
-
-def append_local_record(ticket: Ticket, field: str, record: dict):
-    existing_data = []
-    if getattr(ticket, field):
-        try:
-            existing_data = json.loads(getattr(ticket, field))
-        except Exception:
-            existing_data = []
-    existing_data.append(record)
-    setattr(ticket, field, json.dumps(existing_data))
+def form_date(value: Optional[str]):
+    """(texto, fecha) de un filtro de fecha del formulario; si no es válida, ("", None)."""
+    try:
+        parsed = parse_date_filter(value)
+    except ValueError:
+        return "", None
+    return (value or ""), parsed
+
+def history_context(ticket_id: int, before: Optional[int] = None) -> dict:
+    """Página del historial de acciones para ticket_detail.html"""
+    events, next_before = list_ticket_events(ticket_id, before)
+    return {"history": events, "history_next": next_before, "history_is_first_page": not before}
+
+def current_user_email() -> Optional[str]:
+    return SESSION_USER.email if SESSION_USER else None
 
 def ticket_to_dict(ticket: Ticket):
     """Convierte Ticket SQLModel a diccionario seguro para Jinja2"""
@@ -230,19 +284,17 @@ def ticket_to_dict(ticket: Ticket):
         "primary_key": ticket.primary_key,
         "ticket_type": ticket.ticket_type,
         "state": ticket.state,
+        "state_changed_at": ticket.state_changed_at,
         "created_at": ticket.created_at,
         "updated_at": ticket.updated_at,
-        "dialog": ticket.dialog,
-        "local_requests": ticket.local_requests,
-        "local_resolutions": ticket.local_resolutions,
-        "local_reports": ticket.local_reports
+        "dialog": ticket.dialog
     }
 
 def extract_message(result):
     """Extrae message y tipo para alertas"""
     if isinstance(result, dict):
         msg = result.get("message", "Operación realizada")
-        status = result.get("status", "info")
+        status = result.get("message_type") or result.get("status", "info")
     else:
         msg = str(result)
         status = "info"
@@ -257,16 +309,9 @@ def extract_message(result):
 
 # ---------- ENDPOINTS DE ACCIÓN ----------
 
-@router.post("/tickets/{ticket_id}/request_info", response_class=HTMLResponse)
-async def web_request_info(
-    request: Request,
-    ticket_id: int,
-    dialog: str = Form(...),
-    attachments: Optional[List[UploadFile]] = File(None)
-):
-    if not SESSION_USER:
-        return RedirectResponse("/web/login")
-
+async def run_ticket_action(request: Request, ticket_id: int, action: str, values: dict,
+                            attachments: Optional[List[UploadFile]], idempotency_key: Optional[str]):
+    """Encola la acción con el flujo del tipo de ticket, la añade al historial y pinta el detalle"""
     attachments_data = await prepare_attachments(attachments, ticket_id)
 
     with Session(engine) as session:
@@ -277,26 +322,38 @@ async def web_request_info(
                 {"request": request, "ticket": None, "message": "Ticket no encontrado", "message_type": "error"}
             )
 
-        request_func, _, _ = get_ticket_flow(ticket)
-        result = request_func(ticket, dialog, attachments_data)
-
-        record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "dialog": dialog,
-            "attachments": attachments_data
-        }
-        append_local_record(ticket, "local_requests", record)
-        session.add(ticket)
-        session.commit()
+        try:
+            result = run_action(session, ticket, action, values, attachments_data,
+                                idempotency_key=idempotency_key, user_email=current_user_email())
+        except FlowError as exc:
+            result = {"message": str(exc), "message_type": "error"}
+        else:
+            session.commit()
         ticket_data = ticket_to_dict(ticket)
 
     msg, msg_type = extract_message(result)
     return templates.TemplateResponse(
         "ticket_detail.html",
-        {"request": request, "ticket": ticket_data, "current_user": SESSION_USER, "message": msg, "message_type": msg_type}
+        {"request": request, "ticket": ticket_data, "current_user": SESSION_USER, "message": msg, "message_type": msg_type,
+         **history_context(ticket_id)}
     )
 
 
+@router.post("/tickets/{ticket_id}/request_info", response_class=HTMLResponse)
+async def web_request_info(
+    request: Request,
+    ticket_id: int,
+    dialog: str = Form(...),
+    attachments: Optional[List[UploadFile]] = File(None),
+    idempotency_key: Optional[str] = Form(None)
+):
+    if not SESSION_USER:
+        return RedirectResponse("/web/login")
+
+    return await run_ticket_action(request, ticket_id, "request_info", {"dialog": dialog},
+                                   attachments, idempotency_key)
+
+
 @router.post("/tickets/{ticket_id}/propose_resolution", response_class=HTMLResponse)
 async def web_propose_resolution(
     request: Request,
@@ -307,42 +364,21 @@ async def web_propose_resolution(
     certification: Optional[str] = Form(None),
     department: Optional[str] = Form(None),
     raw_real_tipification: Optional[str] = Form(None),
-    attachments: Optional[List[UploadFile]] = File(None)
+    attachments: Optional[List[UploadFile]] = File(None),
+    idempotency_key: Optional[str] = Form(None)
 ):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
-    attachments_data = await prepare_attachments(attachments, ticket_id)
-    date_obj = datetime.fromisoformat(date_restore_service)
-
-    with Session(engine) as session:
-        ticket = session.get(Ticket, ticket_id)
-        if not ticket:
-            return templates.TemplateResponse(
-                "ticket_detail.html",
-                {"request": request, "ticket": None, "message": "Ticket no encontrado", "message_type": "error"}
-            )
-
-        _, propose_func, _ = get_ticket_flow(ticket)
-        result = propose_func(ticket, date_obj, raw_resolution, dialog, attachments_data,
-                              certification, department, raw_real_tipification)
-
-        record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "raw_resolution": raw_resolution,
-            "dialog": dialog,
-            "attachments": attachments_data
-        }
-        append_local_record(ticket, "local_resolutions", record)
-        session.add(ticket)
-        session.commit()
-        ticket_data = ticket_to_dict(ticket)
-
-    msg, msg_type = extract_message(result)
-    return templates.TemplateResponse(
-        "ticket_detail.html",
-        {"request": request, "ticket": ticket_data, "current_user": SESSION_USER, "message": msg, "message_type": msg_type}
-    )
+    values = {
+        "date_restore_service": datetime.fromisoformat(date_restore_service),
+        "raw_resolution": raw_resolution,
+        "dialog": dialog,
+        "certification": certification,
+        "department": department,
+        "raw_real_tipification": raw_real_tipification,
+    }
+    return await run_ticket_action(request, ticket_id, "propose_resolution", values, attachments, idempotency_key)
 
 
 @router.post("/tickets/{ticket_id}/send_report", response_class=HTMLResponse)
@@ -350,39 +386,14 @@ async def web_send_report(
     request: Request,
     ticket_id: int,
     dialog: str = Form(...),
-    attachments: Optional[List[UploadFile]] = File(None)
+    attachments: Optional[List[UploadFile]] = File(None),
+    idempotency_key: Optional[str] = Form(None)
 ):
     if not SESSION_USER:
         return RedirectResponse("/web/login")
 
-    attachments_data = await prepare_attachments(attachments, ticket_id)
-
-    with Session(engine) as session:
-        ticket = session.get(Ticket, ticket_id)
-        if not ticket:
-            return templates.TemplateResponse(
-                "ticket_detail.html",
-                {"request": request, "ticket": None, "message": "Ticket no encontrado", "message_type": "error"}
-            )
-
-        _, _, send_func = get_ticket_flow(ticket)
-        result = send_func(ticket, dialog, attachments_data)
-
-        record = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-            "dialog": dialog,
-            "attachments": attachments_data
-        }
-        append_local_record(ticket, "local_reports", record)
-        session.add(ticket)
-        session.commit()
-        ticket_data = ticket_to_dict(ticket)
-
-    msg, msg_type = extract_message(result)
-    return templates.TemplateResponse(
-        "ticket_detail.html",
-        {"request": request, "ticket": ticket_data, "current_user": SESSION_USER, "message": msg, "message_type": msg_type}
-    )
+    return await run_ticket_action(request, ticket_id, "send_report", {"dialog": dialog},
+                                   attachments, idempotency_key)
 
 
 # ---------- HELPER: PREPARAR ADJUNTOS ----------
@@ -390,40 +401,11 @@ async def web_send_report(
 
 
 async def prepare_attachments(attachments: Optional[List[UploadFile]], ticket_id: Optional[int] = None):
-    """Convierte los UploadFile a dict con filename + contenido base64 + tipo MIME"""
+    """Guarda los UploadFile en el almacén de adjuntos y devuelve sus referencias (sin base64)"""
     if not attachments:
         return []
 
     if ticket_id is None:
         raise ValueError("ticket_id es requerido para guardar archivos")
 
-    files_data = []
-    upload_dir = os.path.join("uploads", str(ticket_id))
-    os.makedirs(upload_dir, exist_ok=True)
-
-    for f in attachments:
-        if not f.filename:
-            continue
-        content = await f.read()
-        filepath = os.path.join(upload_dir, f.filename)
-        with open(filepath, "wb") as file_out:
-            file_out.write(content)
-
-        mime_type, _ = mimetypes.guess_type(f.filename)
-        if mime_type is None:
-            mime_type = "application/octet-stream"
-
-        files_data.append({
-            "filename": f.filename,
-            "path": f"/web/files/{ticket_id}/{f.filename}",
-            "content": base64.b64encode(content).decode("utf-8"),
-            "content_type": mime_type
-        })
-
-    return files_data
-
-
-
-
-
-
+    return await store_uploads(attachments)
\ No newline at end of file
@@ -1,77 +1,229 @@
-from fastapi import APIRouter, Request, HTTPException
-from sqlmodel import Session, select
+import asyncio
+import hashlib
+import json
+import os
+from typing import Optional
+from fastapi import APIRouter, Query, Request, HTTPException
+from sqlmodel import Session
 from app.database import engine
-from app.models import Ticket
 from datetime import datetime
+from app.services.cache import TTLCache
 from app.services.logger import log_event
-from app.soap.client import set_trouble_ticket_by_value  # Nuestro cliente SOAP
+from app.services.outbox import add_many_to_outbox, add_to_outbox
+from app.services.ticket_flow import upsert_ticket, upsert_tickets, publish_ticket_change
+from app.services.ticket_stats import invalidate_ticket_stats
+
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "60"))  # segundos
+WEBHOOK_DEDUP_SIZE = int(os.getenv("WEBHOOK_DEDUP_SIZE", "10000"))
+WEBHOOK_BATCH_MAX_ITEMS = int(os.getenv("WEBHOOK_BATCH_MAX_ITEMS", "5000"))
 
 router = APIRouter()
 
-@router.post("/webhook/adamo")
-async def webhook_adamo(request: Request):
+# Última notificación procesada de cada ticket (primaryKey -> (hash del cuerpo,
+# respuesta)): los reintentos de Adamo con el mismo contenido se contestan sin
+# tocar la base de datos. Solo cuenta la última: A -> B -> A vuelve a aplicar A
+recent_notifications = TTLCache(WEBHOOK_DEDUP_SIZE, WEBHOOK_DEDUP_TTL)
+
+
+def _notification_hash(data: dict) -> str:
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def ingest_notification(data: dict) -> dict:
     """
-    Recibe notificaciones desde Adamo (OSS/J).
-    Guarda ticket localmente y envía feedback a Adamo.
+    Guarda el ticket (upsert) y encola el acuse para Adamo en la misma
+    transacción: no puede quedar un ticket guardado sin su acuse.
     """
-    data = await request.json()
-    primary_key = data.get("primaryKey")
-    if not primary_key:
-        raise HTTPException(status_code=400, detail="primaryKey es requerido")
-
     mirror_key = data.get("mirrorKey") or f"RED-{int(datetime.now().timestamp())}"
 
-    try:
-        with Session(engine) as session:
-            stmt = select(Ticket).where(Ticket.primary_key == primary_key)
-            existing = session.exec(stmt).first()
-
-            if existing:
-                # Actualizar ticket local
-                existing.state = data.get("baseTroubleTicketState") or existing.state
-                existing.dialog = data.get("dialog") or existing.dialog
-                existing.updated_at = datetime.utcnow()
-                session.add(existing)
-                session.commit()
-                session.refresh(existing)
-                ticket = existing
-            else:
-                # Crear nuevo ticket
-                ticket = Ticket(
-                    primary_key=primary_key,
-                    mirror_key=mirror_key,
-                    state=data.get("baseTroubleTicketState"),
-                    dialog=data.get("dialog"),
-                )
-                session.add(ticket)
-                session.commit()
-                session.refresh(ticket)
-
-        # Después de guardar localmente, enviamos a Adamo
-        payload = {
+    with Session(engine) as session:
+        ticket = upsert_ticket(
+            session,
+            data["primaryKey"],
+            mirror_key,
+            state=data.get("baseTroubleTicketState") or None,
+            dialog=data.get("dialog") or None,
+        )
+        ack = {
             "troubleTicketKey": {"primaryKey": ticket.primary_key, "mirrorKey": ticket.mirror_key},
             "baseTroubleTicketState": ticket.state,
             "dialog": ticket.dialog,
             "clearancePerson": "ibiocom",
         }
+        # El acuse lo entregan los workers del outbox (se les avisa al hacer
+        # commit): un fallo de Adamo se reintenta en vez de deshacer el ticket
+        message, _ = add_to_outbox(session, "webhook_ack", ack)
+        delivery_id = message.id
+        session.commit()
+    invalidate_ticket_stats()
+    publish_ticket_change(ticket)
+
+    log_event("webhook_in", data, ack["troubleTicketKey"]["primaryKey"], direction="in", status="success")
+    return {"status": "ok", "mirrorKey": ack["troubleTicketKey"]["mirrorKey"], "delivery_id": delivery_id}
+
+
+def _ack_payload(row) -> dict:
+    return {
+        "troubleTicketKey": {"primaryKey": row.primary_key, "mirrorKey": row.mirror_key},
+        "baseTroubleTicketState": row.state,
+        "dialog": row.dialog,
+        "clearancePerson": "ibiocom",
+    }
+
+
+def validate_notification(data) -> Optional[str]:
+    """Devuelve el motivo por el que una notificación no es válida, o None."""
+    if not isinstance(data, dict):
+        return "La notificación debe ser un objeto JSON"
+    primary_key = data.get("primaryKey")
+    if not isinstance(primary_key, str) or not primary_key.strip():
+        return "primaryKey es requerido"
+    if len(primary_key) > 50:
+        return "primaryKey supera los 50 caracteres"
+    for field in ("mirrorKey", "baseTroubleTicketState", "dialog"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f"{field} debe ser texto"
+    return None
+
+
+def ingest_notifications(notifications: list[dict], ticket_type: Optional[str] = None) -> list[dict]:
+    """
+    Versión por lotes de ingest_notification: todos los upserts y sus acuses
+    van en una sola transacción con executemany.
+    Devuelve la respuesta de cada notificación en el mismo orden.
+    """
+    default_mirror_key = f"RED-{int(datetime.now().timestamp())}"
+    items = [
+        {
+            "primary_key": data["primaryKey"],
+            "mirror_key": data.get("mirrorKey") or default_mirror_key,
+            "state": data.get("baseTroubleTicketState") or None,
+            "dialog": data.get("dialog") or None,
+        }
+        for data in notifications
+    ]
+
+    with Session(engine) as session:
+        rows = upsert_tickets(session, items, ticket_type)
+        add_many_to_outbox(session, "webhook_ack", [_ack_payload(row) for row in rows.values()])
+        session.commit()
+    invalidate_ticket_stats()
+    for row in rows.values():
+        publish_ticket_change(row)
+
+    for data in notifications:
+        log_event("webhook_in", data, data["primaryKey"], direction="in", status="success")
+    return [{"status": "ok", "mirrorKey": rows[item["primary_key"]].mirror_key} for item in items]
 
-        response = set_trouble_ticket_by_value(payload)
 
-        if response.get("error"):
-            # Rollback local si falla Adamo
-            with Session(engine) as session:
-                t = session.get(Ticket, ticket.id)
-                if t:
-                    session.delete(t)
-                    session.commit()
-            log_event("rollback", {"ticket_id": ticket.id, "response": response}, ticket.primary_key, direction="local", status="rolled_back")
-            raise HTTPException(status_code=500, detail=f"Error al enviar a Adamo: {response.get('error')}")
+class _InvalidLine:
+    """Marca una línea NDJSON que no se pudo decodificar."""
 
-        # Log de éxito
-        log_event("webhook_in", data, ticket.primary_key, direction="in", status="success")
-        return {"status": "ok", "mirrorKey": ticket.mirror_key}
 
+async def _read_batch(request: Request) -> list:
+    """
+    Lee el cuerpo como array JSON o como NDJSON (una notificación por línea,
+    procesado según llega). Las líneas que no son JSON quedan como
+    _InvalidLine para informar del error en su posición.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" not in content_type and "jsonlines" not in content_type:
+        try:
+            data = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="El cuerpo no es JSON válido")
+        if not isinstance(data, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un array de notificaciones o NDJSON")
+        if len(data) > WEBHOOK_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Máximo {WEBHOOK_BATCH_MAX_ITEMS} notificaciones por lote")
+        return data
+
+    notifications = []
+    buffer = b""
+
+    def parse(line: bytes):
+        if not line.strip():
+            return
+        if len(notifications) >= WEBHOOK_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Máximo {WEBHOOK_BATCH_MAX_ITEMS} notificaciones por lote")
+        try:
+            notifications.append(json.loads(line))
+        except ValueError:
+            notifications.append(_InvalidLine())
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            parse(line)
+    parse(buffer)
+    return notifications
+
+
+@router.post("/webhook/adamo")
+async def webhook_adamo(request: Request):
+    """
+    Recibe notificaciones desde Adamo (OSS/J).
+    Guarda ticket localmente y encola el feedback a Adamo.
+    """
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="El cuerpo no es JSON válido")
+    error = validate_notification(data)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+    primary_key = data["primaryKey"]
+
+    notification_hash = _notification_hash(data)
+    cached = recent_notifications.get(primary_key)
+    if cached is not None and cached[0] == notification_hash:
+        return {**cached[1], "duplicate": True}
+
+    try:
+        response = await asyncio.to_thread(ingest_notification, data)
     except Exception as e:
         log_event("webhook_error", str(e), primary_key, direction="in", status="error")
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+    recent_notifications.set(primary_key, (notification_hash, response))
+    return response
+
+
+@router.post("/webhook/adamo/batch")
+async def webhook_adamo_batch(request: Request, ticket_type: Optional[str] = Query(None)):
+    """
+    Recibe un lote de notificaciones de Adamo (array JSON o NDJSON), por ejemplo
+    en una avería masiva. Las válidas se guardan en una sola transacción; la
+    respuesta trae el resultado de cada notificación en el orden recibido.
+    """
+    notifications = await _read_batch(request)
+
+    results: list[Optional[dict]] = [None] * len(notifications)
+    valid = []
+    for index, data in enumerate(notifications):
+        error = "JSON inválido" if isinstance(data, _InvalidLine) else validate_notification(data)
+        if error:
+            results[index] = {"index": index, "status": "error", "detail": error}
+        else:
+            valid.append((index, data))
+
+    if valid:
+        try:
+            responses = await asyncio.to_thread(ingest_notifications, [data for _, data in valid], ticket_type)
+        except Exception as e:
+            log_event("webhook_error", str(e), direction="in", status="error")
+            raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+        for (index, data), response in zip(valid, responses):
+            # El lote cambia el ticket: la última notificación suelta ya no es la vigente
+            recent_notifications.delete(data["primaryKey"])
+            results[index] = {"index": index, "primaryKey": data["primaryKey"], **response}
+
+    return {
+        "status": "ok",
+        "received": len(notifications),
+        "accepted": len(valid),
+        "rejected": len(notifications) - len(valid),
+        "results": results,
+    }
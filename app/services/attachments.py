@@ -0,0 +1,200 @@
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+from typing import Iterator, List, Optional
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Attachment, TicketEvent
+from app.services.metrics import Counter
+
+ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", os.path.join("uploads", "blobs"))
+BASE64_CHUNK = 3 * 64 * 1024  # múltiplo de 3: cada trozo se codifica sin relleno intermedio
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_MAX_FILE_BYTES = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))
+
+# "in": subido o migrado al almacén; "out": codificado en base64 para un mensaje SOAP
+ATTACHMENT_BYTES = Counter("attachment_bytes_total", "Bytes de adjuntos procesados", ("direction",))
+
+
+def blob_path(sha256: str) -> str:
+    """Ruta en disco de un adjunto: uploads/blobs/ab/cd/abcd..."""
+    return os.path.join(ATTACHMENTS_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def attachment_ref(sha256: str, filename: str, content_type: str, size: int) -> dict:
+    """Referencia que se guarda en el historial del ticket y en el outbox (sin contenido)."""
+    return {
+        "sha256": sha256,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "path": f"/web/attachments/{sha256}/{quote(filename)}",
+    }
+
+
+def guess_content_type(filename: str) -> str:
+    mime_type, _ = mimetypes.guess_type(filename)
+    return mime_type or "application/octet-stream"
+
+
+def register_blob(sha256: str, size: int, content_type: str, filename: str):
+    """Crea la fila de metadatos si el contenido no existía ya."""
+    with Session(engine) as session:
+        if session.exec(select(Attachment.id).where(Attachment.sha256 == sha256)).first():
+            return
+        session.add(Attachment(sha256=sha256, size=size, content_type=content_type, filename=filename))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Mismo contenido subido a la vez desde otra petición
+            session.rollback()
+
+
+def store_bytes(content: bytes, filename: str, content_type: Optional[str] = None) -> dict:
+    """
+    Guarda el contenido en el almacén por hash y devuelve su referencia.
+    Si ya existía (en este u otro ticket) no se vuelve a escribir.
+    """
+    content_type = content_type or guess_content_type(filename)
+    sha256 = hashlib.sha256(content).hexdigest()
+    path = blob_path(sha256)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(content)
+        os.replace(tmp_path, path)
+
+    register_blob(sha256, len(content), content_type, filename)
+    ATTACHMENT_BYTES.inc(len(content), direction="in")
+    return attachment_ref(sha256, filename, content_type, len(content))
+
+
+async def stream_to_file(upload: UploadFile, dest_dir: str, max_bytes: int = UPLOAD_MAX_FILE_BYTES):
+    """
+    Copia el UploadFile por trozos a un temporal dentro de dest_dir sin bloquear el
+    event loop, calculando el SHA-256 mientras escribe. Devuelve (ruta_temporal, sha256, tamaño).
+    """
+    os.makedirs(dest_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir, suffix=".part")
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Los adjuntos superan el tamaño máximo permitido")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+async def store_upload(upload: UploadFile, max_bytes: int = UPLOAD_MAX_FILE_BYTES) -> dict:
+    """Guarda un UploadFile en el almacén por hash y devuelve su referencia."""
+    filename = os.path.basename(upload.filename)
+    tmp_path, sha256, size = await stream_to_file(upload, os.path.join(ATTACHMENTS_DIR, "tmp"), max_bytes)
+
+    path = blob_path(sha256)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+
+    content_type = guess_content_type(filename)
+    register_blob(sha256, size, content_type, filename)
+    ATTACHMENT_BYTES.inc(size, direction="in")
+    return attachment_ref(sha256, filename, content_type, size)
+
+
+async def store_uploads(uploads: Optional[List[UploadFile]]) -> List[dict]:
+    """
+    Guarda los UploadFile en el almacén y devuelve sus referencias.
+    Cada archivo está limitado a UPLOAD_MAX_FILE_BYTES y el conjunto a UPLOAD_MAX_REQUEST_BYTES.
+    """
+    refs = []
+    remaining = UPLOAD_MAX_REQUEST_BYTES
+    for f in uploads or []:
+        if not f.filename:
+            continue
+        ref = await store_upload(f, min(UPLOAD_MAX_FILE_BYTES, remaining))
+        remaining -= ref["size"]
+        refs.append(ref)
+    return refs
+
+
+def get_attachment(sha256: str) -> Optional[Attachment]:
+    with Session(engine) as session:
+        return session.exec(select(Attachment).where(Attachment.sha256 == sha256)).first()
+
+
+def iter_base64(sha256: str, chunk_size: int = BASE64_CHUNK) -> Iterator[str]:
+    """Codifica el adjunto en base64 por trozos, sin cargar el binario completo."""
+    with open(blob_path(sha256), "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            ATTACHMENT_BYTES.inc(len(chunk), direction="out")
+            yield base64.b64encode(chunk).decode("ascii")
+
+
+def materialize_attachments(payload: dict) -> dict:
+    """
+    Sustituye las referencias {"sha256": ...} de payload["attachments"] por su
+    contenido en base64. Solo se llama justo antes de construir el mensaje SOAP.
+    """
+    attachments = payload.get("attachments")
+    if not attachments:
+        return payload
+
+    materialized = []
+    for item in attachments:
+        if isinstance(item, dict) and item.get("sha256"):
+            sha256 = item["sha256"]
+            item = {k: v for k, v in item.items() if k not in ("sha256", "size")}
+            item["content"] = "".join(iter_base64(sha256))
+        materialized.append(item)
+    return {**payload, "attachments": materialized}
+
+
+def migrate_inline_attachments() -> int:
+    """
+    Mueve al almacén los adjuntos en base64 que quedaron dentro del historial de
+    acciones (ticket_event) y los sustituye por referencias. Devuelve cuántos movió.
+    """
+    migrated = 0
+    with Session(engine) as session:
+        events = session.exec(select(TicketEvent).where(TicketEvent.attachments.contains('"content"'))).all()
+        for event in events:
+            try:
+                attachments = json.loads(event.attachments)
+            except Exception:
+                continue
+            refs = []
+            for f in attachments:
+                if isinstance(f, dict) and f.get("content") and not f.get("sha256"):
+                    f = store_bytes(base64.b64decode(f["content"]), f.get("filename") or "adjunto",
+                                    f.get("content_type"))
+                    migrated += 1
+                refs.append(f)
+            event.attachments = json.dumps(refs)
+            session.add(event)
+        session.commit()
+    return migrated
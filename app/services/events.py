@@ -0,0 +1,212 @@
+"""
+Bus de eventos en memoria para las páginas web en vivo (Server-Sent Events).
+
+Publican la ingesta de webhooks y las acciones sobre tickets ("ticket"), el
+escritor de logs al guardar cada lote ("log") y las estadísticas del
+dashboard ("stats"). Cada navegador conectado a /web/events es una
+suscripción con su propia cola acotada.
+
+publish() se puede llamar desde cualquier hilo (los webhooks y el log writer
+no corren en el event loop): el reparto se hace siempre en el loop. Sin
+suscriptores no cuesta nada. Solo llega a los navegadores de este proceso;
+con varios workers cada uno tiene su bus.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from traceback import print_exc
+from typing import Any, Callable, Optional
+
+from app.services.metrics import Counter, Gauge
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "1000"))  # eventos pendientes por navegador
+EVENTS_REPLAY_SIZE = int(os.getenv("EVENTS_REPLAY_SIZE", "500"))  # para reanudar con Last-Event-ID
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))  # segundos entre comentarios keep-alive
+EVENTS_STATS_DEBOUNCE = float(os.getenv("EVENTS_STATS_DEBOUNCE", "1"))  # segundos
+# uvicorn espera a que terminen las respuestas abiertas antes de parar: cada stream se
+# corta pasado este tiempo y el navegador reconecta sin perder eventos (Last-Event-ID)
+EVENTS_MAX_STREAM_SECONDS = float(os.getenv("EVENTS_MAX_STREAM_SECONDS", "30"))
+
+TOPICS = ("ticket", "log", "stats")
+
+EVENTS_PUBLISHED = Counter("events_published_total", "Eventos publicados en el bus", ("topic",))
+EVENTS_DROPPED = Counter("events_dropped_total", "Suscripciones desbordadas (el navegador recarga)")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class Event:
+    __slots__ = ("id", "topic", "data")
+
+    def __init__(self, event_id: int, topic: str, data: Any):
+        self.id = event_id
+        self.topic = topic
+        self.data = data
+
+    def encode(self) -> str:
+        """Formato text/event-stream."""
+        data = json.dumps(self.data, ensure_ascii=False, default=_default)
+        if not self.id:
+            return f"event: {self.topic}\ndata: {data}\n\n"  # "reset" no cambia el Last-Event-ID
+        return f"id: {self.id}\nevent: {self.topic}\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, topics: set[str], maxsize: int = EVENTS_QUEUE_SIZE):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def push(self, event: Optional[Event]):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # El navegador no lee al ritmo de los eventos: se descarta lo pendiente
+            # y se le pide que recargue la página
+            EVENTS_DROPPED.inc()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(Event(0, "reset", {}))
+
+    async def get(self) -> Optional[Event]:
+        return await self.queue.get()
+
+
+class EventBus:
+    def __init__(self, replay_size: int = EVENTS_REPLAY_SIZE):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscriptions: set[Subscription] = set()
+        self._topic_counts = {topic: 0 for topic in TOPICS}
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._replay: deque[Event] = deque(maxlen=replay_size)
+        self._debounced: dict[str, asyncio.TimerHandle] = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Fija el event loop donde se reparten los eventos (llamar desde el startup)."""
+        self._loop = asyncio.get_running_loop()
+
+    def has_subscribers(self, topic: str) -> bool:
+        return self._topic_counts.get(topic, 0) > 0
+
+    def publish(self, topic: str, data: Any):
+        """Publica un evento. Seguro desde cualquier hilo; no hace nada si nadie escucha el tema."""
+        if self._loop is None or not self.has_subscribers(topic):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, topic, data)
+        except RuntimeError:
+            pass  # el loop ya se cerró (parada de la aplicación)
+
+    def publish_debounced(self, topic: str, producer: Callable[[], Any], delay: float = EVENTS_STATS_DEBOUNCE):
+        """
+        Publica producer() como mucho una vez cada delay segundos aunque se pida
+        muchas veces (p. ej. las estadísticas tras cada webhook). producer se
+        ejecuta en un hilo: una sola consulta para todos los navegadores.
+        """
+        if self._loop is None or not self.has_subscribers(topic):
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._schedule, topic, producer, delay)
+        except RuntimeError:
+            pass
+
+    def _schedule(self, topic: str, producer: Callable[[], Any], delay: float):
+        if topic in self._debounced:
+            return
+        self._debounced[topic] = self._loop.call_later(
+            delay, lambda: self._loop.create_task(self._produce(topic, producer)))
+
+    async def _produce(self, topic: str, producer: Callable[[], Any]):
+        self._debounced.pop(topic, None)
+        try:
+            self._dispatch(topic, await asyncio.to_thread(producer))
+        except Exception:
+            print(f"ERROR GENERANDO EL EVENTO {topic}")
+            print_exc()
+
+    def _dispatch(self, topic: str, data: Any):
+        event = Event(next(self._ids), topic, data)
+        self._last_id = event.id
+        self._replay.append(event)
+        EVENTS_PUBLISHED.inc(topic=topic)
+        for subscription in self._subscriptions:
+            if topic in subscription.topics:
+                subscription.push(event)
+
+    def subscribe(self, topics: set[str], last_event_id: Optional[int] = None) -> Subscription:
+        """
+        Nueva suscripción (solo desde el event loop). Con last_event_id se
+        reenvían los eventos posteriores que sigan en memoria; si ya no están,
+        el primer evento es "reset".
+        """
+        subscription = Subscription(topics & set(TOPICS))
+        if last_event_id is not None:
+            # Eventos ya descartados del búfer, o un id de antes de reiniciar el proceso
+            if last_event_id > self._last_id or (self._replay and self._replay[0].id > last_event_id + 1):
+                subscription.push(Event(0, "reset", {}))
+            else:
+                for event in self._replay:
+                    if event.id > last_event_id and event.topic in subscription.topics:
+                        subscription.push(event)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for topic in subscription.topics:
+                self._topic_counts[topic] += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.discard(subscription)
+                for topic in subscription.topics:
+                    self._topic_counts[topic] -= 1
+
+    def close(self):
+        """Termina todas las suscripciones (parada de la aplicación)."""
+        for subscription in list(self._subscriptions):
+            subscription.push(None)
+        for handle in self._debounced.values():
+            handle.cancel()
+        self._debounced.clear()
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscriptions), **{f"{k}_subscribers": v for k, v in self._topic_counts.items()}}
+
+
+bus = EventBus()
+
+Gauge("events_subscribers", "Navegadores conectados a /web/events", collect=lambda: bus.stats()["subscribers"])
+
+
+async def stream(subscription: Subscription, is_disconnected: Callable, heartbeat: float = EVENTS_HEARTBEAT,
+                 max_seconds: float = EVENTS_MAX_STREAM_SECONDS):
+    """Cuerpo de la respuesta text/event-stream de una suscripción."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        yield "retry: 1000\n\n"
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(subscription.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield ": ping\n\n"
+                continue
+            if event is None:
+                return
+            yield event.encode()
+    finally:
+        bus.unsubscribe(subscription)
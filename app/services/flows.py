@@ -0,0 +1,194 @@
+"""
+Flujos de acciones hacia Adamo (pedir información, proponer resolución,
+enviar reporte) para todos los tipos de ticket.
+
+Cada tipo de ticket es una entrada de FLOWS: prefijo de los eventos del
+outbox, entorno y acciones. Cada acción declara los campos del payload, los
+campos obligatorios del formulario y los estados del ticket en los que no se
+permite. Un tipo de ticket nuevo solo necesita su entrada en FLOWS.
+
+Los campos se compilan una vez al importar en una tupla de (clave, getter):
+construir un payload es un único recorrido que crea un solo dict.
+"""
+import time
+from operator import attrgetter
+from typing import Callable, Optional
+
+from sqlmodel import Session
+
+from app.models import Ticket
+from app.services.logger import log_event
+from app.services.metrics import Counter, Histogram
+from app.services.outbox import add_to_outbox
+from app.services.ticket_history import add_ticket_event
+from app.services.ticket_states import CLOSED_STATES, state_label
+
+DEFAULT_ENV = "PRE"
+DEFAULT_TICKET_TYPE = "ftth_cliente"
+
+FLOW_ACTIONS = Counter("flow_actions_total", "Acciones sobre tickets por tipo y resultado",
+                       ("ticket_type", "action", "outcome"))
+FLOW_ACTION_SECONDS = Histogram("flow_action_duration_seconds", "Construcción y encolado de cada acción",
+                                ("ticket_type", "action"))
+
+
+ACTION_LABELS = {
+    "request_info": "pedir información",
+    "propose_resolution": "proponer una resolución",
+    "send_report": "enviar un reporte",
+}
+
+
+class FlowError(Exception):
+    """La acción no existe para el tipo de ticket o no se permite en su estado."""
+
+
+def _attachments(refs) -> list:
+    # Referencias del almacén de adjuntos: dicts con filename, sha256 y content_type
+    return [{"sha256": ref["sha256"], "mimeType": ref.get("content_type", "application/octet-stream"),
+             "name": ref["filename"]} for ref in refs or ()]
+
+
+def _getter(source: str, default=None) -> Callable:
+    """
+    Getter(ticket, values, attachments) de un campo del payload. source es:
+    "=texto" (constante), "ticket.columna", "form.campo", "form.campo:iso"
+    (fecha en ISO 8601) o "attachments". Con default, los valores vacíos se sustituyen.
+    """
+    if source.startswith("="):
+        constant = source[1:]
+        return lambda ticket, values, attachments: constant
+    if source == "attachments":
+        return lambda ticket, values, attachments: _attachments(attachments)
+    kind, _, name = source.partition(".")
+    if kind == "ticket":
+        get = attrgetter(name)
+        return lambda ticket, values, attachments: get(ticket)
+    if kind != "form":
+        raise ValueError(f"Origen de campo desconocido: {source}")
+    name, _, conversion = name.partition(":")
+    if conversion == "iso":
+        return lambda ticket, values, attachments: values[name].isoformat()
+    if default is not None:
+        return lambda ticket, values, attachments: values.get(name) or default
+    return lambda ticket, values, attachments: values.get(name)
+
+
+class ActionSpec:
+    def __init__(self, name: str, fields: tuple, required: tuple = (), blocked_states: tuple = CLOSED_STATES):
+        """
+        fields: tupla de (clave del payload, origen[, valor por defecto]), ver _getter.
+        required: campos del formulario sin los que no se puede enviar.
+        """
+        self.name = name
+        self.required = required
+        self.blocked_states = blocked_states
+        self._fields = tuple((field[0], _getter(*field[1:])) for field in fields)
+
+    def check(self, ticket: Ticket, values: dict):
+        if ticket.state in self.blocked_states:
+            raise FlowError(f"No se puede {ACTION_LABELS.get(self.name, self.name)} con el ticket "
+                            f"{state_label(ticket.state).lower()}")
+        missing = [name for name in self.required if not values.get(name)]
+        if missing:
+            raise FlowError(f"Faltan campos obligatorios: {', '.join(missing)}")
+
+    def build(self, ticket: Ticket, values: dict, attachments=None) -> dict:
+        return {key: get(ticket, values, attachments) for key, get in self._fields}
+
+
+class FlowSpec:
+    def __init__(self, ticket_type: str, event_prefix: str, actions: dict, env: str = DEFAULT_ENV):
+        self.ticket_type = ticket_type
+        self.event_prefix = event_prefix
+        self.actions = actions
+        self.env = env
+
+    def event_type(self, action: str) -> str:
+        # Nombres del outbox: ftth_request_info, ftth_massive_send_report... (ver MERGE_DIALOG_EVENTS)
+        return f"{self.event_prefix}_{action}"
+
+
+# Acciones comunes de los tickets de Adamo (SetTroubleTicketByValue)
+ADAMO_ACTIONS = {
+    "request_info": ActionSpec("request_info", (
+        ("baseTroubleTicketState", "=OPENACTIVE"),
+        ("primaryKey", "ticket.primary_key"),
+        ("mirrorKey", "ticket.mirror_key"),
+        ("dialog", "form.dialog"),
+        ("clearancePerson", "=ibiocom"),
+        ("attachments", "attachments"),
+    ), required=("dialog",)),
+    "propose_resolution": ActionSpec("propose_resolution", (
+        ("baseTroubleTicketState", "=OPENACTIVE"),
+        ("primaryKey", "ticket.primary_key"),
+        ("mirrorKey", "ticket.mirror_key"),
+        ("dateRestoreService", "form.date_restore_service:iso"),
+        ("rawResolution", "form.raw_resolution"),
+        ("clearancePerson", "=ibiocom"),
+        ("dialog", "form.dialog", ""),
+        ("certification", "form.certification"),
+        ("department", "form.department"),
+        ("rawRealTipification", "form.raw_real_tipification"),
+        ("attachments", "attachments"),
+    ), required=("date_restore_service", "raw_resolution")),
+    "send_report": ActionSpec("send_report", (
+        ("baseTroubleTicketState", "=OPENACTIVE"),
+        ("primaryKey", "ticket.primary_key"),
+        ("mirrorKey", "ticket.mirror_key"),
+        ("dialog", "form.dialog"),
+        ("clearancePerson", "=ibiocom"),
+        ("attachments", "attachments"),
+    ), required=("dialog",)),
+}
+
+FLOWS = {
+    "ftth_cliente": FlowSpec("ftth_cliente", "ftth", ADAMO_ACTIONS),
+    "ftth_masivo": FlowSpec("ftth_masivo", "ftth_massive", ADAMO_ACTIONS),
+    "trabajos_programados": FlowSpec("trabajos_programados", "workflows", ADAMO_ACTIONS),
+}
+
+
+def get_flow(ticket_type: Optional[str]) -> FlowSpec:
+    """Flujo de un tipo de ticket; los tipos sin entrada propia usan el de FTTH."""
+    return FLOWS.get(ticket_type) or FLOWS[DEFAULT_TICKET_TYPE]
+
+
+def run_action(session: Session, ticket: Ticket, action: str, values: dict, attachments: Optional[list] = None,
+               idempotency_key: Optional[str] = None, user_email: Optional[str] = None,
+               env: Optional[str] = None) -> dict:
+    """
+    Valida y encola una acción del ticket para Adamo. values son los campos del
+    formulario (dialog, raw_resolution, date_restore_service como datetime...)
+    y attachments las referencias del almacén de adjuntos. Lanza FlowError si
+    la acción no se permite; la entrega la hacen los workers del outbox.
+
+    El mensaje del outbox y la acción en el historial del ticket van en la
+    transacción de session (el llamador hace commit). Si la clave de
+    idempotencia ya se usó no se añade nada y created es False.
+    """
+    flow = get_flow(ticket.ticket_type)
+    labels = {"ticket_type": flow.ticket_type, "action": action}
+    start = time.perf_counter()
+
+    spec = flow.actions.get(action)
+    try:
+        if spec is None:
+            raise FlowError(f"Acción desconocida para tickets {flow.ticket_type}: {action}")
+        spec.check(ticket, values)
+    except FlowError as exc:
+        FLOW_ACTIONS.inc(outcome="rejected", **labels)
+        log_event(flow.event_type(action), {"error": str(exc)}, ticket.primary_key, user_email,
+                  direction="out", status="rejected")
+        raise
+
+    payload = spec.build(ticket, values, attachments)
+    message, created = add_to_outbox(session, flow.event_type(action), payload, env=env or flow.env,
+                                     idempotency_key=idempotency_key, user_email=user_email)
+    if created:
+        add_ticket_event(session, ticket.id, action, values.get("dialog"), attachments,
+                         raw_resolution=values.get("raw_resolution"), user_email=user_email)
+    FLOW_ACTIONS.inc(outcome="queued" if created else "duplicate", **labels)
+    FLOW_ACTION_SECONDS.observe(time.perf_counter() - start, **labels)
+    return {"message": "Solicitud encolada para envío a Adamo", "message_type": "success",
+            "delivery_id": message.id, "created": created}
@@ -0,0 +1,239 @@
+"""
+Retención de la tabla log por niveles.
+
+1. Base de datos: los eventos de los últimos LOG_RETENTION_DAYS días. Los
+   payloads grandes ya se guardan comprimidos (ver logger.encode_payload).
+2. Archivo: los más antiguos pasan a ficheros JSON Lines comprimidos con gzip,
+   uno por día (LOG_ARCHIVE_DIR/AAAA/MM/log-AAAA-MM-DD.jsonl.gz), y se borran
+   de la tabla.
+3. Borrado: los ficheros de archivo con más de LOG_ARCHIVE_RETENTION_DAYS días
+   se eliminan (0 = se conservan siempre).
+
+Se ejecuta cada LOG_RETENTION_INTERVAL segundos desde el arranque de la
+aplicación o a mano:
+
+    python -m app.services.log_retention report
+    python -m app.services.log_retention archive --days 30
+    python -m app.services.log_retention compact
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from traceback import print_exc
+from typing import Optional
+
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+
+from app.database import engine, init_db
+from app.models import Log
+from app.services.logger import encode_payload, read_payload, serialize_payload
+from app.services.metrics import Counter
+
+LOG_RETENTION_DAYS = int(os.getenv("LOG_RETENTION_DAYS", "90"))  # 0 = no se archiva
+LOG_ARCHIVE_RETENTION_DAYS = int(os.getenv("LOG_ARCHIVE_RETENTION_DAYS", "0"))  # 0 = no se borra
+LOG_ARCHIVE_DIR = os.getenv("LOG_ARCHIVE_DIR", os.path.join("logs", "archive"))
+LOG_RETENTION_INTERVAL = float(os.getenv("LOG_RETENTION_INTERVAL", "3600"))  # segundos
+LOG_RETENTION_BATCH = int(os.getenv("LOG_RETENTION_BATCH", "1000"))
+
+LOG_ARCHIVED = Counter("log_archived_rows_total", "Filas de log movidas a los ficheros de archivo")
+
+_task: Optional[asyncio.Task] = None
+
+
+def archive_path(day, archive_dir: str = LOG_ARCHIVE_DIR) -> str:
+    return os.path.join(archive_dir, f"{day:%Y}", f"{day:%m}", f"log-{day:%Y-%m-%d}.jsonl.gz")
+
+
+def _archive_line(log: Log) -> str:
+    return json.dumps({
+        "id": log.id,
+        "event_type": log.event_type,
+        "ticket_primary_key": log.ticket_primary_key,
+        "user_email": log.user_email,
+        "direction": log.direction,
+        "status": log.status,
+        "created_at": log.created_at.isoformat(),
+        "payload": read_payload(log),
+    }, ensure_ascii=False)
+
+
+def archive_logs(older_than_days: int = LOG_RETENTION_DAYS, archive_dir: str = LOG_ARCHIVE_DIR,
+                 batch_size: int = LOG_RETENTION_BATCH) -> dict:
+    """
+    Mueve a los ficheros de archivo los logs anteriores a older_than_days días.
+    Cada lote se escribe y se sincroniza a disco antes de borrarlo de la tabla:
+    si el proceso se corta entre ambos pasos, al repetir quedan líneas
+    duplicadas (con el mismo id) en el archivo, pero no se pierde ninguna.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    rows = 0
+    files = set()
+    while True:
+        with Session(engine) as session:
+            batch = session.exec(
+                select(Log).where(Log.created_at < cutoff).order_by(Log.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            by_day = defaultdict(list)
+            for log in batch:
+                by_day[log.created_at.date()].append(_archive_line(log))
+            for day, lines in by_day.items():
+                path = archive_path(day, archive_dir)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # "ab": cada lote añade un miembro gzip nuevo; gzip los lee seguidos como un solo fichero
+                with open(path, "ab") as raw, gzip.GzipFile(fileobj=raw, mode="ab") as out:
+                    out.write(("\n".join(lines) + "\n").encode("utf-8"))
+                    out.flush()
+                    os.fsync(raw.fileno())
+                files.add(path)
+            session.execute(delete(Log).where(Log.id.in_([log.id for log in batch])))
+            session.commit()
+        rows += len(batch)
+        LOG_ARCHIVED.inc(len(batch))
+    return {"rows": rows, "files": sorted(files), "cutoff": cutoff.isoformat()}
+
+
+def purge_archives(older_than_days: int = LOG_ARCHIVE_RETENTION_DAYS, archive_dir: str = LOG_ARCHIVE_DIR) -> list[str]:
+    """Elimina los ficheros de archivo de días anteriores a older_than_days. Devuelve los borrados."""
+    if older_than_days <= 0 or not os.path.isdir(archive_dir):
+        return []
+    cutoff = (datetime.utcnow() - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+    removed = []
+    for root, _, names in os.walk(archive_dir):
+        for name in names:
+            # log-AAAA-MM-DD.jsonl.gz: la fecha se compara como texto
+            if name.startswith("log-") and name.endswith(".jsonl.gz") and name[4:14] < cutoff:
+                os.remove(os.path.join(root, name))
+                removed.append(os.path.join(root, name))
+    return removed
+
+
+def compact_logs(batch_size: int = LOG_RETENTION_BATCH) -> dict:
+    """
+    Reescribe los logs guardados antes de la compresión (JSON indentado, base64
+    incluido) con el formato actual. Devuelve bytes antes y después.
+    """
+    before = after = rows = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            batch = session.exec(
+                select(Log.id, Log.payload).where(Log.id > last_id, Log.payload_size.is_(None),
+                                                  Log.payload.is_not(None))
+                .order_by(Log.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            for log_id, payload in batch:
+                try:
+                    value = json.loads(payload)
+                except ValueError:
+                    value = payload
+                encoded = encode_payload(serialize_payload(value if isinstance(value, dict) else payload))
+                session.execute(update(Log).where(Log.id == log_id).values(**encoded))
+                before += len(payload.encode("utf-8"))
+                after += len(encoded["payload_compressed"] or encoded["payload"].encode("utf-8"))
+            session.commit()
+        rows += len(batch)
+        last_id = batch[-1][0]
+    return {"rows": rows, "bytes_before": before, "bytes_after": after}
+
+
+def size_report() -> list[dict]:
+    """Filas y bytes de payload por event_type: sin comprimir (raw) y lo que ocupan en la tabla (stored)."""
+    raw_size = func.coalesce(Log.payload_size, func.length(Log.payload), 0)
+    stored_size = func.coalesce(func.length(Log.payload_compressed), func.length(Log.payload), 0)
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Log.event_type, func.count(Log.id), func.sum(raw_size), func.sum(stored_size),
+                   func.count(Log.payload_compressed), func.min(Log.created_at))
+            .group_by(Log.event_type)
+            .order_by(func.sum(stored_size).desc())
+        ).all()
+    return [{
+        "event_type": event_type,
+        "rows": count,
+        "raw_bytes": raw or 0,
+        "stored_bytes": stored or 0,
+        "compressed_rows": compressed,
+        "avg_stored_bytes": round((stored or 0) / count) if count else 0,
+        "oldest": oldest.isoformat() if oldest else None,
+    } for event_type, count, raw, stored, compressed, oldest in rows]
+
+
+def run_retention() -> dict:
+    result = {"archived": {"rows": 0}, "purged": []}
+    if LOG_RETENTION_DAYS > 0:
+        result["archived"] = archive_logs()
+    result["purged"] = purge_archives()
+    return result
+
+
+async def _run(interval: float):
+    while True:
+        try:
+            await asyncio.to_thread(run_retention)
+        except Exception:
+            print("ERROR EN LA RETENCIÓN DE LOGS")
+            print_exc()
+        await asyncio.sleep(interval)
+
+
+def start_retention(interval: float = LOG_RETENTION_INTERVAL):
+    """Archiva y purga periódicamente (llamar desde el startup)."""
+    global _task
+    if interval <= 0:
+        return
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_run(interval))
+
+
+async def stop_retention():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("report", help="Bytes de payload por event_type")
+    archive = sub.add_parser("archive", help="Mueve los logs antiguos a ficheros .jsonl.gz")
+    archive.add_argument("--days", type=int, default=LOG_RETENTION_DAYS)
+    archive.add_argument("--dir", default=LOG_ARCHIVE_DIR)
+    purge = sub.add_parser("purge", help="Borra los ficheros de archivo antiguos")
+    purge.add_argument("--days", type=int, default=LOG_ARCHIVE_RETENTION_DAYS)
+    purge.add_argument("--dir", default=LOG_ARCHIVE_DIR)
+    sub.add_parser("compact", help="Recomprime los logs guardados con el formato anterior")
+    args = parser.parse_args()
+
+    init_db()
+    if args.command == "report":
+        report = size_report()
+        print(f"{'event_type':<32}{'filas':>10}{'sin comprimir':>16}{'guardado':>14}{'comprimidas':>13}")
+        for row in report:
+            print(f"{row['event_type']:<32}{row['rows']:>10}{row['raw_bytes']:>16}"
+                  f"{row['stored_bytes']:>14}{row['compressed_rows']:>13}")
+        print(f"{'TOTAL':<32}{sum(r['rows'] for r in report):>10}{sum(r['raw_bytes'] for r in report):>16}"
+              f"{sum(r['stored_bytes'] for r in report):>14}{sum(r['compressed_rows'] for r in report):>13}")
+    elif args.command == "archive":
+        print(json.dumps(archive_logs(args.days, args.dir), indent=2))
+    elif args.command == "purge":
+        print(json.dumps(purge_archives(args.days, args.dir), indent=2))
+    else:
+        print(json.dumps(compact_logs(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
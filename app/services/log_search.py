@@ -0,0 +1,114 @@
+import os
+from datetime import date, datetime
+from typing import Optional, Union
+from sqlalchemy import func, text, tuple_
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import Log
+from app.services.cache import TTLCache
+from app.services.ticket_search import date_range, decode_cursor, encode_cursor
+
+MAX_PAGE_SIZE = 200
+LOG_COUNT_CACHE_TTL = float(os.getenv("LOG_COUNT_CACHE_TTL", "60"))  # segundos
+LOG_COUNT_LIMIT = int(os.getenv("LOG_COUNT_LIMIT", "10000"))  # con filtros se cuenta hasta aquí
+
+# Columnas del listado: el payload se pide aparte al desplegar cada fila
+LIST_COLUMNS = (Log.id, Log.event_type, Log.ticket_primary_key, Log.user_email, Log.direction,
+                Log.status, Log.payload_size, Log.created_at)
+
+FILTERS = ("event_type", "status", "direction", "ticket_primary_key")
+
+_counts = TTLCache(maxsize=256, ttl=LOG_COUNT_CACHE_TTL)
+
+# Valores distintos de una columna indexada saltando de uno en uno por el índice (O(k log n), sin recorrer la tabla)
+_DISTINCT_SQL = """
+WITH RECURSIVE v(value) AS (
+    SELECT MIN({column}) FROM log
+    UNION ALL
+    SELECT (SELECT MIN({column}) FROM log WHERE {column} > v.value) FROM v WHERE v.value IS NOT NULL
+)
+SELECT value FROM v WHERE value IS NOT NULL
+"""
+
+
+def _filtered(stmt, event_type: Optional[str] = None, status: Optional[str] = None,
+              direction: Optional[str] = None, ticket_primary_key: Optional[str] = None,
+              date_from: Union[date, datetime, None] = None, date_to: Union[date, datetime, None] = None):
+    # Cada filtro de igualdad tiene su índice (columna, created_at); el id va implícito como rowid.
+    # date_to como día (formulario web) incluye el día entero; como datetime (API) es el límite exacto
+    if event_type:
+        stmt = stmt.where(Log.event_type == event_type)
+    if status:
+        stmt = stmt.where(Log.status == status)
+    if direction:
+        stmt = stmt.where(Log.direction == direction)
+    if ticket_primary_key:
+        stmt = stmt.where(Log.ticket_primary_key == ticket_primary_key)
+    for condition in date_range(Log.created_at, date_from, date_to):
+        stmt = stmt.where(condition)
+    return stmt
+
+
+def search_logs(cursor: Optional[str] = None, limit: int = 50, **filters):
+    """
+    Página de logs ordenada por (created_at, id) descendente con paginación por
+    cursor, sin el payload. Devuelve (filas, cursor_siguiente o None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = _filtered(select(*LIST_COLUMNS), **filters)
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        stmt = stmt.where(tuple_(Log.created_at, Log.id) < position)
+
+    stmt = stmt.order_by(Log.created_at.desc(), Log.id.desc()).limit(limit + 1)
+    with Session(engine) as session:
+        rows = session.exec(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def count_logs(**filters) -> tuple[int, bool]:
+    """
+    Total aproximado para la cabecera del listado: (número, exacto).
+    Sin filtros se estima con el rango de ids (las filas solo se borran al
+    archivar, por el principio); con filtros se cuenta hasta LOG_COUNT_LIMIT.
+    Se cachea LOG_COUNT_CACHE_TTL segundos por combinación de filtros.
+    """
+    key = tuple(sorted((name, value) for name, value in filters.items() if value))
+    cached = _counts.get(key)
+    if cached is not None:
+        return cached
+
+    with Session(engine) as session:
+        if not key:
+            low, high = session.exec(select(func.min(Log.id), func.max(Log.id))).one()
+            result = ((high - low + 1) if high is not None else 0, False)
+        else:
+            capped = _filtered(select(Log.id), **filters).limit(LOG_COUNT_LIMIT + 1).subquery()
+            count = session.exec(select(func.count()).select_from(capped)).one()
+            result = (min(count, LOG_COUNT_LIMIT), count <= LOG_COUNT_LIMIT)
+    _counts.set(key, result)
+    return result
+
+
+def distinct_values(column: str) -> list[str]:
+    """Valores posibles de un filtro (event_type, status, direction) para los desplegables."""
+    if column not in FILTERS:
+        raise ValueError(column)
+    key = ("distinct", column)
+    cached = _counts.get(key)
+    if cached is None:
+        with Session(engine) as session:
+            cached = [row[0] for row in session.execute(text(_DISTINCT_SQL.format(column=column)))]
+        _counts.set(key, cached, ttl=LOG_COUNT_CACHE_TTL * 10)
+    return cached
+
+
+def get_log(log_id: int) -> Optional[Log]:
+    with Session(engine) as session:
+        return session.get(Log, log_id)
@@ -1,25 +1,265 @@
+import atexit
 import json
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Optional
+from traceback import print_exc
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
 from app.database import engine
 from app.models import Log
+from app.services.events import bus
+from app.services.metrics import Counter, Gauge
 from sqlmodel import Session
 
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.5"))  # segundos
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_PUT_TIMEOUT = float(os.getenv("LOG_PUT_TIMEOUT", "0.05"))  # espera máxima del productor con la cola llena
+LOG_WRITE_RETRIES = int(os.getenv("LOG_WRITE_RETRIES", "3"))  # reintentos de un lote ante "database is locked"
+LOG_WRITE_RETRY_DELAY = float(os.getenv("LOG_WRITE_RETRY_DELAY", "0.2"))  # segundos; se dobla en cada reintento
+
+# Tamaño de los payloads
+LOG_MAX_VALUE_CHARS = int(os.getenv("LOG_MAX_VALUE_CHARS", "4096"))  # por cada texto dentro del JSON
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", str(64 * 1024)))  # payload completo
+LOG_COMPRESS_MIN_BYTES = int(os.getenv("LOG_COMPRESS_MIN_BYTES", "1024"))  # por debajo no compensa
+LOG_COMPRESS_LEVEL = int(os.getenv("LOG_COMPRESS_LEVEL", "6"))
+
+# Base64 de adjuntos (fotos de evidencias) dentro de webhooks o respuestas SOAP
+_BASE64_RUN = re.compile(r"[A-Za-z0-9+/]{512,}={0,2}")
+_BASE64_MIN = 512
+
+# Columnas de cada fila nueva que se envían a /web/logs (el payload se pide aparte)
+LOG_EVENT_FIELDS = ("event_type", "ticket_primary_key", "user_email", "direction", "status", "payload_size",
+                    "created_at")
+
+LOG_PAYLOAD_BYTES = Counter("log_payload_bytes_total", "Bytes de payload de log antes y después de comprimir",
+                            ("stage",))
+
+
+def _clip(text: str, limit: int) -> str:
+    """Sustituye el base64 por su longitud y recorta lo que pase de limit caracteres."""
+    if len(text) >= _BASE64_MIN:
+        text = _BASE64_RUN.sub(lambda m: f"[base64 omitido: {len(m.group())} caracteres]", text)
+    if len(text) > limit:
+        text = f"{text[:limit]}…[{len(text) - limit} caracteres omitidos]"
+    return text
+
+
+def redact_payload(value):
+    """Copia del payload sin base64 y con los textos largos recortados (LOG_MAX_VALUE_CHARS)."""
+    if isinstance(value, str):
+        return _clip(value, LOG_MAX_VALUE_CHARS)
+    if isinstance(value, dict):
+        return {key: redact_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact_payload(item) for item in value]
+    return value
+
+
+def serialize_payload(payload) -> Optional[str]:
+    """Texto que se guarda en Log.payload: JSON compacto para dicts, texto recortado para el resto."""
+    if payload is None:
+        return None
+    if isinstance(payload, dict):
+        payload = json.dumps(redact_payload(payload), ensure_ascii=False, separators=(",", ":"), default=str)
+    elif not isinstance(payload, str):
+        # Respuestas zeep u otros objetos: una fila no serializable estropearía todo el lote
+        payload = str(payload)
+    return _clip(payload, LOG_MAX_PAYLOAD_CHARS)
+
+
+def encode_payload(payload: Optional[str]) -> dict:
+    """Columnas payload/payload_compressed/payload_size de una fila (comprime si compensa)."""
+    if payload is None:
+        return {"payload": None, "payload_compressed": None, "payload_size": None}
+    raw = payload.encode("utf-8")
+    LOG_PAYLOAD_BYTES.inc(len(raw), stage="raw")
+    if len(raw) >= LOG_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(raw, LOG_COMPRESS_LEVEL)
+        if len(compressed) < len(raw) * 0.9:
+            LOG_PAYLOAD_BYTES.inc(len(compressed), stage="stored")
+            return {"payload": None, "payload_compressed": compressed, "payload_size": len(raw)}
+    LOG_PAYLOAD_BYTES.inc(len(raw), stage="stored")
+    return {"payload": payload, "payload_compressed": None, "payload_size": len(raw)}
+
+
+def read_payload(log: Log) -> Optional[str]:
+    """Payload de una fila de Log como texto, esté o no comprimido."""
+    if log.payload_compressed is not None:
+        return zlib.decompress(log.payload_compressed).decode("utf-8")
+    return log.payload
+
+
+def format_payload(log: Log) -> str:
+    """Payload para mostrar en pantalla: el JSON se indenta al leerlo, no al guardarlo."""
+    payload = read_payload(log)
+    if not payload:
+        return ""
+    try:
+        return json.dumps(json.loads(payload), ensure_ascii=False, indent=2)
+    except ValueError:
+        return payload
+
+
+class LogWriter:
+    """
+    Escritor de logs en segundo plano: acumula filas de Log y las inserta en bloque
+    cuando se llena el lote o pasa LOG_FLUSH_INTERVAL, con una sola transacción por lote.
+    """
+
+    def __init__(self, batch_size: int = LOG_BATCH_SIZE, flush_interval: float = LOG_FLUSH_INTERVAL,
+                 queue_size: int = LOG_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.counters = {"submitted": 0, "flushed": 0, "dropped": 0, "batches": 0, "errors": 0, "retries": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo y escribe lo que quede en la cola."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def submit(self, row: dict) -> bool:
+        """
+        Encola una fila. Si la cola está llena el productor espera hasta LOG_PUT_TIMEOUT
+        (contrapresión) y después el evento se descarta y se contabiliza.
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put(row, timeout=LOG_PUT_TIMEOUT)
+        except queue.Full:
+            with self._lock:
+                self.counters["dropped"] += 1
+            return False
+        with self._lock:
+            self.counters["submitted"] += 1
+        return True
+
+    def flush(self):
+        """Escribe de inmediato todo lo pendiente (en lotes de batch_size)."""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.counters, "queue_depth": self._queue.qsize()}
+
+    def _drain(self, limit: int) -> list[dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _insert(self, rows: list[dict], live: bool) -> list[int]:
+        with self._write_lock, Session(engine) as session:
+            ids = []
+            if live:
+                # Los navegadores en /web/logs necesitan el id de cada fila para pedir su payload
+                ids = session.execute(insert(Log).returning(Log.id, sort_by_parameter_order=True), rows).scalars().all()
+            else:
+                session.execute(insert(Log), rows)
+            session.commit()
+        return ids
+
+    def _write(self, batch: list[dict]):
+        try:
+            # La compresión se hace aquí, en el hilo del escritor, no en la petición que registra el evento
+            rows = [{**row, **encode_payload(row["payload"])} for row in batch]
+            live = bus.has_subscribers("log")
+            for attempt in range(LOG_WRITE_RETRIES + 1):
+                try:
+                    ids = self._insert(rows, live)
+                    break
+                except OperationalError:
+                    # Base bloqueada más allá de busy_timeout o conexión caída: se reintenta el
+                    # mismo lote en vez de perderlo entero
+                    if attempt == LOG_WRITE_RETRIES:
+                        raise
+                    with self._lock:
+                        self.counters["retries"] += 1
+                    time.sleep(LOG_WRITE_RETRY_DELAY * 2 ** attempt)
+            if live:
+                for log_id, row in zip(ids, rows):
+                    bus.publish("log", {"id": log_id, **{k: row[k] for k in LOG_EVENT_FIELDS}})
+            with self._lock:
+                self.counters["flushed"] += len(batch)
+                self.counters["batches"] += 1
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+                self.counters["dropped"] += len(batch)
+            print("ERROR ESCRIBIENDO LOGS")
+            print_exc()
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.stop)
+
+Gauge("log_writer_queue_depth", "Eventos de log pendientes de escribir",
+      collect=lambda: log_writer.stats()["queue_depth"])
+Counter("log_writer_events_total", "Eventos de log por resultado", ("outcome",),
+        collect=lambda: {k: v for k, v in log_writer.stats().items() if k in ("submitted", "flushed", "dropped")})
+Counter("log_writer_batches_total", "Lotes de log escritos", collect=lambda: log_writer.stats()["batches"])
+
+
 def log_event(event_type: str, payload: dict | str = None, ticket_pk: str = None,
               user_email: str = None, direction: str = None, status: str = "success"):
     """
-    Guarda un evento de log en la base de datos.
+    Guarda un evento de log en la base de datos (de forma diferida, ver LogWriter).
+    El payload se guarda sin base64 y recortado (ver serialize_payload).
     """
-    if isinstance(payload, dict):
-        payload = json.dumps(payload, ensure_ascii=False, indent=2)
-
-    log_entry = Log(
-        event_type=event_type,
-        payload=payload,
-        ticket_primary_key=ticket_pk,
-        user_email=user_email,
-        direction=direction,
-        status=status
-    )
-
-    with Session(engine) as session:
-        session.add(log_entry)
-        session.commit()
+    log_writer.submit({
+        "event_type": event_type,
+        "payload": serialize_payload(payload),
+        "ticket_primary_key": ticket_pk,
+        "user_email": user_email,
+        "direction": direction,
+        "status": status,
+        "created_at": datetime.utcnow(),
+    })
@@ -0,0 +1,443 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import DateTime, bindparam, event as sa_event, text, update
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, select, or_, func
+
+from app.database import engine
+from app.models import OutboxMessage
+from app.services.logger import log_event
+from app.services.metrics import Counter, Gauge
+from app.soap.client import aset_trouble_ticket_by_value, aset_trouble_tickets_by_values, supports_bulk
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BASE_DELAY = float(os.getenv("OUTBOX_BASE_DELAY", "2"))
+OUTBOX_MAX_DELAY = float(os.getenv("OUTBOX_MAX_DELAY", "600"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+OUTBOX_LEASE = float(os.getenv("OUTBOX_LEASE", "120"))  # segundos que un worker "posee" un mensaje
+OUTBOX_DEDUP_WINDOW = int(os.getenv("OUTBOX_DEDUP_WINDOW", "300"))
+OUTBOX_COALESCE_MAX = int(os.getenv("OUTBOX_COALESCE_MAX", "20"))  # mensajes de un ticket fusionados en una llamada
+OUTBOX_BULK_SIZE = int(os.getenv("OUTBOX_BULK_SIZE", "50"))  # tickets por llamada multi-valor
+OUTBOX_DEFER_DELAY = float(os.getenv("OUTBOX_DEFER_DELAY", "5"))
+
+# Errores OSS/J que no se arreglan reintentando: van directos a la cola de mensajes muertos
+PERMANENT_ERRORS = {"illegalArgumentException", "objectNotFoundException", "invalid_payload"}
+# Adamo no llegó a recibir el mensaje (circuito abierto o sin hueco): se aplaza sin gastar intentos
+DEFERRED_ERRORS = {"circuit_open", "busy"}
+
+# Fusión de mensajes consecutivos del mismo ticket y tipo: los reportes y
+# peticiones de información juntan diálogo y adjuntos; de los acuses solo
+# importa el último. Las propuestas de resolución y los reintentos nunca se fusionan.
+MERGE_DIALOG_EVENTS = ("_send_report", "_request_info")
+LAST_WINS_EVENTS = ("_ack",)
+
+_stats = {"messages": 0, "calls": 0, "coalesced": 0, "bulk_calls": 0}
+
+
+def _messages_by_status() -> dict:
+    with Session(engine) as session:
+        rows = session.exec(select(OutboxMessage.status, func.count(OutboxMessage.id))
+                            .group_by(OutboxMessage.status)).all()
+    return dict(rows)
+
+
+Counter("outbox_delivery_total", "Mensajes procesados y llamadas a Adamo del outbox", ("kind",),
+        collect=lambda: dict(_stats))
+Gauge("outbox_messages", "Mensajes del outbox por estado", ("status",), collect=_messages_by_status)
+
+_tasks: list[asyncio.Task] = []
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+def make_idempotency_key(event_type: str, payload: dict, env: str = "PRE") -> str:
+    """
+    Clave derivada del contenido: el mismo mensaje encolado dos veces dentro de
+    OUTBOX_DEDUP_WINDOW segundos se entrega una sola vez.
+    """
+    bucket = int(time.time()) // OUTBOX_DEDUP_WINDOW
+    raw = json.dumps([event_type, env, payload, bucket], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _ticket_key(payload: dict) -> Optional[str]:
+    return payload.get("primaryKey") or (payload.get("troubleTicketKey") or {}).get("primaryKey")
+
+
+ENQUEUE_MANY_SQL = text(
+    f"INSERT INTO {OutboxMessage.__tablename__} "
+    "(idempotency_key, ticket_primary_key, env, event_type, payload, status, attempts, next_attempt_at, created_at) "
+    "VALUES (:idempotency_key, :ticket_primary_key, :env, :event_type, :payload, 'pending', 0, :now, :now) "
+    "ON CONFLICT (idempotency_key) DO NOTHING"
+).bindparams(bindparam("now", type_=DateTime))
+# Un solo mensaje: sin fila devuelta es que la clave ya existía (sin excepción ni rollback)
+ENQUEUE_SQL = text(ENQUEUE_MANY_SQL.text + " RETURNING id").bindparams(bindparam("now", type_=DateTime))
+
+
+def add_to_outbox(session: Session, event_type: str, payload: dict, env: str = "PRE",
+                  idempotency_key: Optional[str] = None,
+                  user_email: Optional[str] = None) -> tuple[OutboxMessage, bool]:
+    """
+    Inserta un mensaje para Adamo en la transacción de session, junto con lo
+    que el llamador guarde en ella (p. ej. el historial del ticket). Devuelve
+    (mensaje, creado): si ya existía un mensaje con la misma clave de
+    idempotencia se devuelve ese y creado es False. No hace commit; el log y el
+    aviso a los workers se hacen cuando la sesión hace commit.
+    """
+    key = idempotency_key or make_idempotency_key(event_type, payload, env)
+    row = session.connection().execute(ENQUEUE_SQL, {
+        "idempotency_key": key,
+        "ticket_primary_key": _ticket_key(payload),
+        "env": env,
+        "event_type": event_type,
+        "payload": json.dumps(payload, ensure_ascii=False, default=str),
+        "now": datetime.utcnow(),
+    }).first()
+    if row is None:
+        return session.exec(select(OutboxMessage).where(OutboxMessage.idempotency_key == key)).one(), False
+
+    message = session.get(OutboxMessage, row.id)
+    session.info.setdefault("outbox_enqueued", []).append(
+        (event_type, payload, message.ticket_primary_key, user_email))
+    return message, True
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _after_enqueue(session: Session):
+    enqueued = session.info.pop("outbox_enqueued", None)
+    if not enqueued:
+        return
+    for event_type, payload, ticket_primary_key, user_email in enqueued:
+        log_event(event_type, payload, ticket_primary_key, user_email, direction="out", status="pending")
+    notify_workers()
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_enqueued(session: Session):
+    session.info.pop("outbox_enqueued", None)
+
+
+def enqueue(event_type: str, payload: dict, env: str = "PRE", idempotency_key: Optional[str] = None,
+            user_email: Optional[str] = None) -> OutboxMessage:
+    """
+    Guarda un mensaje para Adamo en el outbox y despierta a los workers.
+    Si ya existe un mensaje con la misma clave de idempotencia se devuelve ese.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        message, _ = add_to_outbox(session, event_type, payload, env, idempotency_key, user_email)
+        session.commit()
+    return message
+
+
+def add_many_to_outbox(session: Session, event_type: str, payloads: list[dict], env: str = "PRE") -> int:
+    """
+    Versión por lotes de add_to_outbox: inserta los mensajes con executemany en
+    la transacción de session. Las claves de idempotencia se derivan del
+    contenido y los duplicados se ignoran. Devuelve cuántos se insertaron. No
+    hace commit; el log y el aviso a los workers se hacen al hacer commit.
+    """
+    if not payloads:
+        return 0
+    now = datetime.utcnow()
+    rows = [
+        {
+            "idempotency_key": make_idempotency_key(event_type, payload, env),
+            "ticket_primary_key": _ticket_key(payload),
+            "env": env,
+            "event_type": event_type,
+            "payload": json.dumps(payload, ensure_ascii=False, default=str),
+            "now": now,
+        }
+        for payload in payloads
+    ]
+    inserted = session.connection().execute(ENQUEUE_MANY_SQL, rows).rowcount
+    session.info.setdefault("outbox_enqueued", []).extend(
+        (event_type, payload, _ticket_key(payload), None) for payload in payloads)
+    return inserted
+
+
+def get_message(message_id: int) -> Optional[OutboxMessage]:
+    with Session(engine) as session:
+        return session.get(OutboxMessage, message_id)
+
+
+def list_messages(status: Optional[str] = None, limit: int = 50, offset: int = 0) -> list[OutboxMessage]:
+    with Session(engine) as session:
+        stmt = select(OutboxMessage).order_by(OutboxMessage.id.desc()).offset(offset).limit(limit)
+        if status:
+            stmt = stmt.where(OutboxMessage.status == status)
+        return session.exec(stmt).all()
+
+
+def requeue(message_id: int) -> Optional[OutboxMessage]:
+    """Devuelve un mensaje muerto a la cola con los intentos a cero."""
+    with Session(engine) as session:
+        message = session.get(OutboxMessage, message_id)
+        if not message:
+            return None
+        if message.status == "dead":
+            message.status = "pending"
+            message.attempts = 0
+            message.next_attempt_at = datetime.utcnow()
+            message.last_error = None
+            session.add(message)
+            session.commit()
+            session.refresh(message)
+    notify_workers()
+    return message
+
+
+def notify_workers():
+    """Despierta a los workers; se puede llamar desde cualquier hilo."""
+    if _loop is not None and _wakeup is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+# ---------- WORKERS ----------
+
+def _coalescable(event_type: str) -> bool:
+    return event_type.endswith(MERGE_DIALOG_EVENTS + LAST_WINS_EVENTS)
+
+
+def coalesce_payloads(event_type: str, payloads: list[dict]) -> dict:
+    """Fusiona los payloads de varios mensajes del mismo ticket en uno."""
+    if len(payloads) == 1 or event_type.endswith(LAST_WINS_EVENTS):
+        return payloads[-1]
+
+    merged = dict(payloads[-1])
+    merged["dialog"] = "\n\n".join(p["dialog"] for p in payloads if p.get("dialog"))
+    attachments, seen = [], set()
+    for p in payloads:
+        for attachment in p.get("attachments") or []:
+            key = json.dumps(attachment, sort_keys=True, default=str)
+            if key not in seen:
+                seen.add(key)
+                attachments.append(attachment)
+    merged["attachments"] = attachments
+    return merged
+
+
+def _claim_followers(session: Session, head: OutboxMessage, now: datetime) -> list[OutboxMessage]:
+    """
+    Reserva los mensajes que siguen a head en su ticket y se pueden fusionar
+    con él, en orden de id. Además de los pendientes se retoman los que
+    quedaron en "sending" con la reserva caducada (un worker que murió a mitad
+    de un grupo fusionado): así se reenvían antes que los más nuevos. Se para
+    en el primer mensaje que no cumple, sin saltárselo.
+    """
+    if not head.ticket_primary_key or not _coalescable(head.event_type):
+        return []
+    queued = session.exec(
+        select(OutboxMessage)
+        .where(
+            OutboxMessage.ticket_primary_key == head.ticket_primary_key,
+            OutboxMessage.id > head.id,
+        )
+        .order_by(OutboxMessage.id)
+        .limit(OUTBOX_COALESCE_MAX - 1)
+    ).all()
+
+    followers = []
+    for message in queued:
+        expired = message.status == "sending" and message.next_attempt_at <= now
+        if message.status != "pending" and not expired:
+            break
+        if message.event_type != head.event_type or message.env != head.env:
+            break
+        followers.append(message)
+    if not followers:
+        return []
+
+    # Nadie más puede tomarlos: el bloqueo por ticket los retiene mientras head está en "sending"
+    session.execute(
+        update(OutboxMessage)
+        .where(
+            OutboxMessage.id.in_([m.id for m in followers]),
+            or_(OutboxMessage.status == "pending",
+                (OutboxMessage.status == "sending") & (OutboxMessage.next_attempt_at <= now)),
+        )
+        .values(status="sending", next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE))
+    )
+    session.commit()
+    return followers
+
+
+def _claim_batch() -> list[list[OutboxMessage]]:
+    """
+    Reserva los siguientes mensajes entregables, agrupados por ticket. Solo se
+    toma el mensaje más antiguo pendiente de cada ticket (así el orden por
+    ticket se respeta con varios workers) junto con los que se pueden fusionar
+    con él. Si el WSDL tiene la operación multi-valor se reservan varios
+    tickets del mismo entorno para enviarlos en una sola llamada.
+    """
+    now = datetime.utcnow()
+    earlier = aliased(OutboxMessage)
+    blocked = (
+        select(earlier.id)
+        .where(
+            earlier.ticket_primary_key == OutboxMessage.ticket_primary_key,
+            earlier.id < OutboxMessage.id,
+            earlier.status.in_(("pending", "sending")),
+        )
+        .exists()
+    )
+
+    groups: list[list[OutboxMessage]] = []
+    limit = 1
+    with Session(engine, expire_on_commit=False) as session:
+        candidates = session.exec(
+            select(OutboxMessage)
+            .where(
+                or_(OutboxMessage.status == "pending", OutboxMessage.status == "sending"),
+                OutboxMessage.next_attempt_at <= now,
+                ~blocked,
+            )
+            .order_by(OutboxMessage.id)
+            .limit(OUTBOX_WORKERS + OUTBOX_BULK_SIZE)
+        ).all()
+        # Se decide antes de reservar: si hay que bajar el WSDL, ningún mensaje espera con la reserva tomada
+        bulk = {env: supports_bulk(env) for env in {candidate.env for candidate in candidates}}
+
+        for candidate in candidates:
+            if groups and candidate.env != groups[0][0].env:
+                continue
+            # La reserva es un UPDATE condicional: si otro worker se adelanta, rowcount es 0
+            claimed = session.execute(
+                update(OutboxMessage)
+                .where(
+                    OutboxMessage.id == candidate.id,
+                    OutboxMessage.status == candidate.status,
+                    OutboxMessage.next_attempt_at <= now,
+                )
+                .values(status="sending", next_attempt_at=now + timedelta(seconds=OUTBOX_LEASE))
+            )
+            session.commit()
+            if claimed.rowcount != 1:
+                continue
+            session.refresh(candidate)
+            groups.append([candidate] + _claim_followers(session, candidate, now))
+            if len(groups) == 1 and bulk[candidate.env]:
+                limit = OUTBOX_BULK_SIZE
+            if len(groups) >= limit:
+                break
+    return groups
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(OUTBOX_MAX_DELAY, OUTBOX_BASE_DELAY * (2 ** (attempts - 1)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _finish(group: list[OutboxMessage], result):
+    """Aplica el resultado de la llamada a todos los mensajes fusionados en ella."""
+    error = result.get("error") if isinstance(result, dict) else None
+    now = datetime.utcnow()
+    ids = [message.id for message in group]
+
+    with Session(engine, expire_on_commit=False) as session:
+        stored = session.exec(select(OutboxMessage).where(OutboxMessage.id.in_(ids))).all()
+        next_attempt_at = None
+        for message in stored:
+            if error is not None and result.get("type") in DEFERRED_ERRORS:
+                message.status = "pending"
+                message.last_error = str(error)
+                message.next_attempt_at = now + timedelta(seconds=OUTBOX_DEFER_DELAY)
+                session.add(message)
+                continue
+            message.attempts += 1
+            if error is None:
+                message.status = "delivered"
+                message.delivered_at = now
+                message.last_error = None
+            else:
+                message.last_error = str(error)
+                if result.get("type") in PERMANENT_ERRORS or message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    message.status = "dead"
+                else:
+                    # Todo el grupo vuelve a la cola a la vez y se volverá a fusionar
+                    next_attempt_at = next_attempt_at or now + timedelta(seconds=_backoff(message.attempts))
+                    message.status = "pending"
+                    message.next_attempt_at = next_attempt_at
+            session.add(message)
+        session.commit()
+
+    for message in stored:
+        payload = {"delivery_id": message.id, "attempts": message.attempts}
+        if len(ids) > 1:
+            payload["coalesced_with"] = [i for i in ids if i != message.id]
+        if message.status == "delivered":
+            log_event(message.event_type, payload, message.ticket_primary_key, direction="out", status="success")
+        elif message.status == "dead":
+            payload["error"] = message.last_error
+            log_event("outbox_dead_letter", payload, message.ticket_primary_key, direction="out", status="error")
+        else:
+            payload["error"] = message.last_error
+            payload["next_attempt_at"] = message.next_attempt_at.isoformat()
+            log_event(message.event_type, payload, message.ticket_primary_key, direction="out", status="retry")
+
+
+async def _deliver(groups: list[list[OutboxMessage]]):
+    payloads = [coalesce_payloads(g[0].event_type, [json.loads(m.payload) for m in g]) for g in groups]
+    env = groups[0][0].env
+    try:
+        if len(groups) == 1:
+            results = [await aset_trouble_ticket_by_value(payloads[0], env=env)]
+        else:
+            results = await aset_trouble_tickets_by_values(payloads, env=env)
+            _stats["bulk_calls"] += 1
+    except Exception as e:
+        results = [{"error": str(e), "type": "unknown"}] * len(groups)
+
+    _stats["calls"] += 1
+    _stats["messages"] += sum(len(g) for g in groups)
+    _stats["coalesced"] += sum(len(g) - 1 for g in groups)
+    for group, result in zip(groups, results):
+        await asyncio.to_thread(_finish, group, result)
+
+
+def outbox_stats() -> dict:
+    """Mensajes entregados frente a llamadas hechas a Adamo desde el arranque."""
+    return dict(_stats)
+
+
+async def _worker():
+    while True:
+        try:
+            groups = await asyncio.to_thread(_claim_batch)
+        except Exception as e:
+            log_event("outbox_error", str(e), direction="out", status="error")
+            groups = []
+
+        if not groups:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _wakeup.clear()
+            continue
+
+        await _deliver(groups)
+
+
+def start_workers(count: int = OUTBOX_WORKERS):
+    """Arranca el pool de workers en el event loop actual."""
+    global _loop, _wakeup
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    for _ in range(count):
+        _tasks.append(asyncio.create_task(_worker()))
+
+
+async def stop_workers():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,8 +1,118 @@
 from app.soap.client import set_trouble_ticket_by_value
 from app.models import Ticket
+from app.services.ticket_stats import invalidate_ticket_stats
+from app.services.events import bus
+from app.services.logger import log_event
+from app.services.ticket_states import STATE_CHANGE_SQL, parse_state, record_state_changes, state_group, state_label
 from app.database import engine
-from sqlmodel import Session
+from sqlalchemy import DateTime, bindparam, text
+from sqlmodel import Session, select
 from datetime import datetime
+from typing import Optional
+
+# Upsert por primary_key en una sola sentencia (SQLite >= 3.35 y PostgreSQL).
+# En la actualización los valores NULL conservan los existentes y
+# mirror_key/ticket_type no cambian. El estado solo cambia si la transición está
+# permitida (STATE_CHANGE_SQL); entonces state_changed_at pasa a ser updated_at,
+# que es como record_state_changes sabe qué filas cambiaron de estado. Es texto
+# fijo para que SQLAlchemy reutilice la compilación (el on_conflict_do_update de
+# SQLite no se cachea).
+_UPSERT_TICKET = (
+    "INSERT INTO ticket (primary_key, mirror_key, state, state_changed_at, dialog, ticket_type, clearance_person, "
+    "created_at, updated_at) "
+    "VALUES (:primary_key, :mirror_key, :state, :state_changed_at, :dialog, :ticket_type, 'ibiocom', "
+    ":created_at, :updated_at) "
+    "ON CONFLICT (primary_key) DO UPDATE SET "
+    f"state_changed_at = CASE WHEN {STATE_CHANGE_SQL} THEN excluded.updated_at ELSE ticket.state_changed_at END, "
+    f"state = CASE WHEN {STATE_CHANGE_SQL} THEN excluded.state ELSE ticket.state END, "
+    "dialog = COALESCE(excluded.dialog, ticket.dialog), "
+    "updated_at = excluded.updated_at"
+)
+_DATETIME_PARAMS = (bindparam("created_at", type_=DateTime), bindparam("updated_at", type_=DateTime),
+                    bindparam("state_changed_at", type_=DateTime))
+UPSERT_TICKET_SQL = text(
+    _UPSERT_TICKET + " RETURNING id, primary_key, mirror_key, state, dialog, ticket_type, state_changed_at"
+).bindparams(*_DATETIME_PARAMS).columns(state_changed_at=DateTime)
+# Versión sin RETURNING para executemany (un lote en una sola llamada al driver)
+UPSERT_TICKETS_SQL = text(_UPSERT_TICKET).bindparams(*_DATETIME_PARAMS)
+
+
+def _upsert_values(primary_key: str, mirror_key: str, state: Optional[str], dialog: Optional[str],
+                   ticket_type: Optional[str], now: datetime) -> dict:
+    return {
+        "primary_key": primary_key,
+        "mirror_key": mirror_key,
+        "state": state,
+        "state_changed_at": now if state else None,
+        "dialog": dialog,
+        "ticket_type": ticket_type or "ftth_cliente",
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _requested_state(primary_key: str, state: Optional[str]) -> Optional[str]:
+    """Estado recibido como valor de TicketState; los desconocidos no se aplican y quedan en el log."""
+    parsed = parse_state(state)
+    if state and parsed is None:
+        log_event("state_unknown", {"state": state}, primary_key, direction="in", status="error")
+    return parsed.value if parsed else None
+
+
+def upsert_ticket(session: Session, primary_key: str, mirror_key: str, state: Optional[str] = None,
+                  dialog: Optional[str] = None, ticket_type: Optional[str] = None, source: str = "webhook"):
+    """
+    Crea o actualiza el ticket en una sola sentencia: dos notificaciones
+    simultáneas del mismo ticket no pueden crear duplicados ni pisarse.
+    Registra el cambio de estado, si lo hay (ver ticket_states).
+    Devuelve la fila (id, primary_key, mirror_key, state, dialog, ticket_type,
+    state_changed_at). No hace commit.
+    """
+    state = _requested_state(primary_key, state)
+    values = _upsert_values(primary_key, mirror_key, state, dialog, ticket_type, datetime.utcnow())
+    connection = session.connection()
+    row = connection.execute(UPSERT_TICKET_SQL, values).one()
+    record_state_changes(connection, [row], values["updated_at"], {primary_key: state}, source)
+    return row
+
+
+def upsert_tickets(session: Session, items: list[dict], ticket_type: Optional[str] = None,
+                   source: str = "webhook") -> dict:
+    """
+    Upsert de un lote de tickets con executemany en la transacción de session.
+    items son dicts con primary_key, mirror_key, state y dialog; si un
+    primary_key se repite gana el último (y en el historial queda un solo
+    cambio de estado). Devuelve {primary_key: fila} con las columnas de
+    upsert_ticket. No hace commit.
+    """
+    if not items:
+        return {}
+    now = datetime.utcnow()
+    requested = {}
+    values = []
+    for item in items:
+        state = _requested_state(item["primary_key"], item.get("state"))
+        requested[item["primary_key"]] = state
+        values.append(_upsert_values(item["primary_key"], item["mirror_key"], state, item.get("dialog"),
+                                     ticket_type, now))
+    connection = session.connection()
+    connection.execute(UPSERT_TICKETS_SQL, values)
+
+    rows = connection.execute(
+        select(Ticket.id, Ticket.primary_key, Ticket.mirror_key, Ticket.state, Ticket.dialog, Ticket.ticket_type,
+               Ticket.state_changed_at)
+        .where(Ticket.primary_key.in_(list(requested)))
+    ).all()
+    record_state_changes(connection, rows, now, requested, source)
+    return {row.primary_key: row for row in rows}
+
+
+def publish_ticket_change(row, source: str = "webhook"):
+    """Avisa a las páginas abiertas de un ticket creado o actualizado (fila de upsert_ticket)."""
+    bus.publish("ticket", {"change": "upsert", "source": source, "id": row.id, "primary_key": row.primary_key,
+                           "mirror_key": row.mirror_key, "state": row.state, "state_label": state_label(row.state),
+                           "state_group": state_group(row.state), "updated_at": datetime.utcnow()})
+
 
 def handle_incoming_ticket(data: dict, ticket_type: str = "ftth_cliente"):
     """
@@ -15,24 +125,11 @@ def handle_incoming_ticket(data: dict, ticket_type: str = "ftth_cliente"):
     mirror_key = data.get("mirrorKey") or f"RED-{int(datetime.now().timestamp())}"
 
     with Session(engine) as session:
-        existing = session.query(Ticket).filter(Ticket.primary_key == primary_key).first()
-        if existing:
-            existing.state = state
-            existing.dialog = dialog
-            existing.updated_at = datetime.utcnow()
-            session.add(existing)
-            ticket = existing
-        else:
-            ticket = Ticket(
-                primary_key=primary_key,
-                mirror_key=mirror_key,
-                state=state,
-                dialog=dialog,
-                ticket_type=ticket_type  # <-- Aquí asignamos el tipo
-            )
-            session.add(ticket)
+        row = upsert_ticket(session, primary_key, mirror_key, state, dialog, ticket_type, source="simulate")
         session.commit()
-        session.refresh(ticket)
+        ticket = session.get(Ticket, row.id)
+    invalidate_ticket_stats()
+    publish_ticket_change(row)
     return ticket
 
 
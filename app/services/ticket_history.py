@@ -0,0 +1,76 @@
+import json
+from typing import List, Optional
+from sqlalchemy import event as sa_event
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import TicketEvent
+from app.services.events import bus
+
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 200
+
+
+def add_ticket_event(session: Session, ticket_id: int, event_type: str, dialog: Optional[str] = None,
+                     attachments: Optional[List[dict]] = None, raw_resolution: Optional[str] = None,
+                     user_email: Optional[str] = None) -> TicketEvent:
+    """
+    Añade una acción al historial del ticket. Es un INSERT: no lee ni reescribe
+    las anteriores, así que dos acciones simultáneas no se pisan. No hace commit:
+    las páginas abiertas se enteran cuando la sesión hace commit.
+    """
+    event = TicketEvent(ticket_id=ticket_id, event_type=event_type, dialog=dialog, raw_resolution=raw_resolution,
+                        attachments=json.dumps(attachments or []), user_email=user_email)
+    session.add(event)
+    session.info.setdefault("ticket_actions", []).append({
+        "change": "action", "id": ticket_id, "action": event_type, "user_email": user_email,
+        "created_at": event.created_at,
+    })
+    return event
+
+
+@sa_event.listens_for(Session, "after_commit")
+def _publish_actions(session: Session):
+    for data in session.info.pop("ticket_actions", []):
+        bus.publish("ticket", data)
+
+
+@sa_event.listens_for(Session, "after_rollback")
+def _discard_actions(session: Session):
+    session.info.pop("ticket_actions", None)
+
+
+def _event_to_dict(event: TicketEvent) -> dict:
+    try:
+        attachments = json.loads(event.attachments) if event.attachments else []
+    except ValueError:
+        attachments = []
+    return {
+        "id": event.id,
+        "event_type": event.event_type,
+        "created_at": event.created_at,
+        "dialog": event.dialog,
+        "raw_resolution": event.raw_resolution,
+        "attachments": attachments,
+        "user_email": event.user_email,
+    }
+
+
+def list_ticket_events(ticket_id: int, before: Optional[int] = None, limit: int = HISTORY_PAGE_SIZE):
+    """
+    Página del historial de un ticket, de la acción más reciente a la más antigua.
+    before es el id de la última acción de la página anterior (paginación por
+    cursor sobre el índice (ticket_id, id)). Devuelve (eventos, before_siguiente o None).
+    """
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    stmt = select(TicketEvent).where(TicketEvent.ticket_id == ticket_id)
+    if before:
+        stmt = stmt.where(TicketEvent.id < before)
+    stmt = stmt.order_by(TicketEvent.id.desc()).limit(limit + 1)
+    with Session(engine) as session:
+        events = session.exec(stmt).all()
+
+    next_before = None
+    if len(events) > limit:
+        events = events[:limit]
+        next_before = events[-1].id
+    return [_event_to_dict(event) for event in events], next_before
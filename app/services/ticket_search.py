@@ -0,0 +1,112 @@
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Union
+from sqlalchemy import inspect, text, tuple_, or_
+from sqlmodel import Session, select
+from app.database import engine
+from app.models import Ticket
+
+MAX_PAGE_SIZE = 200
+
+# Columnas del listado: nunca se cargan dialog ni los JSON de historial
+LIST_COLUMNS = (Ticket.id, Ticket.primary_key, Ticket.ticket_type, Ticket.state, Ticket.created_at, Ticket.updated_at)
+
+_fts_enabled: Optional[bool] = None
+
+
+def fts_enabled() -> bool:
+    """El índice FTS5 lo crea la migración ticket_fts; si no existe se busca con LIKE."""
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = engine.dialect.name == "sqlite" and inspect(engine).has_table("ticket_fts")
+    return _fts_enabled
+
+
+def _fts_query(q: str) -> str:
+    # Cada palabra como prefijo entrecomillado: los caracteres especiales de FTS5 no rompen la consulta
+    terms = [term.replace('"', '""') for term in q.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(created_at: datetime, ticket_id: int) -> str:
+    return f"{created_at.isoformat()}_{ticket_id}"
+
+
+def decode_cursor(cursor: str) -> Optional[tuple[datetime, int]]:
+    try:
+        created_at, ticket_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(created_at), int(ticket_id)
+    except ValueError:
+        return None
+
+
+def parse_date_filter(value: Optional[str]) -> Union[date, datetime, None]:
+    """
+    Fecha de un filtro recibida como texto: "YYYY-MM-DD" es un día entero
+    (date) y con hora es un instante (datetime). None si viene vacía; lanza
+    ValueError si no es una fecha válida.
+    """
+    if not value or not value.strip():
+        return None
+    value = value.strip()
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+def date_range(column, date_from: Union[date, datetime, None], date_to: Union[date, datetime, None]) -> list:
+    """
+    Condiciones de un filtro por fechas. date_to como día (date) incluye el día
+    entero; como instante (datetime) es el límite exacto.
+    """
+    conditions = []
+    if date_from:
+        if not isinstance(date_from, datetime):
+            date_from = datetime.combine(date_from, time.min)
+        conditions.append(column >= date_from)
+    if date_to:
+        if isinstance(date_to, datetime):
+            conditions.append(column <= date_to)
+        else:
+            conditions.append(column < datetime.combine(date_to, time.min) + timedelta(days=1))
+    return conditions
+
+
+def search_tickets(state: Optional[str] = None, ticket_type: Optional[str] = None,
+                   date_from: Union[date, datetime, None] = None, date_to: Union[date, datetime, None] = None,
+                   q: Optional[str] = None, cursor: Optional[str] = None, limit: int = 50):
+    """
+    Página de tickets ordenada por (created_at, id) descendente con paginación por cursor:
+    el coste de cada página no depende de cuántas haya antes.
+    Devuelve (filas, cursor_siguiente o None).
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    stmt = select(*LIST_COLUMNS)
+
+    if state:
+        stmt = stmt.where(Ticket.state == state)
+    if ticket_type:
+        stmt = stmt.where(Ticket.ticket_type == ticket_type)
+    for condition in date_range(Ticket.created_at, date_from, date_to):
+        stmt = stmt.where(condition)
+    if q and q.strip():
+        if fts_enabled():
+            matches = text("SELECT rowid FROM ticket_fts WHERE ticket_fts MATCH :q").bindparams(q=_fts_query(q))
+            stmt = stmt.where(Ticket.id.in_(matches))
+        else:
+            pattern = f"%{q.strip()}%"
+            stmt = stmt.where(or_(Ticket.primary_key.like(pattern), Ticket.mirror_key.like(pattern),
+                                  Ticket.dialog.like(pattern)))
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        stmt = stmt.where(tuple_(Ticket.created_at, Ticket.id) < position)
+
+    stmt = stmt.order_by(Ticket.created_at.desc(), Ticket.id.desc()).limit(limit + 1)
+    with Session(engine) as session:
+        rows = session.exec(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,219 @@
+"""
+Estados de los tickets (baseTroubleTicketState de OSS/J) y su historial.
+
+Ticket.state solo guarda valores de TicketState. Los cambios que llegan de
+Adamo se validan contra TRANSITIONS dentro del propio upsert (ver
+STATE_CHANGE_SQL en ticket_flow): un cambio no permitido deja el estado como
+estaba y queda en el log. Cada cambio aplicado añade una fila a
+ticket_state_change y suma el tiempo que el ticket pasó en el estado anterior
+a ticket_state_time, así los informes de SLA y backlog son un GROUP BY sobre
+tablas pequeñas en vez de recorrer los logs.
+"""
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from sqlalchemy import DateTime, bindparam, func, insert, text
+from sqlmodel import Session, select
+
+from app.database import engine
+from app.models import Ticket, TicketStateChange, TicketStateTime
+from app.services.logger import log_event
+from app.services.metrics import Counter
+
+
+class TicketState(str, Enum):
+    OPENQUEUED = "OPENQUEUED"  # recibido, sin empezar
+    OPENACTIVE = "OPENACTIVE"  # en curso
+    OPENHELD = "OPENHELD"  # en espera (información pedida, trabajo aplazado)
+    CLEARED = "CLEARED"  # resuelto, pendiente de cierre
+    CLOSED = "CLOSED"
+    CANCELLED = "CANCELLED"
+
+
+# Cambios permitidos desde cada estado. Un ticket sin estado (o con uno
+# anterior a esta tabla) puede pasar a cualquiera.
+TRANSITIONS = {
+    TicketState.OPENQUEUED: {TicketState.OPENACTIVE, TicketState.OPENHELD, TicketState.CLEARED,
+                             TicketState.CLOSED, TicketState.CANCELLED},
+    TicketState.OPENACTIVE: {TicketState.OPENQUEUED, TicketState.OPENHELD, TicketState.CLEARED,
+                             TicketState.CLOSED, TicketState.CANCELLED},
+    TicketState.OPENHELD: {TicketState.OPENQUEUED, TicketState.OPENACTIVE, TicketState.CLEARED,
+                           TicketState.CLOSED, TicketState.CANCELLED},
+    TicketState.CLEARED: {TicketState.OPENACTIVE, TicketState.CLOSED},  # resolución rechazada: se reabre
+    TicketState.CLOSED: set(),
+    TicketState.CANCELLED: set(),
+}
+
+STATE_LABELS = {
+    TicketState.OPENQUEUED: "En cola",
+    TicketState.OPENACTIVE: "Abierto",
+    TicketState.OPENHELD: "En espera",
+    TicketState.CLEARED: "Resuelto",
+    TicketState.CLOSED: "Cerrado",
+    TicketState.CANCELLED: "Cancelado",
+}
+
+# Tarjetas del dashboard (y clases CSS status-*)
+DASHBOARD_GROUPS = {
+    "abierto": (TicketState.OPENQUEUED, TicketState.OPENACTIVE),
+    "proceso": (TicketState.OPENHELD, TicketState.CLEARED),
+    "cerrado": (TicketState.CLOSED, TicketState.CANCELLED),
+}
+_GROUP_OF = {state.value: group for group, states in DASHBOARD_GROUPS.items() for state in states}
+
+CLOSED_STATES = tuple(state.value for state in DASHBOARD_GROUPS["cerrado"])
+
+# Etiquetas que se guardaban antes de existir TicketState
+LEGACY_STATES = {
+    "abierto": TicketState.OPENACTIVE,
+    "proceso": TicketState.OPENHELD,
+    "cerrado": TicketState.CLOSED,
+}
+
+STATE_TRANSITIONS = Counter("ticket_state_transitions_total", "Cambios de estado de tickets recibidos",
+                            ("outcome",))
+
+
+def parse_state(value: Optional[str]) -> Optional[TicketState]:
+    """TicketState de un texto (OPENACTIVE, openActive, OPEN_ACTIVE, abierto...) o None si no se reconoce."""
+    if not value:
+        return None
+    key = value.strip().replace("_", "").replace(" ", "").upper()
+    if key in TicketState.__members__:
+        return TicketState[key]
+    return LEGACY_STATES.get(value.strip().lower())
+
+
+def can_transition(from_state: Optional[str], to_state: str) -> bool:
+    if from_state not in TicketState.__members__:
+        return True
+    return to_state in TRANSITIONS[TicketState(from_state)]
+
+
+def state_label(state: Optional[str]) -> str:
+    return STATE_LABELS.get(state, state or "Sin estado")
+
+
+def state_group(state: Optional[str]) -> str:
+    return _GROUP_OF.get(state, "otro")
+
+
+def _sql_list(values) -> str:
+    return ", ".join(f"'{value}'" for value in sorted(values))
+
+
+# Condición SQL del upsert (ticket = fila actual, excluded = la recibida) para aplicar el estado recibido
+STATE_CHANGE_SQL = (
+    "excluded.state IS NOT NULL AND (ticket.state IS NULL OR (ticket.state <> excluded.state AND ("
+    f"ticket.state NOT IN ({_sql_list(state.value for state in TicketState)}) OR "
+    f"ticket.state || '>' || excluded.state IN ({_sql_list(f'{a.value}>{b.value}' for a, targets in TRANSITIONS.items() for b in targets)}))))"
+)
+
+_ADD_STATE_TIME = text(
+    "INSERT INTO ticket_state_time (state, ticket_type, total_seconds, exits) "
+    "VALUES (:state, :ticket_type, :seconds, :exits) "
+    "ON CONFLICT (state, ticket_type) DO UPDATE SET "
+    "total_seconds = ticket_state_time.total_seconds + excluded.total_seconds, "
+    "exits = ticket_state_time.exits + excluded.exits"
+)
+
+# Último cambio registrado de cada ticket (índice (ticket_id, changed_at); el id va implícito como rowid)
+_LAST_CHANGES = text(
+    "SELECT ticket_id, to_state, changed_at FROM ticket_state_change WHERE id IN ("
+    "SELECT MAX(id) FROM ticket_state_change WHERE ticket_id IN :ids GROUP BY ticket_id)"
+).bindparams(bindparam("ids", expanding=True)).columns(changed_at=DateTime)
+
+
+def record_state_changes(connection, rows, now: datetime, requested: dict, source: str = "webhook") -> list[dict]:
+    """
+    Registra los cambios de estado que acaba de aplicar el upsert. rows son las
+    filas de upsert_ticket(s) (id, primary_key, state, ticket_type,
+    state_changed_at); el estado cambió si state_changed_at == now. requested
+    es {primary_key: estado recibido} para dejar en el log los rechazados.
+    Va en la transacción del upsert (la fila ya está bloqueada). Devuelve los cambios.
+    """
+    changed = []
+    for row in rows:
+        wanted = requested.get(row.primary_key)
+        if row.state_changed_at == now:
+            changed.append(row)
+        elif wanted and wanted != row.state:
+            STATE_TRANSITIONS.inc(outcome="rejected")
+            log_event("state_transition_rejected", {"from": row.state, "to": wanted}, row.primary_key,
+                      direction="in", status="error")
+    if not changed:
+        return []
+
+    last = {r.ticket_id: r for r in connection.execute(_LAST_CHANGES, {"ids": [row.id for row in changed]})}
+    changes = []
+    state_times: dict[tuple, list] = {}
+    for row in changed:
+        previous = last.get(row.id)
+        seconds = (now - previous.changed_at).total_seconds() if previous else None
+        changes.append({"ticket_id": row.id, "ticket_type": row.ticket_type, "to_state": row.state,
+                        "from_state": previous.to_state if previous else None, "seconds": seconds,
+                        "source": source, "changed_at": now})
+        if previous:
+            totals = state_times.setdefault((previous.to_state, row.ticket_type), [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    connection.execute(insert(TicketStateChange.__table__), changes)
+    if state_times:
+        connection.execute(_ADD_STATE_TIME, [
+            {"state": state, "ticket_type": ticket_type, "seconds": seconds, "exits": exits}
+            for (state, ticket_type), (seconds, exits) in state_times.items()
+        ])
+    STATE_TRANSITIONS.inc(len(changes), outcome="applied")
+    return changes
+
+
+def list_state_changes(ticket_id: int) -> list[dict]:
+    """Historial de estados de un ticket, del más antiguo al más reciente."""
+    with Session(engine) as session:
+        changes = session.exec(
+            select(TicketStateChange).where(TicketStateChange.ticket_id == ticket_id)
+            .order_by(TicketStateChange.changed_at, TicketStateChange.id)
+        ).all()
+    return [{"from_state": change.from_state, "to_state": change.to_state, "seconds": change.seconds,
+             "source": change.source, "changed_at": change.changed_at} for change in changes]
+
+
+def state_report(now: Optional[datetime] = None) -> list[dict]:
+    """
+    Informe de SLA y backlog por estado y tipo de ticket: tickets que están
+    ahora en el estado, desde cuándo está el más antiguo, y tiempo medio de
+    permanencia de los que ya salieron. Son dos GROUP BY sobre índices.
+    """
+    now = now or datetime.utcnow()
+    with Session(engine) as session:
+        backlog = session.exec(
+            select(Ticket.state, Ticket.ticket_type, func.count(Ticket.id), func.min(Ticket.state_changed_at))
+            .group_by(Ticket.state, Ticket.ticket_type)
+        ).all()
+        times = session.exec(select(TicketStateTime)).all()
+
+    report = {}
+    for state, ticket_type, count, oldest in backlog:
+        report[(state, ticket_type)] = {
+            "state": state, "ticket_type": ticket_type, "open": count, "oldest_since": oldest,
+            "oldest_seconds": (now - oldest).total_seconds() if oldest else None,
+        }
+    for row in times:
+        entry = report.setdefault((row.state, row.ticket_type), {
+            "state": row.state, "ticket_type": row.ticket_type, "open": 0, "oldest_since": None,
+            "oldest_seconds": None,
+        })
+        entry["exits"] = row.exits
+        entry["avg_seconds"] = row.total_seconds / row.exits if row.exits else None
+
+    items = []
+    for entry in report.values():
+        entry.setdefault("exits", 0)
+        entry.setdefault("avg_seconds", None)
+        entry["label"] = state_label(entry["state"])
+        entry["group"] = state_group(entry["state"])
+        items.append(entry)
+    items.sort(key=lambda entry: (entry["state"] or "", entry["ticket_type"]))
+    return items
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from sqlmodel import Session, select, func
+from app.database import engine
+from app.models import Ticket
+from app.services.events import bus
+from app.services.ticket_states import DASHBOARD_GROUPS, state_group, state_label
+
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))  # segundos
+
+# generation sube con cada invalidación: un cálculo que empezó antes no se guarda
+_cache: dict = {"value": None, "expires": 0.0, "generation": 0}
+_lock = threading.Lock()
+
+
+def _compute_stats() -> dict:
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Ticket.state, Ticket.ticket_type, func.count(Ticket.id))
+            .group_by(Ticket.state, Ticket.ticket_type)
+        ).all()
+
+    by_state: dict[str, int] = {}
+    by_type: dict[str, int] = {}
+    by_group: dict[str, int] = {group: 0 for group in DASHBOARD_GROUPS}
+    for state, ticket_type, count in rows:
+        by_state[state] = by_state.get(state, 0) + count
+        by_type[ticket_type] = by_type.get(ticket_type, 0) + count
+        group = state_group(state)
+        by_group[group] = by_group.get(group, 0) + count
+
+    return {
+        "total": sum(by_state.values()),
+        "by_state": by_state,
+        "by_group": by_group,  # tarjetas del dashboard: abierto, proceso, cerrado (y otro)
+        "by_type": by_type,
+        "by_state_and_type": [
+            {"state": state, "ticket_type": ticket_type, "count": count} for state, ticket_type, count in rows
+        ],
+    }
+
+
+def get_ticket_stats() -> dict:
+    """
+    Contadores de tickets por estado y tipo (GROUP BY), cacheados hasta que un
+    webhook o flujo modifique tickets o pasen STATS_CACHE_TTL segundos.
+    """
+    now = time.monotonic()
+    with _lock:
+        if _cache["value"] is not None and now < _cache["expires"]:
+            return _cache["value"]
+        generation = _cache["generation"]
+
+    value = _compute_stats()
+    with _lock:
+        if _cache["generation"] == generation:
+            _cache["value"] = value
+            _cache["expires"] = now + STATS_CACHE_TTL
+    return value
+
+
+def invalidate_ticket_stats():
+    """Llamar tras crear, borrar o cambiar el estado/tipo de un ticket."""
+    with _lock:
+        _cache["value"] = None
+        _cache["generation"] += 1
+    # Los dashboards abiertos reciben las cifras nuevas (como mucho una consulta por segundo)
+    bus.publish_debounced("stats", stats_snapshot)
+
+
+def latest_tickets(limit: int = 5):
+    """Últimos tickets creados, solo con las columnas que pinta el dashboard."""
+    with Session(engine) as session:
+        return session.exec(
+            select(Ticket.id, Ticket.primary_key, Ticket.state, Ticket.ticket_type, Ticket.created_at)
+            .order_by(Ticket.created_at.desc(), Ticket.id.desc())
+            .limit(limit)
+        ).all()
+
+
+def stats_snapshot() -> dict:
+    """Lo que pinta el dashboard, para enviarlo por /web/events."""
+    latest = [{**row._mapping, "state_label": state_label(row.state), "state_group": state_group(row.state)}
+              for row in latest_tickets(5)]
+    return {"stats": get_ticket_stats(), "latest": latest}
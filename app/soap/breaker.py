@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import deque
+
+ADAMO_BREAKER_FAILURES = int(os.getenv("ADAMO_BREAKER_FAILURES", "5"))  # fallos seguidos para abrir
+ADAMO_BREAKER_COOLDOWN = float(os.getenv("ADAMO_BREAKER_COOLDOWN", "30"))  # segundos abierto antes de probar
+ADAMO_BREAKER_PROBES = int(os.getenv("ADAMO_BREAKER_PROBES", "1"))  # llamadas de prueba simultáneas en half_open
+ADAMO_TIMEOUT_MIN = float(os.getenv("ADAMO_TIMEOUT_MIN", "1"))
+ADAMO_TIMEOUT_FACTOR = float(os.getenv("ADAMO_TIMEOUT_FACTOR", "3"))  # timeout = p99 * factor
+ADAMO_LATENCY_WINDOW = int(os.getenv("ADAMO_LATENCY_WINDOW", "200"))
+ADAMO_LATENCY_MIN_SAMPLES = 20
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de un entorno de Adamo.
+
+    closed: las llamadas pasan; ADAMO_BREAKER_FAILURES fallos seguidos lo abren.
+    open: se rechazan sin llamar durante ADAMO_BREAKER_COOLDOWN segundos.
+    half_open: pasan hasta ADAMO_BREAKER_PROBES llamadas de prueba; si una va
+    bien se cierra y si falla se vuelve a abrir.
+
+    También calcula el timeout de cada llamada a partir del p99 de las últimas
+    latencias buenas, acotado entre ADAMO_TIMEOUT_MIN y max_timeout.
+    """
+
+    def __init__(self, name: str, max_timeout: float):
+        self.name = name
+        self.max_timeout = max_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._latencies: deque = deque(maxlen=ADAMO_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= ADAMO_BREAKER_COOLDOWN:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def fast_fail(self) -> bool:
+        """True si está abierto: el llamador debe fallar sin esperar hueco (cuenta como rechazo)."""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return False
+            self.rejected += 1
+            return True
+
+    def allow(self) -> bool:
+        """Reserva permiso para una llamada; False si hay que fallar rápido."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < ADAMO_BREAKER_PROBES:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, elapsed_s: float):
+        with self._lock:
+            self._latencies.append(elapsed_s)
+            self._failures = 0
+            self._state = CLOSED
+
+    def release(self):
+        """La llamada permitida no llegó a Adamo (error local): devuelve el permiso sin contar éxito ni fallo."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= ADAMO_BREAKER_FAILURES:
+                if self._state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def _percentile(self, pct: float) -> float | None:
+        if len(self._latencies) < ADAMO_LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+    def timeout(self) -> float:
+        """Timeout adaptativo para la siguiente llamada (segundos)."""
+        with self._lock:
+            p99 = self._percentile(99)
+        if p99 is None:
+            return self.max_timeout
+        return max(ADAMO_TIMEOUT_MIN, min(self.max_timeout, p99 * ADAMO_TIMEOUT_FACTOR))
+
+    def stats(self) -> dict:
+        with self._lock:
+            state = self._current_state()
+            p50, p99 = self._percentile(50), self._percentile(99)
+            failures = self._failures
+        return {
+            "state": state,
+            "consecutive_failures": failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_s": round(self.timeout(), 2),
+        }
@@ -1,31 +1,253 @@
 from zeep import Client, Settings
+from zeep.cache import SqliteCache
 from zeep.transports import Transport
-from zeep.exceptions import Fault
+from zeep.exceptions import Fault, TransportError, ValidationError
+from lxml import etree
 from requests import Session
+from requests.exceptions import RequestException
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+import asyncio
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from app.services.logger import log_event
+from app.services.attachments import materialize_attachments
+from app.services.metrics import Counter, Gauge, Histogram
+from app.soap.breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+from app.soap.rate_limit import TokenBucket
 
 WSDL_PRE = os.getenv("ADAMO_WSDL_PRE")
 WSDL_PRO = os.getenv("ADAMO_WSDL_PRO")
 ADAMO_USER = os.getenv("ADAMO_USER")
 ADAMO_PASS = os.getenv("ADAMO_PASS")
+ADAMO_TIMEOUT = float(os.getenv("ADAMO_TIMEOUT", "10"))
+ADAMO_POOL_SIZE = int(os.getenv("ADAMO_POOL_SIZE", "10"))
+WSDL_CACHE_PATH = os.getenv("ADAMO_WSDL_CACHE", "./zeep_cache.db")
+WSDL_CACHE_TTL = int(os.getenv("ADAMO_WSDL_CACHE_TTL", str(60 * 60 * 24)))  # 24 horas
+ADAMO_MAX_CONCURRENCY = int(os.getenv("ADAMO_MAX_CONCURRENCY", "8"))
+ADAMO_QUEUE_TIMEOUT = float(os.getenv("ADAMO_QUEUE_TIMEOUT", "5"))
+ADAMO_RATE_LIMIT = float(os.getenv("ADAMO_RATE_LIMIT", "20"))  # llamadas por segundo; 0 = sin límite
+ADAMO_RATE_BURST = int(os.getenv("ADAMO_RATE_BURST", "40"))
+ADAMO_BULK_RETRY = float(os.getenv("ADAMO_BULK_RETRY", "60"))  # segundos sin reintentar el WSDL tras un fallo
 
-def get_client(env: str = "PRE"):
+# Operación OSS/J multi-valor: si el WSDL la expone se envían varios tickets en una llamada
+BULK_OPERATION = "setTroubleTicketsByValues"
+
+# Registro de clientes por entorno (PRE/PRO): el WSDL se descarga y parsea una sola vez
+_clients: dict[str, Client] = {}
+_bulk_support: dict[str, bool] = {}  # por entorno, se calcula al construir el cliente
+_bulk_retry_at: dict[str, float] = {}  # por entorno, tras fallar la descarga del WSDL
+_clients_lock = threading.Lock()
+_wsdl_cache: SqliteCache | None = None
+
+# Latencia de llamadas SOAP: "cold" incluye la construcción del cliente, "warm" reutiliza uno existente
+_call_stats: dict[str, dict[str, dict]] = {}
+_stats_lock = threading.Lock()
+
+# Pool acotado para las llamadas SOAP desde código async: el event loop nunca espera a Adamo
+_executor = ThreadPoolExecutor(max_workers=ADAMO_MAX_CONCURRENCY, thread_name_prefix="adamo-soap")
+_slots = asyncio.Semaphore(ADAMO_MAX_CONCURRENCY)
+rate_limiter = TokenBucket(ADAMO_RATE_LIMIT, ADAMO_RATE_BURST)
+
+# Un circuit breaker por entorno: si Adamo PRO cae no se consumen hilos ni timeouts con PRE
+_breakers = {env: CircuitBreaker(env, max_timeout=ADAMO_TIMEOUT) for env in ("PRE", "PRO")}
+
+OSSJ_EXCEPTIONS = ("illegalArgumentException", "setException", "objectNotFoundException", "remoteException")
+
+# Faults que indican que el servicio de Adamo falla (el resto son errores de negocio de una respuesta válida)
+UPSTREAM_FAULTS = {None, "remoteException"}
+# Errores de red/HTTP (incluidos los timeouts): los únicos, junto a UPSTREAM_FAULTS, que cuentan para el circuito
+UPSTREAM_ERRORS = (RequestException, TransportError)
+# Payload que zeep no puede serializar: no se llega a enviar y reintentarlo no sirve
+PAYLOAD_ERRORS = (ValidationError, TypeError)
+
+SOAP_LATENCY = Histogram("adamo_soap_request_duration_seconds", "Latencia de las llamadas SOAP a Adamo",
+                         ("env", "operation"))
+SOAP_ERRORS = Counter("adamo_soap_errors_total",
+                      "Tickets no entregados a Adamo por tipo de error (excepción OSS/J o local)", ("env", "type"))
+_BREAKER_STATES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+Gauge("adamo_breaker_state", "Estado del circuit breaker (0 cerrado, 1 semiabierto, 2 abierto)", ("env",),
+      collect=lambda: {env: _BREAKER_STATES[b.state] for env, b in _breakers.items()})
+Counter("adamo_breaker_rejected_total", "Llamadas rechazadas por circuito abierto", ("env",),
+        collect=lambda: {env: b.rejected for env, b in _breakers.items()})
+Counter("adamo_rate_limit_waits_total", "Llamadas que esperaron al limitador de ritmo",
+        collect=lambda: rate_limiter.waited)
+
+
+def _normalize_env(env: str) -> str:
+    return "PRE" if env == "PRE" else "PRO"
+
+
+def get_breaker(env: str = "PRE") -> CircuitBreaker:
+    return _breakers[_normalize_env(env)]
+
+
+def _circuit_open_error(env: str, count: int = 1) -> dict:
+    _count_error(env, "circuit_open", count)
+    return {"error": f"Adamo {_normalize_env(env)} no disponible (circuito abierto)", "type": "circuit_open"}
+
+
+def _count_error(env: str, error_type, count: int = 1):
+    # Un Fault sin excepción OSS/J reconocible se cuenta como "fault"
+    SOAP_ERRORS.inc(count, env=_normalize_env(env), type=error_type or "fault")
+
+
+def _payload_error(env: str, error: Exception, primary_key=None) -> dict:
+    """Error local del mensaje (adjunto que falta, payload inválido): no es un fallo de Adamo."""
+    _count_error(env, "invalid_payload")
+    log_event("soap_out", str(error), primary_key, direction="out", status="error")
+    return {"error": str(error), "type": "invalid_payload"}
+
+
+def get_wsdl_cache() -> SqliteCache:
+    """Caché en disco de WSDL/XSD compartida por todos los clientes."""
+    global _wsdl_cache
+    if _wsdl_cache is None:
+        _wsdl_cache = SqliteCache(path=WSDL_CACHE_PATH, timeout=WSDL_CACHE_TTL)
+    return _wsdl_cache
+
+
+class AdamoTransport(Transport):
+    """
+    Transport con timeout de operación por llamada. El transport es uno por
+    entorno y lo comparten todos los hilos del pool: el timeout adaptativo del
+    breaker se guarda por hilo para que las llamadas simultáneas no se lo pisen.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._call_timeout = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def operation_timeout(self):
+        return getattr(self._call_timeout, "seconds", None) or self._operation_timeout
+
+    @operation_timeout.setter
+    def operation_timeout(self, value):
+        self._operation_timeout = value
+
+    @contextmanager
+    def call_timeout(self, seconds: float):
+        """Timeout de las peticiones que haga este hilo dentro del bloque."""
+        self._call_timeout.seconds = seconds
+        try:
+            yield
+        finally:
+            self._call_timeout.seconds = None
+
+
+def _build_client(env: str) -> Client:
     wsdl = WSDL_PRE if env == "PRE" else WSDL_PRO
     session = Session()
     if ADAMO_USER and ADAMO_PASS:
         session.auth = HTTPBasicAuth(ADAMO_USER, ADAMO_PASS)
-    transport = Transport(session=session, timeout=10)
+    # Pool de conexiones keep-alive: evita un handshake TLS por cada mensaje
+    adapter = HTTPAdapter(pool_connections=ADAMO_POOL_SIZE, pool_maxsize=ADAMO_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    transport = AdamoTransport(session=session, cache=get_wsdl_cache(),
+                               timeout=ADAMO_TIMEOUT, operation_timeout=ADAMO_TIMEOUT)
     settings = Settings(strict=False, xml_huge_tree=True)
     return Client(wsdl=wsdl, transport=transport, settings=settings)
 
+
+def get_client(env: str = "PRE"):
+    """
+    Devuelve el cliente zeep del entorno, creándolo solo la primera vez.
+    """
+    env = _normalize_env(env)
+    client = _clients.get(env)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(env)
+        if client is None:
+            client = _build_client(env)
+            _bulk_support[env] = BULK_OPERATION in client.service._operations
+            _clients[env] = client
+    return client
+
+
+def invalidate_client(env: str | None = None, clear_wsdl_cache: bool = False):
+    """
+    Descarta el cliente de un entorno (o de todos) para forzar su reconstrucción.
+    Con clear_wsdl_cache también se vacía la caché en disco de WSDL/XSD.
+    """
+    envs = [_normalize_env(env)] if env else list(_clients.keys())
+    with _clients_lock:
+        for e in envs:
+            client = _clients.pop(e, None)
+            _bulk_support.pop(e, None)
+            _bulk_retry_at.pop(e, None)
+            if client is not None:
+                client.transport.session.close()
+
+    if clear_wsdl_cache:
+        cache = get_wsdl_cache()
+        with cache.db_connection() as conn:
+            conn.execute("DELETE FROM request")
+            conn.commit()
+
+
+def _record_call(env: str, kind: str, elapsed_ms: float, operation: str = "setTroubleTicketByValue"):
+    SOAP_LATENCY.observe(elapsed_ms / 1000, env=env, operation=operation)
+    with _stats_lock:
+        env_stats = _call_stats.setdefault(env, {})
+        stats = env_stats.setdefault(kind, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+
+def get_client_stats() -> dict:
+    """
+    Latencia media/máxima de llamadas SOAP en frío y en caliente por entorno.
+    """
+    with _stats_lock:
+        result = {}
+        for env, kinds in _call_stats.items():
+            result[env] = {
+                kind: {
+                    "count": s["count"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2),
+                }
+                for kind, s in kinds.items()
+            }
+        result["cached_clients"] = sorted(_clients.keys())
+        result["rate_limit"] = rate_limiter.stats()
+        result["breakers"] = {env: breaker.stats() for env, breaker in _breakers.items()}
+        return result
+
+
+def _simulated() -> bool:
+    return os.getenv("ADAMO_SIMULATE", "true").lower() == "true"
+
+
+def _fault_type(fault: Fault):
+    """Tipo de excepción OSS/J de un Fault."""
+    detail = getattr(fault, "detail", None)
+    if detail is None:
+        return None
+    # zeep entrega el <detail> como elemento lxml: la excepción es uno de sus hijos
+    children = {etree.QName(child).localname for child in detail if isinstance(child.tag, str)} \
+        if isinstance(detail, etree._Element) else set()
+    for error_type in OSSJ_EXCEPTIONS:
+        if error_type in children or hasattr(detail, error_type):
+            return error_type
+    return None
+
+
 def set_trouble_ticket_by_value(payload: dict, env: str = "PRE", simulate_offline: bool = None):
     """
     Envía un ticket a Adamo. Maneja errores OSS/J específicos.
     """
     if simulate_offline is None:
-        simulate_offline = os.getenv("ADAMO_SIMULATE", "true").lower() == "true"
+        simulate_offline = _simulated()
 
     log_event("soap_out", payload, payload.get("primaryKey"), direction="out", status="pending")
 
@@ -34,28 +256,230 @@ def set_trouble_ticket_by_value(payload: dict, env: str = "PRE", simulate_offlin
         log_event("soap_out", result, payload.get("primaryKey"), direction="out", status="success")
         return result
 
+    env = _normalize_env(env)
+    try:
+        # El base64 de los adjuntos solo existe mientras se envía este mensaje
+        values = materialize_attachments(payload)
+    except Exception as e:
+        return _payload_error(env, e, payload.get("primaryKey"))
+
+    breaker = get_breaker(env)
+    if not breaker.allow():
+        result = _circuit_open_error(env)
+        log_event("soap_out", result["error"], payload.get("primaryKey"), direction="out", status="error")
+        return result
+
+    kind = "warm" if env in _clients else "cold"
+    start = time.perf_counter()
     try:
         client = get_client(env)
-        response = client.service.setTroubleTicketByValue(**payload)
+        with client.transport.call_timeout(breaker.timeout()):
+            response = client.service.setTroubleTicketByValue(**values)
+        elapsed = time.perf_counter() - start
+        _record_call(env, kind, elapsed * 1000)
+        breaker.record_success(elapsed)
         log_event("soap_out", response, payload.get("primaryKey"), direction="out", status="success")
         return response
     except Fault as fault:
-        # Extraer tipo de excepción OSS/J
-        error_type = None
-        if hasattr(fault, "detail") and fault.detail is not None:
-            detail = fault.detail
-            if hasattr(detail, "illegalArgumentException"):
-                error_type = "illegalArgumentException"
-            elif hasattr(detail, "setException"):
-                error_type = "setException"
-            elif hasattr(detail, "objectNotFoundException"):
-                error_type = "objectNotFoundException"
-            elif hasattr(detail, "remoteException"):
-                error_type = "remoteException"
-
+        elapsed = time.perf_counter() - start
+        _record_call(env, kind, elapsed * 1000)
+        error_type = _fault_type(fault)
+        _record_fault(breaker, error_type, elapsed)
+        _count_error(env, error_type)
         log_event("soap_out", str(fault), payload.get("primaryKey"), direction="out", status="error")
         return {"error": str(fault), "type": error_type}
+    except PAYLOAD_ERRORS as e:
+        breaker.release()
+        return _payload_error(env, e, payload.get("primaryKey"))
+    except UPSTREAM_ERRORS as e:
+        _record_call(env, kind, (time.perf_counter() - start) * 1000)
+        breaker.record_failure()
+        _count_error(env, "unknown")
+        log_event("soap_out", str(e), payload.get("primaryKey"), direction="out", status="error")
+        return {"error": str(e), "type": "unknown"}
     except Exception as e:
+        # Error nuestro, no de Adamo: se reintenta pero no cuenta para el circuito
+        breaker.release()
+        _count_error(env, "unknown")
         log_event("soap_out", str(e), payload.get("primaryKey"), direction="out", status="error")
         return {"error": str(e), "type": "unknown"}
 
+
+def _record_fault(breaker: CircuitBreaker, error_type, elapsed: float):
+    """Un error de negocio demuestra que Adamo responde; un remoteException o un fault sin tipo, no."""
+    if error_type in UPSTREAM_FAULTS:
+        breaker.record_failure()
+    else:
+        breaker.record_success(elapsed)
+
+
+async def aset_trouble_ticket_by_value(payload: dict, env: str = "PRE", simulate_offline: bool = None):
+    """
+    Versión asíncrona de set_trouble_ticket_by_value.
+    Ejecuta la llamada en el pool acotado; si todos los huecos siguen ocupados
+    tras ADAMO_QUEUE_TIMEOUT segundos se devuelve un error en vez de encolar sin límite.
+    """
+    if get_breaker(env).fast_fail():
+        # Fallo rápido sin ocupar hueco del pool ni token del limitador
+        return _circuit_open_error(env)
+
+    call = functools.partial(set_trouble_ticket_by_value, payload, env, simulate_offline)
+    result = await _run_limited(call, payload.get("primaryKey"))
+    if result is None:
+        _count_error(env, "busy")
+        return {"error": "Demasiadas llamadas simultáneas a Adamo", "type": "busy"}
+    return result
+
+
+async def _run_limited(call, primary_key=None):
+    """
+    Ejecuta call en el pool respetando el límite de ritmo global y el de
+    concurrencia. Devuelve None si no hubo hueco en ADAMO_QUEUE_TIMEOUT segundos.
+    El token de ritmo se toma ya con el hueco: una llamada que se rinde esperando
+    hueco no gasta token.
+    """
+    try:
+        await asyncio.wait_for(_slots.acquire(), timeout=ADAMO_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        log_event("soap_out", "Límite de concurrencia con Adamo alcanzado", primary_key,
+                  direction="out", status="error")
+        return None
+
+    try:
+        await rate_limiter.acquire()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, call)
+    finally:
+        _slots.release()
+
+
+def supports_bulk(env: str = "PRE") -> bool:
+    """
+    True si el WSDL del entorno expone la operación multi-valor. Se calcula una
+    vez por cliente; con el circuito abierto no se intenta construirlo (bajar
+    el WSDL bloquearía el hilo hasta el timeout) y se responde False. Si la
+    descarga falla se responde False durante ADAMO_BULK_RETRY segundos.
+    """
+    if _simulated():
+        return False
+    env = _normalize_env(env)
+    if env in _bulk_support:
+        return _bulk_support[env]
+    breaker = get_breaker(env)
+    if time.monotonic() < _bulk_retry_at.get(env, 0) or breaker.fast_fail():
+        return False
+    try:
+        get_client(env)
+    except Exception as e:
+        _bulk_retry_at[env] = time.monotonic() + ADAMO_BULK_RETRY
+        if isinstance(e, UPSTREAM_ERRORS):
+            breaker.record_failure()
+        log_event("soap_out", f"No se pudo cargar el WSDL de {env}: {e}", direction="out", status="error")
+        return False
+    return _bulk_support.get(env, False)
+
+
+def _bulk_results(response, count: int) -> list:
+    """
+    Resultado por ticket de la operación multi-valor. Con bestEffort OSS/J
+    devuelve un resultado por valor (success/exception); si la respuesta no
+    trae detalle por ticket se aplica la misma a todos.
+    """
+    items = response if isinstance(response, (list, tuple)) else getattr(response, "item", None)
+    if not isinstance(items, (list, tuple)) or len(items) != count:
+        return [response] * count
+    results = []
+    for item in items:
+        if getattr(item, "success", True) is False:
+            exception = str(getattr(item, "exception", None) or "setException")
+            error_type = exception if exception in OSSJ_EXCEPTIONS else "setException"
+            results.append({"error": exception, "type": error_type})
+        else:
+            results.append(item)
+    return results
+
+
+def set_trouble_tickets_by_values(payloads: list[dict], env: str = "PRE") -> list:
+    """
+    Envía varios tickets en una sola llamada (setTroubleTicketsByValues).
+    Devuelve un resultado por payload, en el mismo orden. Los payloads cuyos
+    adjuntos no se pueden leer no se envían y devuelven invalid_payload.
+    """
+    env = _normalize_env(env)
+    results: list = [None] * len(payloads)
+    pending, values = [], []
+    for index, payload in enumerate(payloads):
+        try:
+            values.append(materialize_attachments(payload))
+            pending.append(index)
+        except Exception as e:
+            results[index] = _payload_error(env, e, payload.get("primaryKey"))
+    if values:
+        for index, result in zip(pending, _send_bulk(values, env)):
+            results[index] = result
+    return results
+
+
+def _send_bulk(values: list[dict], env: str) -> list:
+    """Llamada multi-valor con los payloads ya materializados."""
+    keys = [v.get("primaryKey") for v in values]
+    log_event("soap_out", {"operation": BULK_OPERATION, "primaryKeys": keys}, direction="out", status="pending")
+    breaker = get_breaker(env)
+    if not breaker.allow():
+        return [_circuit_open_error(env, len(values))] * len(values)
+
+    kind = "warm" if env in _clients else "cold"
+    start = time.perf_counter()
+    try:
+        client = get_client(env)
+        with client.transport.call_timeout(breaker.timeout()):
+            response = getattr(client.service, BULK_OPERATION)(troubleTicketValues=values, bestEffort=True)
+        elapsed = time.perf_counter() - start
+        _record_call(env, kind, elapsed * 1000, BULK_OPERATION)
+        breaker.record_success(elapsed)
+        log_event("soap_out", {"operation": BULK_OPERATION, "primaryKeys": keys}, direction="out", status="success")
+        results = _bulk_results(response, len(values))
+        for result in results:
+            if isinstance(result, dict) and result.get("error"):
+                _count_error(env, result.get("type"))
+        return results
+    except Fault as fault:
+        elapsed = time.perf_counter() - start
+        _record_call(env, kind, elapsed * 1000, BULK_OPERATION)
+        error_type = _fault_type(fault)
+        _record_fault(breaker, error_type, elapsed)
+        _count_error(env, error_type, len(values))
+        log_event("soap_out", str(fault), direction="out", status="error")
+        return [{"error": str(fault), "type": error_type}] * len(values)
+    except PAYLOAD_ERRORS as e:
+        # Un payload inválido no debe tumbar a los demás: se envían uno a uno
+        breaker.release()
+        log_event("soap_out", str(e), direction="out", status="error")
+        return [set_trouble_ticket_by_value(value, env, simulate_offline=False) for value in values]
+    except UPSTREAM_ERRORS as e:
+        _record_call(env, kind, (time.perf_counter() - start) * 1000, BULK_OPERATION)
+        breaker.record_failure()
+        _count_error(env, "unknown", len(values))
+        log_event("soap_out", str(e), direction="out", status="error")
+        return [{"error": str(e), "type": "unknown"}] * len(values)
+    except Exception as e:
+        breaker.release()
+        _count_error(env, "unknown", len(values))
+        log_event("soap_out", str(e), direction="out", status="error")
+        return [{"error": str(e), "type": "unknown"}] * len(values)
+
+
+async def aset_trouble_tickets_by_values(payloads: list[dict], env: str = "PRE") -> list:
+    """Versión asíncrona de set_trouble_tickets_by_values (cuenta como una llamada)."""
+    if get_breaker(env).fast_fail():
+        return [_circuit_open_error(env, len(payloads))] * len(payloads)
+    call = functools.partial(set_trouble_tickets_by_values, payloads, env)
+    results = await _run_limited(call)
+    if results is None:
+        _count_error(env, "busy", len(payloads))
+        return [{"error": "Demasiadas llamadas simultáneas a Adamo", "type": "busy"}] * len(payloads)
+    return results
+
+
+def shutdown_executor():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,335 @@
+"""
+Servidor SOAP simulado de Adamo para medir el camino SOAP completo (zeep,
+XML y HTTP) sin red ni acceso a PRE/PRO.
+
+    python -m app.soap.mock_server --port 8088 --latency lognormal:80:0.5 \\
+        --faults remoteException=0.02,illegalArgumentException=0.01,timeout=0.005
+
+    ADAMO_SIMULATE=false ADAMO_WSDL_PRE=http://127.0.0.1:8088/?wsdl uvicorn app.main:app
+
+Rutas:
+    GET  /?wsdl   WSDL de app/soap/wsdl con la dirección de este servidor
+    POST /        setTroubleTicketByValue y setTroubleTicketsByValues
+    GET  /stats   contadores de peticiones, faults, latencias y throughput
+    POST /config  cambia latency/faults/timeout_delay en caliente (JSON)
+    POST /reset   pone a cero los contadores
+
+Latencias: fixed:MS, uniform:MIN_MS:MAX_MS, normal:MEDIA_MS:DESV_MS o
+lognormal:MEDIANA_MS:SIGMA. Faults: tipo=probabilidad separados por comas;
+"timeout" no responde hasta pasados timeout_delay segundos.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+WSDL_PATH = os.path.join(os.path.dirname(__file__), "wsdl", "adamo_tt_mock.wsdl")
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+TNS = "urn:adamo:ossj:tt:mock"
+FAULT_TYPES = ("illegalArgumentException", "setException", "objectNotFoundException", "remoteException", "timeout")
+# Faults de negocio: con bestEffort afectan a un ticket del lote, no a la llamada entera
+ITEM_FAULTS = ("illegalArgumentException", "setException", "objectNotFoundException")
+
+
+class LatencyModel:
+    """Distribución de la latencia simulada de Adamo, en segundos."""
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, *params = spec.split(":")
+        values = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Distribución de latencia desconocida: {kind}")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}[kind]
+        if len(values) != expected:
+            raise ValueError(f"{kind} necesita {expected} parámetros")
+        self.spec = spec
+        self.kind = kind
+        self.params = values
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = random.uniform(*self.params)
+        elif self.kind == "normal":
+            ms = random.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            ms = random.lognormvariate(math.log(max(median, 0.001)), sigma)
+        return max(0.0, ms) / 1000
+
+
+def parse_faults(spec: str) -> dict[str, float]:
+    faults = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, probability = item.partition("=")
+        if name not in FAULT_TYPES:
+            raise ValueError(f"Fault desconocido: {name}")
+        faults[name] = float(probability)
+    return faults
+
+
+class MockState:
+    """Configuración y contadores compartidos por los hilos del servidor."""
+
+    def __init__(self, latency: str, faults: str, timeout_delay: float):
+        self.lock = threading.Lock()
+        self.latency = LatencyModel(latency)
+        self.faults = parse_faults(faults)
+        self.timeout_delay = timeout_delay
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.requests = 0
+            self.tickets = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.by_operation: dict[str, int] = {}
+            self.by_outcome: dict[str, int] = {}
+            self.latencies: deque = deque(maxlen=10000)
+            self.recent: deque = deque(maxlen=100000)
+
+    def configure(self, config: dict):
+        latency = LatencyModel(config["latency"]) if "latency" in config else None
+        faults = config.get("faults")
+        if isinstance(faults, dict):
+            faults = ",".join(f"{name}={probability}" for name, probability in faults.items())
+        faults = parse_faults(faults) if faults is not None else None
+        with self.lock:
+            if latency is not None:
+                self.latency = latency
+            if faults is not None:
+                self.faults = faults
+            if "timeout_delay" in config:
+                self.timeout_delay = float(config["timeout_delay"])
+
+    def draw_fault(self, allowed=FAULT_TYPES) -> str | None:
+        roll = random.random()
+        cumulative = 0.0
+        for name, probability in self.faults.items():
+            if name not in allowed:
+                continue
+            cumulative += probability
+            if roll < cumulative:
+                return name
+        return None
+
+    def begin(self, operation: str, tickets: int):
+        with self.lock:
+            self.requests += 1
+            self.tickets += tickets
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.by_operation[operation] = self.by_operation.get(operation, 0) + 1
+
+    def end(self, outcome: str, elapsed: float):
+        with self.lock:
+            self.in_flight -= 1
+            self.by_outcome[outcome] = self.by_outcome.get(outcome, 0) + 1
+            self.latencies.append(elapsed)
+            self.recent.append(time.monotonic())
+
+    def stats(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            uptime = now - self.started
+            ordered = sorted(self.latencies)
+            last_10s = sum(1 for t in self.recent if now - t <= 10)
+
+            def pct(p):
+                return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2) if ordered else None
+
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": self.requests,
+                "tickets": self.tickets,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "by_operation": dict(self.by_operation),
+                "by_outcome": dict(self.by_outcome),
+                "throughput_rps": round(self.requests / uptime, 2) if uptime else 0.0,
+                "throughput_last_10s_rps": round(last_10s / min(10.0, uptime or 1), 2),
+                "latency_ms": {"p50": pct(50), "p95": pct(95), "p99": pct(99)},
+                "config": {"latency": self.latency.spec, "faults": dict(self.faults),
+                           "timeout_delay": self.timeout_delay},
+            }
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child_text(element, name: str):
+    for child in element:
+        if _local(child.tag) == name:
+            return child.text
+    return None
+
+
+def _primary_key(value) -> str | None:
+    key = _child_text(value, "primaryKey")
+    if key:
+        return key
+    for child in value:
+        if _local(child.tag) == "troubleTicketKey":
+            return _child_text(child, "primaryKey")
+    return None
+
+
+def _envelope(body: str) -> bytes:
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<soapenv:Envelope xmlns:soapenv="{SOAP_ENV}" xmlns:tns="{TNS}"><soapenv:Body>{body}'
+        f"</soapenv:Body></soapenv:Envelope>"
+    ).encode("utf-8")
+
+
+def _fault(fault_type: str, message: str) -> bytes:
+    return _envelope(
+        f"<soapenv:Fault><faultcode>soapenv:Server</faultcode><faultstring>{escape(message)}</faultstring>"
+        f"<detail><tns:{fault_type}>{escape(message)}</tns:{fault_type}></detail></soapenv:Fault>"
+    )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como el pool de requests del cliente
+    server_version = "AdamoMock/1.0"
+    state: MockState
+    verbose = False
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "text/xml; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, data: dict, status: int = 200):
+        self._send(status, json.dumps(data, indent=2).encode("utf-8"), "application/json")
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            return self._send_json(self.state.stats())
+        if "wsdl" in self.path.lower():
+            with open(WSDL_PATH, encoding="utf-8") as f:
+                wsdl = f.read()
+            host, port = self.server.server_address[:2]
+            wsdl = wsdl.replace("http://127.0.0.1:8088/", f"http://{host}:{port}/")
+            return self._send(200, wsdl.encode("utf-8"))
+        self._send(404, b"")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/config"):
+            try:
+                self.state.configure(json.loads(body or b"{}"))
+            except ValueError as e:
+                return self._send_json({"error": str(e)}, 400)
+            return self._send_json(self.state.stats()["config"])
+        if self.path.startswith("/reset"):
+            self.state.reset()
+            return self._send_json({"status": "ok"})
+        self._handle_soap(body)
+
+    def _handle_soap(self, body: bytes):
+        start = time.perf_counter()
+        try:
+            envelope = ET.fromstring(body)
+            soap_body = next(el for el in envelope if _local(el.tag) == "Body")
+            request = next(iter(soap_body))
+        except (ET.ParseError, StopIteration):
+            self.state.begin("invalid", 0)
+            self.state.end("illegalArgumentException", time.perf_counter() - start)
+            return self._send(500, _fault("illegalArgumentException", "Mensaje SOAP inválido"))
+
+        operation = _local(request.tag)
+        values = [v for v in request if _local(v.tag) == "troubleTicketValues"] \
+            if operation == "setTroubleTicketsByValues" else [request]
+        self.state.begin(operation, len(values))
+
+        time.sleep(self.state.latency.sample())
+        fault = self.state.draw_fault()
+        if fault == "timeout":
+            time.sleep(self.state.timeout_delay)
+        if fault and (operation != "setTroubleTicketsByValues" or fault not in ITEM_FAULTS):
+            self.state.end(fault, time.perf_counter() - start)
+            return self._send(500, _fault(fault if fault != "timeout" else "remoteException",
+                                          f"Fault simulado: {fault}"))
+
+        if operation == "setTroubleTicketByValue":
+            key = escape(_primary_key(request) or "")
+            response = (f"<tns:setTroubleTicketByValueResponse><tns:troubleTicketKey><tns:primaryKey>{key}"
+                        f"</tns:primaryKey></tns:troubleTicketKey><tns:status>OK</tns:status>"
+                        f"</tns:setTroubleTicketByValueResponse>")
+        elif operation == "setTroubleTicketsByValues":
+            results = []
+            for value in values:
+                item_fault = self.state.draw_fault(ITEM_FAULTS)
+                key = escape(_primary_key(value) or "")
+                if item_fault:
+                    results.append(f"<tns:results><tns:primaryKey>{key}</tns:primaryKey><tns:success>false"
+                                   f"</tns:success><tns:exception>{item_fault}</tns:exception></tns:results>")
+                else:
+                    results.append(f"<tns:results><tns:primaryKey>{key}</tns:primaryKey>"
+                                   f"<tns:success>true</tns:success></tns:results>")
+            response = f"<tns:setTroubleTicketsByValuesResponse>{''.join(results)}</tns:setTroubleTicketsByValuesResponse>"
+        else:
+            self.state.end("illegalArgumentException", time.perf_counter() - start)
+            return self._send(500, _fault("illegalArgumentException", f"Operación desconocida: {operation}"))
+
+        self.state.end("ok", time.perf_counter() - start)
+        self._send(200, _envelope(response))
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8088, latency: str = "fixed:0", faults: str = "",
+                timeout_delay: float = 30.0, verbose: bool = False) -> ThreadingHTTPServer:
+    """Crea el servidor (sin arrancarlo); con port=0 elige un puerto libre."""
+    handler = type("Handler", (MockHandler,), {"state": MockState(latency, faults, timeout_delay), "verbose": verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_thread(**kwargs) -> ThreadingHTTPServer:
+    """Arranca el servidor en un hilo de fondo (para benchmarks); server.shutdown() lo para."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, name="adamo-mock", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency", default="fixed:50", help="fixed:MS | uniform:MIN:MAX | normal:MEDIA:DESV | "
+                                                              "lognormal:MEDIANA:SIGMA (ms)")
+    parser.add_argument("--faults", default="", help="p.ej. remoteException=0.02,timeout=0.01")
+    parser.add_argument("--timeout-delay", type=float, default=30.0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.latency, args.faults, args.timeout_delay, args.verbose)
+    print(f"Adamo simulado en http://{args.host}:{args.port}/?wsdl (latencia {args.latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
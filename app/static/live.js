@@ -0,0 +1,40 @@
+// Actualizaciones en vivo desde /web/events (Server-Sent Events).
+// Cada página indica los temas que escucha y qué hace con cada evento;
+// el navegador reconecta solo y el servidor reenvía lo que se perdió.
+function liveUpdates(handlers) {
+  if (!window.EventSource) return null;
+  var topics = Object.keys(handlers);
+  var source = new EventSource('/web/events?topics=' + topics.join(','));
+  topics.forEach(function (topic) {
+    source.addEventListener(topic, function (e) { handlers[topic](JSON.parse(e.data)); });
+  });
+  // El servidor ya no tiene los eventos perdidos (o se reinició): se recarga la página entera
+  source.addEventListener('reset', function () { location.reload(); });
+  return source;
+}
+
+function liveCell(tag, text, className) {
+  var node = document.createElement(tag);
+  if (className) node.className = className;
+  node.textContent = text == null || text === '' ? '-' : text;
+  return node;
+}
+
+function liveDate(value, seconds) {
+  return value ? value.replace('T', ' ').slice(0, seconds ? 19 : 16) : '';
+}
+
+// Aviso "hay N cambios" con enlace para recargar, para lo que no se puede pintar en la página actual
+function liveNotice(container, text) {
+  var notice = container.querySelector('.live-notice');
+  if (!notice) {
+    notice = document.createElement('a');
+    notice.className = 'live-notice';
+    notice.dataset.count = '0';
+    container.prepend(notice);
+  }
+  notice.dataset.count = String(Number(notice.dataset.count) + 1);
+  notice.href = notice.dataset.href || location.href;
+  notice.textContent = text.replace('{n}', notice.dataset.count);
+  return notice;
+}
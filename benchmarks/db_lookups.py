@@ -0,0 +1,105 @@
+"""
+Latencia de las consultas calientes de Ticket y Log antes y después de los
+índices de las migraciones.
+
+Crea una base SQLite aparte, aplica solo la migración baseline, la llena con
+tickets y logs sintéticos y mide; después aplica el resto de migraciones y
+vuelve a medir sobre los mismos datos. Muestra el plan de cada consulta.
+
+    python -m benchmarks.db_lookups --tickets 1000000 --logs 10000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from app.database import make_engine
+from app.migrations import run_migrations
+from benchmarks.common import summarize, timed, save_results
+from benchmarks.seed import seed_tickets, seed_logs
+
+# Índices que crean las migraciones 2 y 3; la baseline sobre una base nueva ya
+# los trae de los modelos, así que se quitan para medir el esquema anterior.
+MIGRATION_INDEXES = [
+    "ix_ticket_primary_key", "ix_ticket_created_at", "ix_ticket_state_type", "ix_ticket_state_created",
+    "ix_ticket_type_created", "ix_log_created_at", "ix_log_ticket_created",
+]
+
+QUERIES = {
+    "ticket_by_primary_key": "SELECT id, state FROM ticket WHERE primary_key = :pk",
+    "log_page": "SELECT id, event_type, status, created_at FROM log ORDER BY created_at DESC LIMIT 50",
+    "logs_of_ticket": (
+        "SELECT id, event_type, status, created_at FROM log "
+        "WHERE ticket_primary_key = :pk ORDER BY created_at DESC LIMIT 50"
+    ),
+}
+
+
+def seed(engine, tickets: int, logs: int):
+    raw = engine.raw_connection()
+    try:
+        seed_tickets(raw, tickets)
+        seed_logs(raw, logs, tickets)
+    finally:
+        raw.close()
+
+
+def measure(engine, tickets: int, iterations: int) -> dict:
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), {"pk": "BENCH-00000001"})]
+            keys = [f"BENCH-{random.randrange(tickets):08d}" for _ in range(iterations)]
+            samples = timed(lambda i: conn.execute(text(sql), {"pk": keys[i]}).all(), iterations)
+            results[name] = {"plan": plan, **summarize(samples)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=1_000_000)
+    parser.add_argument("--logs", type=int, default=10_000_000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--db", help="Ruta de la base de pruebas (por defecto un temporal)")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "bench.db")
+    engine = make_engine(f"sqlite:///{path}", echo=False)
+    run_migrations(engine, target=1)
+    with engine.begin() as conn:
+        for index in MIGRATION_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+
+    start = time.perf_counter()
+    seed(engine, args.tickets, args.logs)
+    seed_seconds = time.perf_counter() - start
+    print(f"Sembrados {args.tickets} tickets y {args.logs} logs en {seed_seconds:.1f}s ({path})")
+
+    before = measure(engine, args.tickets, args.iterations)
+    start = time.perf_counter()
+    run_migrations(engine)
+    migrate_seconds = time.perf_counter() - start
+    after = measure(engine, args.tickets, args.iterations)
+
+    for name in QUERIES:
+        print(f"{name}:")
+        print(f"  sin índices  p50={before[name]['p50_ms']}ms p99={before[name]['p99_ms']}ms  {before[name]['plan']}")
+        print(f"  con índices  p50={after[name]['p50_ms']}ms p99={after[name]['p99_ms']}ms  {after[name]['plan']}")
+
+    output = save_results("db_lookups", {
+        "tickets": args.tickets,
+        "logs": args.logs,
+        "seed_seconds": round(seed_seconds, 1),
+        "migrate_seconds": round(migrate_seconds, 1),
+        "before_indexes": before,
+        "after_indexes": after,
+    }, args.output)
+    print(f"Resultados en {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Pico de inicios de sesión (cambio de turno) contra POST /auth/login.
+
+Crea usuarios de prueba en una base temporal y, para cada valor de
+--workers (PASSWORD_HASH_WORKERS del servidor), arranca la aplicación con
+uvicorn y lanza --logins inicios de sesión desde --concurrency conexiones a
+la vez. Mientras dura el pico, una sonda pide /health cada 50 ms: su latencia
+muestra si bcrypt está bloqueando el event loop.
+
+Con --seed-rounds distinto de --rounds los hashes guardados usan otro coste y
+el primer login de cada usuario lo regenera (verify_and_update).
+
+    python -m benchmarks.login_storm --users 50 --logins 300 --concurrency 50 --workers 0,2,4
+    python -m benchmarks.login_storm --rounds 10 --seed-rounds 12
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from passlib.context import CryptContext
+from sqlalchemy import text
+
+from benchmarks.common import HttpConnection, summarize, save_results
+from benchmarks.run_suite import free_port, proc_memory_kb, start_server, stop_server
+
+PASSWORD = "turno-de-noche"
+
+
+def create_users(url: str, users: int, rounds: int) -> list[str]:
+    from app.database import make_engine
+    from app.migrations import run_migrations
+
+    engine = make_engine(url, echo=False)
+    run_migrations(engine)
+    # Mismo hash para todos: el coste de verificar no depende de la sal
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds).hash(PASSWORD)
+    emails = [f"tecnico{i}@ibiocom.local" for i in range(users)]
+    with engine.begin() as conn:
+        conn.execute(text('DELETE FROM "user"'))
+        conn.execute(
+            text('INSERT INTO "user" (email, password_hash, role, created_at) VALUES (:e, :h, :r, :t)'),
+            [{"e": email, "h": password_hash, "r": "tecnico", "t": datetime.utcnow()} for email in emails],
+        )
+    engine.dispose()
+    return emails
+
+
+async def storm(port: int, emails: list[str], logins: int, concurrency: int) -> dict:
+    samples: list[float] = []
+    probes: list[float] = []
+    statuses: dict = {}
+    pending = list(range(logins))
+    done = asyncio.Event()
+
+    async def client():
+        conn = HttpConnection("127.0.0.1", port)
+        await conn.open()
+        try:
+            while pending:
+                i = pending.pop()
+                body = json.dumps({"email": emails[i % len(emails)], "password": PASSWORD}).encode()
+                start = time.perf_counter()
+                status, _ = await conn.request("POST", "/auth/login", body)
+                samples.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            await conn.close()
+
+    async def probe():
+        conn = HttpConnection("127.0.0.1", port)
+        await conn.open()
+        try:
+            while not done.is_set():
+                start = time.perf_counter()
+                await conn.request("GET", "/health")
+                probes.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.05)
+        finally:
+            await conn.close()
+
+    probe_task = asyncio.create_task(probe())
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await probe_task
+    return {
+        "logins": logins,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 2),
+        "logins_per_second": round(logins / elapsed, 1),
+        "login_latency": summarize(samples),
+        "health_latency_during_storm": summarize(probes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", default="0,2", help="Valores de PASSWORD_HASH_WORKERS a comparar")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS del servidor")
+    parser.add_argument("--seed-rounds", type=int, help="Coste de los hashes guardados (por defecto --rounds)")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench-login-")
+    results = {"users": args.users, "concurrency": args.concurrency, "rounds": args.rounds,
+               "seed_rounds": args.seed_rounds or args.rounds, "cpu_count": os.cpu_count(), "runs": {}}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        url = f"sqlite:///{os.path.join(scratch, f'login-{workers}.db')}"
+        emails = create_users(url, args.users, args.seed_rounds or args.rounds)
+        port = free_port()
+        server = start_server(port, {
+            "DATABASE_URL": url,
+            "BCRYPT_ROUNDS": str(args.rounds),
+            "PASSWORD_HASH_WORKERS": str(workers),
+        }, os.path.join(scratch, f"server-{workers}.log"))
+        try:
+            run = asyncio.run(storm(port, emails, args.logins, args.concurrency))
+            run["server_rss_kb"] = proc_memory_kb(server.pid).get("VmHWM")
+        finally:
+            stop_server(server)
+        results["runs"][f"workers={workers}"] = run
+        print(f"workers={workers}: {run['logins_per_second']} logins/s  "
+              f"login p50={run['login_latency']['p50_ms']}ms p99={run['login_latency']['p99_ms']}ms  "
+              f"/health p50={run['health_latency_during_storm']['p50_ms']}ms "
+              f"p99={run['health_latency_during_storm']['p99_ms']}ms  {run['statuses']}")
+
+    print(f"Resultados en {save_results('login_storm', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
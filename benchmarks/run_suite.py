@@ -0,0 +1,334 @@
+"""
+Benchmark de extremo a extremo del servicio de ticketing.
+
+Siembra una base con tickets y logs sintéticos (benchmarks.seed), arranca el
+servidor simulado de Adamo y la aplicación con uvicorn en un subproceso
+apuntando a esa base, inicia sesión en la web y en la API y lanza cada
+escenario desde varias conexiones keep-alive. Por escenario mide latencias
+p50/p95/p99, throughput y memoria del servidor; al final añade el pico de RSS
+(VmHWM) y el /health del servidor, y guarda todo en benchmarks/results.
+
+Con --baseline compara contra un resultado anterior y termina con código 1 si
+algún escenario empeora más de --max-regression por ciento en p95 o en
+throughput, para detectar regresiones entre versiones.
+
+    python -m benchmarks.run_suite --tickets 100000 --logs 1000000 --requests 1000 --concurrency 16
+    python -m benchmarks.run_suite --baseline benchmarks/results/run_suite-20251020-101500.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+from sqlalchemy import text
+
+from benchmarks.common import HttpConnection, summarize, save_results
+from benchmarks.seed import seed, ticket_key, BENCH_USER, BENCH_PASSWORD
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOUNDARY = "----bench-suite-boundary"
+
+
+class Context:
+    """Datos compartidos por los escenarios: token, tickets de cada tipo y adjunto opcional."""
+
+    def __init__(self, token: str, ticket_ids: dict, tickets: int, attachment_bytes: int):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.token = token
+        self.ticket_ids = ticket_ids
+        self.tickets = tickets
+        self.attachment = os.urandom(attachment_bytes) if attachment_bytes else b""
+
+    @property
+    def bearer(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+def multipart(fields: dict, files: list[tuple[str, str, bytes]] = ()) -> tuple[bytes, str]:
+    """Cuerpo multipart/form-data con campos de texto y (nombre_campo, fichero, contenido)."""
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        parts.append(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b"\r\n")
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={BOUNDARY}"
+
+
+# Cada escenario devuelve (método, ruta, cuerpo, content_type, cabeceras) para la petición i
+
+def webhook(ctx: Context, i: int):
+    # Mitad tickets nuevos, mitad actualizaciones de tickets sembrados
+    if i % 2:
+        pk = f"SUITE-{ctx.run_id}-{i}"
+    else:
+        pk = ticket_key(random.randrange(ctx.tickets))
+    body = json.dumps({"primaryKey": pk, "baseTroubleTicketState": random.choice(["OPENACTIVE", "CLOSED"]),
+                       "dialog": f"Notificación del benchmark {i}"}).encode()
+    return "POST", "/webhook/adamo", body, "application/json", None
+
+
+def api_tickets(ctx: Context, i: int):
+    offset = random.randrange(max(ctx.tickets - 50, 1))
+    return "GET", f"/tickets/?limit=50&offset={offset}", b"", "application/json", ctx.bearer
+
+
+def web_dashboard(ctx: Context, i: int):
+    return "GET", "/web/dashboard", b"", "text/html", None
+
+
+def web_tickets(ctx: Context, i: int):
+    filters = random.choice([{}, {"state": "abierto"}, {"ticket_type": "ftth_masivo"},
+                             {"q": f"CTO {random.randrange(5000)}"}])
+    return "GET", "/web/tickets?" + urllib.parse.urlencode({**filters, "limit": 50}), b"", "text/html", None
+
+
+def web_logs(ctx: Context, i: int):
+    offset = random.randrange(100) * 50
+    return "GET", f"/web/logs?limit=50&offset={offset}", b"", "text/html", None
+
+
+def _action(ticket_type: str, action: str):
+    def build(ctx: Context, i: int):
+        ticket_id = random.choice(ctx.ticket_ids[ticket_type])
+        files = [("attachments", f"adjunto-{i}.bin", ctx.attachment)] if ctx.attachment else []
+        body, content_type = multipart({"dialog": f"Acción {action} del benchmark {i}",
+                                        "idempotency_key": f"suite-{ctx.run_id}-{action}-{ticket_type}-{i}"},
+                                       files)
+        return "POST", f"/web/tickets/{ticket_id}/{action}", body, content_type, None
+    return build
+
+
+SCENARIOS = {
+    "webhook": webhook,
+    "api_tickets": api_tickets,
+    "web_dashboard": web_dashboard,
+    "web_tickets": web_tickets,
+    "web_logs": web_logs,
+    "ftth_request_info": _action("ftth_cliente", "request_info"),
+    "ftth_send_report": _action("ftth_cliente", "send_report"),
+    "ftth_massive_request_info": _action("ftth_masivo", "request_info"),
+    "ftth_massive_send_report": _action("ftth_masivo", "send_report"),
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def proc_memory_kb(pid: int) -> dict:
+    """VmRSS y VmHWM (pico de RSS) del proceso; vacío fuera de Linux."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return {line.split(":")[0]: int(line.split()[1]) for line in f
+                    if line.startswith(("VmRSS", "VmHWM"))}
+    except OSError:
+        return {}
+
+
+def http(url: str, data: bytes | None = None, content_type: str = "application/json", timeout: float = 10):
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, response.read()
+
+
+def start_server(port: int, env: dict, log_path: str) -> subprocess.Popen:
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning", "--no-access-log"]
+    process = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env},
+                               stdout=open(log_path, "w"), stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar, ver {log_path}")
+        try:
+            http(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"El servidor no respondió en 60s, ver {log_path}")
+
+
+def stop_server(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def login(base: str) -> str:
+    # La web guarda la sesión en el proceso: basta con un login para todas las conexiones
+    form = urllib.parse.urlencode({"email": BENCH_USER, "password": BENCH_PASSWORD}).encode()
+    http(f"{base}/web/login", form, "application/x-www-form-urlencoded")
+    credentials = json.dumps({"email": BENCH_USER, "password": BENCH_PASSWORD}).encode()
+    _, body = http(f"{base}/auth/login", credentials)
+    return json.loads(body)["access_token"]
+
+
+def sample_ticket_ids(url: str) -> dict:
+    from app.database import make_engine
+    engine = make_engine(url, echo=False)
+    ids = {}
+    with engine.connect() as conn:
+        for ticket_type in ("ftth_cliente", "ftth_masivo"):
+            ids[ticket_type] = [row[0] for row in conn.execute(
+                text("SELECT id FROM ticket WHERE ticket_type = :t LIMIT 1000"), {"t": ticket_type})]
+    engine.dispose()
+    return ids
+
+
+async def run_scenario(port: int, build, ctx: Context, requests: int, concurrency: int, warmup: int) -> dict:
+    samples: list[float] = []
+    statuses: dict = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def client(index: int):
+        conn = HttpConnection("127.0.0.1", port)
+        await conn.open()
+        try:
+            for i in range(warmup):
+                method, path, body, content_type, headers = build(ctx, -(index * warmup + i + 1))
+                await conn.request(method, path, body, content_type, headers)
+            while not queue.empty():
+                method, path, body, content_type, headers = build(ctx, queue.get_nowait())
+                start = time.perf_counter()
+                status, _ = await conn.request(method, path, body, content_type, headers)
+                samples.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client(n) for n in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if status >= 300),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "elapsed_seconds": round(elapsed, 2),
+        "requests_per_second": round(requests / elapsed, 1),
+        "latency": summarize(samples),
+    }
+
+
+def compare(baseline: dict, current: dict, max_regression: float) -> list[str]:
+    """Escenarios cuyo p95 sube o cuyo throughput baja más de max_regression por ciento."""
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        p95_change = (now["latency"]["p95_ms"] / max(before["latency"]["p95_ms"], 0.001) - 1) * 100
+        rps_change = (now["requests_per_second"] / max(before["requests_per_second"], 0.001) - 1) * 100
+        flag = p95_change > max_regression or rps_change < -max_regression
+        print(f"  {name:28} p95 {before['latency']['p95_ms']:>9} -> {now['latency']['p95_ms']:>9} ms "
+              f"({p95_change:+.1f}%)  rps {before['requests_per_second']:>8} -> {now['requests_per_second']:>8} "
+              f"({rps_change:+.1f}%){'  REGRESIÓN' if flag else ''}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickets", type=int, default=10_000, help="Tickets sintéticos (10k-1M)")
+    parser.add_argument("--logs", type=int, default=100_000)
+    parser.add_argument("--database-url", help="Base a sembrar y usar (por defecto una temporal, nunca dev.db)")
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones medidas por escenario")
+    parser.add_argument("--concurrency", type=int, default=16, help="Conexiones simultáneas")
+    parser.add_argument("--warmup", type=int, default=2, help="Peticiones sin medir por conexión")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Lista separada por comas")
+    parser.add_argument("--attachment-bytes", type=int, default=0, help="Adjunto en las acciones ftth")
+    parser.add_argument("--mock-latency", default="fixed:20", help="Latencia del Adamo simulado")
+    parser.add_argument("--baseline", help="Resultado anterior con el que comparar")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Porcentaje tolerado")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Escenarios desconocidos: {', '.join(unknown)}")
+
+    scratch = tempfile.mkdtemp(prefix="bench-suite-")
+    url = args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    seeded = seed(url, args.tickets, args.logs)
+    print(f"Base {url}: +{seeded['tickets_added']} tickets, +{seeded['logs_added']} logs en {seeded['seed_seconds']}s")
+    ticket_ids = sample_ticket_ids(url)
+
+    from app.soap.mock_server import start_in_thread
+    mock = start_in_thread(port=0, latency=args.mock_latency)
+    wsdl = f"http://127.0.0.1:{mock.server_address[1]}/?wsdl"
+    port = free_port()
+    server = start_server(port, {
+        "DATABASE_URL": url,
+        "ADAMO_SIMULATE": "false",
+        "ADAMO_WSDL_PRE": wsdl,
+        "ADAMO_WSDL_PRO": wsdl,
+        "ADAMO_WSDL_CACHE": os.path.join(scratch, "zeep_cache.db"),
+        "ATTACHMENTS_DIR": os.path.join(scratch, "blobs"),
+    }, os.path.join(scratch, "server.log"))
+
+    base = f"http://127.0.0.1:{port}"
+    scenarios = {}
+    try:
+        ctx = Context(login(base), ticket_ids, args.tickets, args.attachment_bytes)
+        for name in names:
+            result = asyncio.run(run_scenario(port, SCENARIOS[name], ctx, args.requests, args.concurrency,
+                                              args.warmup))
+            result["rss_kb"] = proc_memory_kb(server.pid).get("VmRSS")
+            scenarios[name] = result
+            latency = result["latency"]
+            print(f"{name:28} {result['requests_per_second']:>8} req/s  p50={latency['p50_ms']}ms "
+                  f"p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms  errores={result['errors']}")
+        memory = proc_memory_kb(server.pid)
+        _, health = http(f"{base}/health")
+    finally:
+        stop_server(server)
+        mock.shutdown()
+
+    results = {
+        "tickets": args.tickets,
+        "logs": args.logs,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "attachment_bytes": args.attachment_bytes,
+        "mock_latency": args.mock_latency,
+        "seed": seeded,
+        "scenarios": scenarios,
+        "server": {"peak_rss_kb": memory.get("VmHWM"), "rss_kb": memory.get("VmRSS"),
+                   "health": json.loads(health)},
+    }
+    print(f"Pico de RSS del servidor: {memory.get('VmHWM')} kB")
+    print(f"Resultados en {save_results('run_suite', results, args.output)}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparación con {args.baseline}:")
+        regressions = compare(baseline, results, args.max_regression)
+        if regressions:
+            print(f"Regresiones: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Datos sintéticos para los benchmarks: tickets de los tres tipos, logs y un
+usuario con el que iniciar sesión en la web y en la API.
+
+Es incremental: si la base ya tiene tickets o logs sintéticos solo añade los
+que faltan hasta la cantidad pedida, así que se puede volver a lanzar para
+ampliar la escala sin empezar de cero. Sin --database-url usa DATABASE_URL,
+es decir dev.db.
+
+    python -m benchmarks.seed --tickets 100000 --logs 1000000
+    python -m benchmarks.seed --database-url sqlite:///./bench.db --tickets 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+CHUNK = 50_000
+PREFIX = "BENCH"
+TICKET_TYPES = ["ftth_cliente", "ftth_masivo", "trabajos_programados"]
+STATES = ["abierto", "proceso", "cerrado", "OPENACTIVE", "CLOSEDCLEARED"]
+EVENT_TYPES = ["soap_out", "webhook_in", "ftth_send_report", "ftth_request_info", "retry"]
+BENCH_USER = "bench@ibiocom.local"
+BENCH_PASSWORD = "bench"
+
+
+def ticket_key(i: int) -> str:
+    return f"{PREFIX}-{i:08d}"
+
+
+def seed_tickets(raw, count: int, start: int = 0, span_days: int = 365):
+    """Inserta los tickets start..count-1 repartidos en el último año con executemany por bloques."""
+    first_date = datetime.utcnow() - timedelta(days=span_days)
+    cur = raw.cursor()
+    for offset in range(start, count, CHUNK):
+        rows = []
+        for i in range(offset, min(offset + CHUNK, count)):
+            created = first_date + timedelta(seconds=i * span_days * 86400 // max(count, 1))
+            rows.append((ticket_key(i), f"RED-{i:08d}", random.choice(STATES),
+                         f"Incidencia sintética {i} en CTO {random.randrange(5000)}",
+                         random.choice(TICKET_TYPES), created, created))
+        cur.executemany(
+            "INSERT INTO ticket (primary_key, mirror_key, state, dialog, ticket_type, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        raw.commit()
+
+
+def seed_logs(raw, count: int, tickets: int, start: int = 0, span_days: int = 365):
+    """Inserta logs de tickets aleatorios entre 0 y tickets-1."""
+    first_date = datetime.utcnow() - timedelta(days=span_days)
+    cur = raw.cursor()
+    for offset in range(start, count, CHUNK):
+        rows = []
+        for i in range(offset, min(offset + CHUNK, count)):
+            created = first_date + timedelta(seconds=i * span_days * 86400 // max(count, 1))
+            pk = ticket_key(random.randrange(max(tickets, 1)))
+            rows.append((random.choice(EVENT_TYPES), pk, random.choice(["in", "out"]),
+                         f'{{"primaryKey": "{pk}", "dialog": "Mensaje sintético {i}"}}',
+                         random.choice(["success", "success", "success", "error"]), created))
+        cur.executemany(
+            "INSERT INTO log (event_type, ticket_primary_key, direction, payload, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        raw.commit()
+
+
+def seed_user(engine, email: str = BENCH_USER, password: str = BENCH_PASSWORD):
+    from app.auth.passwords import hash_password
+    with engine.begin() as conn:
+        exists = conn.execute(text('SELECT 1 FROM "user" WHERE email = :e'), {"e": email}).first()
+        if not exists:
+            conn.execute(
+                text('INSERT INTO "user" (email, password_hash, role, created_at) VALUES (:e, :h, :r, :t)'),
+                {"e": email, "h": hash_password(password), "r": "admin", "t": datetime.utcnow()},
+            )
+
+
+def seed(url: str, tickets: int, logs: int, email: str = BENCH_USER, password: str = BENCH_PASSWORD) -> dict:
+    """
+    Aplica las migraciones en la base de url y completa hasta tickets/logs
+    sintéticos. Devuelve cuántos se han añadido y el tiempo empleado.
+    """
+    from app.database import make_engine
+    from app.migrations import run_migrations
+
+    engine = make_engine(url, echo=False)
+    run_migrations(engine)
+    with engine.connect() as conn:
+        have_tickets = conn.execute(
+            text("SELECT COUNT(*) FROM ticket WHERE primary_key LIKE :p"), {"p": f"{PREFIX}-%"}).scalar()
+        have_logs = conn.execute(
+            text("SELECT COUNT(*) FROM log WHERE ticket_primary_key LIKE :p"), {"p": f"{PREFIX}-%"}).scalar()
+
+    start = time.perf_counter()
+    raw = engine.raw_connection()
+    try:
+        seed_tickets(raw, tickets, start=have_tickets)
+        seed_logs(raw, logs, tickets, start=have_logs)
+    finally:
+        raw.close()
+    seed_user(engine, email, password)
+    engine.dispose()
+    return {
+        "tickets_added": max(0, tickets - have_tickets),
+        "logs_added": max(0, logs - have_logs),
+        "seed_seconds": round(time.perf_counter() - start, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Base a sembrar (por defecto DATABASE_URL)")
+    parser.add_argument("--tickets", type=int, default=10_000)
+    parser.add_argument("--logs", type=int, default=100_000)
+    args = parser.parse_args()
+
+    if args.database_url is None:
+        from app.database import DATABASE_URL
+        args.database_url = DATABASE_URL
+    result = seed(args.database_url, args.tickets, args.logs)
+    print(f"{args.database_url}: {result['tickets_added']} tickets y {result['logs_added']} logs añadidos "
+          f"en {result['seed_seconds']}s; usuario {BENCH_USER} / {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Coste del camino SOAP saliente (zeep + XML + HTTP) contra el servidor
+simulado de Adamo arrancado en este mismo proceso.
+
+Mide llamadas individuales con concurrencia acotada y la operación
+multi-valor, y compara la latencia vista por el cliente con la del servidor
+para aislar el coste de serializar y transportar cada mensaje.
+
+    python -m benchmarks.soap_outbound --calls 2000 --concurrency 8 --latency fixed:20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import urllib.request
+
+from app.soap.mock_server import start_in_thread
+from benchmarks.common import summarize, save_results
+
+
+def payload(i: int, attachment_bytes: int) -> dict:
+    data = {
+        "baseTroubleTicketState": "OPENACTIVE",
+        "primaryKey": f"BENCH-{i}",
+        "mirrorKey": f"RED-{i}",
+        "dialog": f"Reporte de prueba {i} " + "x" * 200,
+        "clearancePerson": "ibiocom",
+        "attachments": [],
+    }
+    if attachment_bytes:
+        data["attachments"].append({"mimeType": "application/octet-stream", "name": "adjunto.bin",
+                                    "content": "A" * (attachment_bytes * 4 // 3)})
+    return data
+
+
+def mock_stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats") as response:
+        return json.load(response)
+
+
+def mock_reset(port: int):
+    urllib.request.urlopen(urllib.request.Request(f"http://127.0.0.1:{port}/reset", data=b"", method="POST"))
+
+
+async def run(args, soap) -> dict:
+    results = {}
+    samples: list[float] = []
+    callers = asyncio.Semaphore(args.concurrency)  # sin cola: la latencia medida es la de cada llamada
+
+    async def one(i):
+        async with callers:
+            start = time.perf_counter()
+            result = await soap.aset_trouble_ticket_by_value(payload(i, args.attachment_bytes))
+            samples.append((time.perf_counter() - start) * 1000)
+            return result
+
+    await one(-1)  # cliente y WSDL en caliente
+    samples.clear()
+    mock_reset(args.port)
+    start = time.perf_counter()
+    outcomes = await asyncio.gather(*[one(i) for i in range(args.calls)])
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for o in outcomes if isinstance(o, dict) and o.get("error"))
+    server = mock_stats(args.port)
+    results["single"] = {
+        "calls": args.calls,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 2),
+        "calls_per_second": round(args.calls / elapsed, 1),
+        "client_latency": summarize(samples),
+        "server_latency_ms": server["latency_ms"],
+        "max_in_flight": server["max_in_flight"],
+    }
+
+    mock_reset(args.port)
+    batches = [[payload(i, args.attachment_bytes) for i in range(n, min(n + args.batch_size, args.calls))]
+               for n in range(0, args.calls, args.batch_size)]
+    start = time.perf_counter()
+    await asyncio.gather(*[soap.aset_trouble_tickets_by_values(batch) for batch in batches])
+    elapsed = time.perf_counter() - start
+    server = mock_stats(args.port)
+    results["bulk"] = {
+        "tickets": args.calls,
+        "batch_size": args.batch_size,
+        "calls": server["requests"],
+        "elapsed_seconds": round(elapsed, 2),
+        "tickets_per_second": round(args.calls / elapsed, 1),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8, help="ADAMO_MAX_CONCURRENCY del cliente")
+    parser.add_argument("--latency", default="fixed:20", help="Latencia del servidor simulado")
+    parser.add_argument("--faults", default="")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--attachment-bytes", type=int, default=0, help="Tamaño de un adjunto por mensaje")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    server = start_in_thread(port=0, latency=args.latency, faults=args.faults)
+    args.port = server.server_address[1]
+    # El cliente lee su configuración al importarse; los logs van a una base aparte, no a dev.db
+    scratch = tempfile.mkdtemp(prefix="bench-soap-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(scratch, 'bench.db')}",
+        "ADAMO_WSDL_PRE": f"http://127.0.0.1:{args.port}/?wsdl",
+        "ADAMO_SIMULATE": "false",
+        "ADAMO_MAX_CONCURRENCY": str(args.concurrency),
+        "ADAMO_RATE_LIMIT": "0",
+        "ADAMO_WSDL_CACHE": os.path.join(scratch, "zeep_cache.db"),
+    })
+    from app.database import init_db
+    from app.soap import client as soap
+    init_db()
+
+    results = asyncio.run(run(args, soap))
+    results.update({"latency": args.latency, "faults": args.faults, "concurrency": args.concurrency,
+                    "attachment_bytes": args.attachment_bytes})
+    server.shutdown()
+    soap.shutdown_executor()
+    print(json.dumps(results, indent=2))
+    print(f"Resultados en {save_results('soap_outbound', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Throughput de ingesta: POST /webhook/adamo (una notificación por petición)
+frente a POST /webhook/adamo/batch (array JSON y NDJSON) con el mismo número
+de notificaciones, contra un servidor en marcha.
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.webhook_batch --url http://127.0.0.1:8000 --notifications 10000 --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+from benchmarks.common import HttpConnection, parse_url, summarize, save_results
+
+
+def notifications(prefix: str, count: int) -> list[dict]:
+    return [
+        {"primaryKey": f"{prefix}-{i}", "baseTroubleTicketState": "OPENACTIVE", "dialog": f"Avería masiva {i}"}
+        for i in range(count)
+    ]
+
+
+async def send_all(host, port, requests: list[tuple[str, bytes, str]], concurrency: int) -> tuple[float, list, dict]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    samples: list[float] = []
+    statuses: dict = {}
+
+    async def worker():
+        conn = HttpConnection(host, port)
+        await conn.open()
+        try:
+            while not queue.empty():
+                path, body, content_type = queue.get_nowait()
+                start = time.perf_counter()
+                status, _ = await conn.request("POST", path, body, content_type=content_type)
+                samples.append((time.perf_counter() - start) * 1000)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+        finally:
+            await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - start, samples, statuses
+
+
+async def run(args) -> dict:
+    host, port = parse_url(args.url)
+    run_id = uuid.uuid4().hex[:8]
+    results = {"notifications": args.notifications, "batch_size": args.batch_size, "concurrency": args.concurrency}
+
+    single = [("/webhook/adamo", json.dumps(n).encode("utf-8"), "application/json")
+              for n in notifications(f"SINGLE-{run_id}", args.notifications)]
+
+    items = notifications(f"ARRAY-{run_id}", args.notifications)
+    array = [("/webhook/adamo/batch?ticket_type=ftth_masivo", json.dumps(items[i:i + args.batch_size]).encode("utf-8"),
+              "application/json") for i in range(0, len(items), args.batch_size)]
+
+    items = notifications(f"NDJSON-{run_id}", args.notifications)
+    ndjson = [("/webhook/adamo/batch?ticket_type=ftth_masivo",
+               b"\n".join(json.dumps(n).encode("utf-8") for n in items[i:i + args.batch_size]),
+               "application/x-ndjson") for i in range(0, len(items), args.batch_size)]
+
+    for name, requests in (("single", single), ("batch_array", array), ("batch_ndjson", ndjson)):
+        elapsed, samples, statuses = await send_all(host, port, requests, args.concurrency)
+        results[name] = {
+            "requests": len(requests),
+            "elapsed_seconds": round(elapsed, 2),
+            "notifications_per_second": round(args.notifications / elapsed, 1),
+            "statuses": statuses,
+            "request_latency": summarize(samples),
+        }
+        print(f"{name}: {results[name]['notifications_per_second']} notificaciones/s en {elapsed:.2f}s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--notifications", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"Resultados en {save_results('webhook_batch', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Prueba de carga de POST /webhook/adamo contra un servidor en marcha.
+
+Envía notificaciones desde varias conexiones keep-alive concurrentes mezclando
+tickets nuevos, actualizaciones del mismo ticket y reintentos idénticos (que
+debe absorber la caché de duplicados), y mide throughput y latencias.
+
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.webhook_load --url http://127.0.0.1:8000 --requests 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from benchmarks.common import HttpConnection, parse_url, summarize, save_results
+
+
+def make_notification(run_id: str, i: int, tickets: int, duplicate_ratio: float, last: list) -> dict:
+    if last and random.random() < duplicate_ratio:
+        return random.choice(last)  # reintento idéntico de Adamo
+    notification = {
+        "primaryKey": f"LOAD-{run_id}-{random.randrange(tickets)}",
+        "baseTroubleTicketState": random.choice(["OPENACTIVE", "OPENACTIVE", "CLOSED"]),
+        "dialog": f"Notificación de carga {i}",
+    }
+    last.append(notification)
+    if len(last) > 100:
+        last.pop(0)
+    return notification
+
+
+async def client(host, port, queue: asyncio.Queue, samples: list, statuses: dict):
+    conn = HttpConnection(host, port)
+    await conn.open()
+    try:
+        while True:
+            body = await queue.get()
+            if body is None:
+                return
+            start = time.perf_counter()
+            status, _ = await conn.request("POST", "/webhook/adamo", body)
+            samples.append((time.perf_counter() - start) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        await conn.close()
+
+
+async def run(args) -> dict:
+    host, port = parse_url(args.url)
+    run_id = uuid.uuid4().hex[:8]
+    last: list = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(args.requests):
+        notification = make_notification(run_id, i, args.tickets, args.duplicates, last)
+        queue.put_nowait(json.dumps(notification).encode("utf-8"))
+    for _ in range(args.concurrency):
+        queue.put_nowait(None)
+
+    samples: list[float] = []
+    statuses: dict = {}
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, queue, samples, statuses) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "tickets": args.tickets,
+        "duplicate_ratio": args.duplicates,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "latency": summarize(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--tickets", type=int, default=5000, help="Tickets distintos entre los que se reparten")
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Proporción de reintentos idénticos")
+    parser.add_argument("--output", help="Fichero JSON de resultados")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    print(f"Resultados en {save_results('webhook_load', results, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
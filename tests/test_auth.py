@@ -0,0 +1,93 @@
+from passlib.context import CryptContext
+from sqlmodel import Session, select
+
+from app.auth import users
+from app.models import User
+
+
+def _register(client, email="tecnico@ibiocom.es", password="secreta"):
+    response = client.post("/auth/register", params={"email": email, "password": password})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _login(client, email="tecnico@ibiocom.es", password="secreta"):
+    return client.post("/auth/login", json={"email": email, "password": password})
+
+
+def test_login_returns_a_token_pair(db, client):
+    _register(client)
+    response = _login(client)
+
+    assert response.status_code == 200
+    assert {"access_token", "refresh_token", "token_type", "expires_in"} <= set(response.json())
+    assert _login(client, password="otra").status_code == 401
+    assert _login(client, email="nadie@ibiocom.es").status_code == 401
+
+
+def test_duplicate_registration_is_rejected(db, client):
+    _register(client)
+    response = client.post("/auth/register", params={"email": "tecnico@ibiocom.es", "password": "x"})
+    assert response.status_code == 400
+
+
+def test_user_lookup_is_cached(db, client, monkeypatch):
+    _register(client)
+    assert _login(client).status_code == 200
+
+    queries = []
+    session = users.Session
+
+    def counting_session(*args, **kwargs):
+        queries.append(1)
+        return session(*args, **kwargs)
+    monkeypatch.setattr(users, "Session", counting_session)
+    assert _login(client).status_code == 200
+    assert queries == []
+
+
+def test_hash_with_another_cost_is_upgraded_on_login(db, client):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("secreta")
+    with Session(db) as session:
+        session.add(User(email="antiguo@ibiocom.es", password_hash=old_hash, role="tecnico"))
+        session.commit()
+
+    assert _login(client, email="antiguo@ibiocom.es").status_code == 200
+    with Session(db) as session:
+        stored = session.exec(select(User.password_hash).where(User.email == "antiguo@ibiocom.es")).one()
+    assert stored != old_hash
+    assert stored.startswith("$2b$04$")
+    assert _login(client, email="antiguo@ibiocom.es").status_code == 200
+
+
+def _tokens(client) -> dict:
+    _register(client)
+    return _login(client).json()
+
+
+def test_refresh_token_is_single_use(db, client):
+    tokens = _tokens(client)
+
+    renewed = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert renewed.status_code == 200
+    assert renewed.json()["refresh_token"] != tokens["refresh_token"]
+
+    reused = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert reused.status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": renewed.json()["refresh_token"]}).status_code == 200
+
+
+def test_access_token_is_not_a_refresh_token(db, client):
+    tokens = _tokens(client)
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["access_token"]}).status_code == 401
+
+
+def test_logout_revokes_both_tokens(db, client):
+    tokens = _tokens(client)
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/tickets/", headers=headers).status_code == 200
+
+    response = client.post("/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/tickets/", headers=headers).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
@@ -0,0 +1,149 @@
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import pytest
+import requests
+from zeep.exceptions import ValidationError
+
+from app.soap import breaker as breaker_module
+from app.soap import client as soap_client
+from app.soap.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(breaker_module.time, "monotonic", clock)
+    monkeypatch.setattr(breaker_module, "ADAMO_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(breaker_module, "ADAMO_BREAKER_COOLDOWN", 30)
+    monkeypatch.setattr(breaker_module, "ADAMO_BREAKER_PROBES", 1)
+    return clock
+
+
+def _open(breaker: CircuitBreaker):
+    for _ in range(breaker_module.ADAMO_BREAKER_FAILURES):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(0.1)  # un éxito reinicia la cuenta
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 1
+    assert not breaker.allow()
+    assert breaker.fast_fail()
+    assert breaker.rejected == 2
+
+
+def test_half_open_after_cooldown_allows_limited_probes(clock):
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    _open(breaker)
+
+    clock.now += 29
+    assert breaker.state == OPEN
+    clock.now += 1
+    assert breaker.state == HALF_OPEN
+    assert not breaker.fast_fail()
+    assert breaker.allow()
+    assert not breaker.allow()  # solo ADAMO_BREAKER_PROBES llamadas de prueba
+
+
+def test_successful_probe_closes(clock):
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success(0.2)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cooldown(clock):
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.opened == 2
+    clock.now += 29
+    assert breaker.state == OPEN
+
+
+def test_release_returns_the_probe(clock):
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    _open(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()  # la llamada no llegó a Adamo
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+def test_timeout_adapts_to_p99_within_bounds(monkeypatch):
+    monkeypatch.setattr(breaker_module, "ADAMO_TIMEOUT_MIN", 1)
+    monkeypatch.setattr(breaker_module, "ADAMO_TIMEOUT_FACTOR", 3)
+    breaker = CircuitBreaker("PRE", max_timeout=10)
+    assert breaker.timeout() == 10  # sin muestras suficientes, el máximo
+
+    for _ in range(breaker_module.ADAMO_LATENCY_MIN_SAMPLES):
+        breaker.record_success(0.5)
+    assert breaker.timeout() == 1.5
+    for _ in range(breaker_module.ADAMO_LATENCY_WINDOW):
+        breaker.record_success(0.1)
+    assert breaker.timeout() == 1  # acotado por ADAMO_TIMEOUT_MIN
+
+
+@pytest.fixture
+def adamo(db, monkeypatch):
+    """Cliente zeep falso para el entorno PRE; error es lo que lanza la operación."""
+    monkeypatch.setattr(soap_client, "_simulated", lambda: False)
+    monkeypatch.setitem(soap_client._breakers, "PRE", CircuitBreaker("PRE", max_timeout=10))
+    fake = SimpleNamespace(error=None)
+
+    def operation(**values):
+        raise fake.error
+    client = SimpleNamespace(service=SimpleNamespace(setTroubleTicketByValue=operation),
+                             transport=SimpleNamespace(call_timeout=lambda seconds: nullcontext()))
+    monkeypatch.setitem(soap_client._clients, "PRE", client)
+    return fake
+
+
+def test_transport_errors_open_the_circuit(adamo):
+    adamo.error = requests.exceptions.Timeout("read timeout")
+    for _ in range(breaker_module.ADAMO_BREAKER_FAILURES):
+        result = soap_client.set_trouble_ticket_by_value({"primaryKey": "TT-1"}, "PRE")
+        assert result["type"] == "unknown"
+    assert soap_client.get_breaker("PRE").state == OPEN
+    assert soap_client.set_trouble_ticket_by_value({"primaryKey": "TT-1"}, "PRE")["type"] == "circuit_open"
+
+
+def test_invalid_payloads_do_not_count_against_the_circuit(adamo):
+    adamo.error = ValidationError("Missing element primaryKey")
+    for _ in range(breaker_module.ADAMO_BREAKER_FAILURES * 2):
+        result = soap_client.set_trouble_ticket_by_value({"primaryKey": "TT-1"}, "PRE")
+        assert result["type"] == "invalid_payload"
+    assert soap_client.get_breaker("PRE").state == CLOSED
+
+
+def test_missing_attachment_blob_is_a_local_error(adamo):
+    payload = {"primaryKey": "TT-1", "attachments": [{"sha256": "0" * 64, "name": "foto.jpg"}]}
+    for _ in range(breaker_module.ADAMO_BREAKER_FAILURES * 2):
+        assert soap_client.set_trouble_ticket_by_value(payload, "PRE")["type"] == "invalid_payload"
+    assert soap_client.get_breaker("PRE").stats()["consecutive_failures"] == 0
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from app.models import Log
+from app.services import logger
+from app.services.logger import LogWriter
+
+
+def _row(event_type: str) -> dict:
+    return {"event_type": event_type, "payload": '{"a": 1}', "ticket_primary_key": None, "user_email": None,
+            "direction": "in", "status": "success", "created_at": datetime.utcnow()}
+
+
+def _locked_for(writer: LogWriter, failures: int):
+    """Hace que las primeras inserciones fallen como una base SQLite bloqueada."""
+    insert = writer._insert
+    calls = {"count": 0}
+
+    def flaky(rows, live):
+        calls["count"] += 1
+        if calls["count"] <= failures:
+            raise OperationalError("INSERT INTO log", {}, Exception("database is locked"))
+        return insert(rows, live)
+    writer._insert = flaky
+    return calls
+
+
+def test_locked_database_retries_the_batch(db, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_WRITE_RETRY_DELAY", 0)
+    writer = LogWriter(batch_size=10)
+    _locked_for(writer, failures=2)
+
+    writer._write([_row("locked_1"), _row("locked_2")])
+
+    assert writer.counters["retries"] == 2
+    assert writer.counters["dropped"] == 0
+    with Session(db) as session:
+        stored = session.execute(select(Log.event_type).order_by(Log.id)).scalars().all()
+    assert stored == ["locked_1", "locked_2"]
+
+
+def test_batch_is_dropped_after_the_last_retry(db, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_WRITE_RETRY_DELAY", 0)
+    writer = LogWriter(batch_size=10)
+    calls = _locked_for(writer, failures=logger.LOG_WRITE_RETRIES + 1)
+
+    writer._write([_row("lost")])
+
+    assert calls["count"] == logger.LOG_WRITE_RETRIES + 1
+    assert writer.counters["dropped"] == 1
+    assert writer.counters["errors"] == 1
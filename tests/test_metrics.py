@@ -0,0 +1,61 @@
+import pytest
+
+from app.services import metrics
+from app.services.metrics import Counter, Gauge, Histogram
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registro vacío: las métricas de los tests no aparecen en /metrics."""
+    monkeypatch.setattr(metrics, "_registry", [])
+    return metrics._registry
+
+
+def test_counter_renders_one_sample_per_label_set(registry):
+    counter = Counter("test_events_total", "Eventos", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind='con "comillas"')
+
+    assert metrics.render() == (
+        "# HELP test_events_total Eventos\n"
+        "# TYPE test_events_total counter\n"
+        'test_events_total{kind="a"} 3\n'
+        'test_events_total{kind="con \\"comillas\\""} 1\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    histogram = Histogram("test_seconds", "Duración", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.samples() == [
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1.0"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        "test_seconds_sum 3.65",
+        "test_seconds_count 4",
+    ]
+
+
+def test_collected_values_are_read_at_render_time(registry):
+    state = {"depth": 1}
+    gauge = Gauge("test_depth", "Profundidad", collect=lambda: state["depth"])
+    by_env = Gauge("test_state", "Estado", ("env",), collect=lambda: {"PRE": 0, "PRO": 2})
+    broken = Counter("test_broken_total", "Falla", collect=lambda: 1 / 0)
+
+    state["depth"] = 5
+    assert gauge.samples() == ["test_depth 5"]
+    assert by_env.samples() == ['test_state{env="PRE"} 0', 'test_state{env="PRO"} 2']
+    assert broken.samples() == []
+
+
+def test_http_requests_are_labelled_by_route_template(db, client):
+    client.post("/webhook/adamo", json={"primaryKey": "TT-1"})
+    client.get("/web/tickets/12345")
+
+    body = client.get("/metrics").text
+    assert 'http_requests_total{method="POST",route="/webhook/adamo",status="200"}' in body
+    assert 'route="/web/tickets/{ticket_id}"' in body
+    assert "/web/tickets/12345" not in body
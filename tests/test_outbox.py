@@ -0,0 +1,186 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlmodel import Session
+
+from app.models import OutboxMessage
+from app.services import outbox
+
+
+def _expire(db, *ids):
+    """Adelanta next_attempt_at: el backoff o la reserva ya han pasado."""
+    with Session(db) as session:
+        session.execute(update(OutboxMessage).where(OutboxMessage.id.in_(ids))
+                        .values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+        session.commit()
+
+
+def _claimed_ids(groups) -> list[list[int]]:
+    return [[message.id for message in group] for group in groups]
+
+
+def test_enqueue_is_idempotent_by_key(db):
+    first = outbox.enqueue("retry", {"primaryKey": "TT-1"}, idempotency_key="k-1")
+    second = outbox.enqueue("retry", {"primaryKey": "TT-1", "otro": True}, idempotency_key="k-1")
+    assert second.id == first.id
+    assert [message.id for message in outbox.list_messages()] == [first.id]
+
+
+def test_claim_takes_pending_and_finish_delivers(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+
+    groups = outbox._claim_batch()
+    assert _claimed_ids(groups) == [[message.id]]
+    assert outbox.get_message(message.id).status == "sending"
+    assert outbox._claim_batch() == []
+
+    outbox._finish(groups[0], {"ok": True})
+    delivered = outbox.get_message(message.id)
+    assert (delivered.status, delivered.attempts, delivered.last_error) == ("delivered", 1, None)
+    assert delivered.delivered_at is not None
+
+
+def test_transient_error_goes_back_to_pending_with_backoff(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    outbox._finish(outbox._claim_batch()[0], {"error": "timeout", "type": "unknown"})
+
+    failed = outbox.get_message(message.id)
+    assert (failed.status, failed.attempts, failed.last_error) == ("pending", 1, "timeout")
+    assert failed.next_attempt_at > datetime.utcnow()
+    assert outbox._claim_batch() == []
+
+    _expire(db, message.id)
+    assert _claimed_ids(outbox._claim_batch()) == [[message.id]]
+
+
+def test_permanent_error_goes_to_dead_letter(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    outbox._finish(outbox._claim_batch()[0], {"error": "no existe", "type": "objectNotFoundException"})
+    assert outbox.get_message(message.id).status == "dead"
+
+
+def test_dead_after_max_attempts(db, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    for _ in range(2):
+        _expire(db, message.id)
+        outbox._finish(outbox._claim_batch()[0], {"error": "timeout", "type": "unknown"})
+
+    dead = outbox.get_message(message.id)
+    assert (dead.status, dead.attempts) == ("dead", 2)
+
+
+def test_deferred_error_does_not_spend_an_attempt(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    outbox._finish(outbox._claim_batch()[0], {"error": "circuito abierto", "type": "circuit_open"})
+
+    deferred = outbox.get_message(message.id)
+    assert (deferred.status, deferred.attempts) == ("pending", 0)
+
+
+def test_requeue_revives_a_dead_message(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    outbox._finish(outbox._claim_batch()[0], {"error": "no existe", "type": "objectNotFoundException"})
+
+    outbox.requeue(message.id)
+    assert outbox.get_message(message.id).status == "pending"
+    assert _claimed_ids(outbox._claim_batch()) == [[message.id]]
+
+
+def test_messages_of_a_ticket_are_delivered_in_order(db):
+    first = outbox.enqueue("retry", {"primaryKey": "TT-1", "n": 1})
+    second = outbox.enqueue("retry", {"primaryKey": "TT-1", "n": 2})
+    other = outbox.enqueue("retry", {"primaryKey": "TT-2", "n": 1})
+
+    claimed = _claimed_ids(outbox._claim_batch())
+    assert claimed == [[first.id]]
+    assert _claimed_ids(outbox._claim_batch()) == [[other.id]]
+    # El segundo de TT-1 espera mientras el primero no se haya entregado
+    assert outbox._claim_batch() == []
+
+    outbox._finish([outbox.get_message(first.id)], {"ok": True})
+    assert _claimed_ids(outbox._claim_batch()) == [[second.id]]
+
+
+def test_failed_message_keeps_blocking_its_ticket(db):
+    first = outbox.enqueue("retry", {"primaryKey": "TT-1", "n": 1})
+    second = outbox.enqueue("retry", {"primaryKey": "TT-1", "n": 2})
+    outbox._finish(outbox._claim_batch()[0], {"error": "timeout", "type": "unknown"})
+
+    _expire(db, second.id)
+    assert outbox._claim_batch() == []
+    _expire(db, first.id)
+    assert _claimed_ids(outbox._claim_batch()) == [[first.id]]
+
+
+def test_expired_lease_is_claimed_again(db):
+    message = outbox.enqueue("retry", {"primaryKey": "TT-1"})
+    outbox._claim_batch()
+
+    _expire(db, message.id)  # el worker que lo reservó murió
+    assert _claimed_ids(outbox._claim_batch()) == [[message.id]]
+
+
+def _report(primary_key: str, dialog: str, attachments=()) -> OutboxMessage:
+    return outbox.enqueue("ftth_send_report", {"primaryKey": primary_key, "dialog": dialog,
+                                               "attachments": list(attachments)})
+
+
+def test_consecutive_reports_of_a_ticket_are_coalesced(db):
+    photo = {"sha256": "a" * 64, "name": "foto.jpg"}
+    messages = [_report("TT-1", "uno", [photo]), _report("TT-1", "dos", [photo]), _report("TT-1", "tres")]
+
+    groups = outbox._claim_batch()
+    assert _claimed_ids(groups) == [[m.id for m in messages]]
+
+    payload = outbox.coalesce_payloads("ftth_send_report", [json.loads(m.payload) for m in groups[0]])
+    assert payload["dialog"] == "uno\n\ndos\n\ntres"
+    assert payload["attachments"] == [photo]
+
+    outbox._finish(groups[0], {"ok": True})
+    assert {outbox.get_message(m.id).status for m in messages} == {"delivered"}
+
+
+def test_coalescing_stops_at_a_different_event_type(db):
+    first, second = _report("TT-1", "uno"), _report("TT-1", "dos")
+    resolution = outbox.enqueue("ftth_propose_resolution", {"primaryKey": "TT-1", "rawResolution": "ok"})
+    last = _report("TT-1", "tres")
+
+    groups = outbox._claim_batch()
+    assert _claimed_ids(groups) == [[first.id, second.id]]
+    outbox._finish(groups[0], {"ok": True})
+
+    groups = outbox._claim_batch()
+    assert _claimed_ids(groups) == [[resolution.id]]
+    outbox._finish(groups[0], {"ok": True})
+    assert _claimed_ids(outbox._claim_batch()) == [[last.id]]
+
+
+def test_acks_keep_only_the_last_payload():
+    payloads = [{"troubleTicketKey": {"primaryKey": "TT-1"}, "baseTroubleTicketState": state}
+                for state in ("OPENQUEUED", "OPENACTIVE")]
+    assert outbox.coalesce_payloads("webhook_ack", payloads) == payloads[-1]
+
+
+def test_expired_coalesced_group_is_resent_before_newer_messages(db):
+    messages = [_report("TT-1", "uno"), _report("TT-1", "dos"), _report("TT-1", "tres")]
+    outbox._claim_batch()
+
+    _expire(db, *[m.id for m in messages])  # el worker murió con el grupo reservado
+    newer = _report("TT-1", "cuatro")
+    assert _claimed_ids(outbox._claim_batch()) == [[m.id for m in messages] + [newer.id]]
+
+
+def test_bulk_claim_takes_several_tickets_when_supported(db, monkeypatch):
+    messages = [outbox.enqueue("retry", {"primaryKey": f"TT-{i}"}) for i in range(3)]
+
+    monkeypatch.setattr(outbox, "supports_bulk", lambda env: True)
+    assert _claimed_ids(outbox._claim_batch()) == [[m.id] for m in messages]
+
+
+def test_claim_takes_one_ticket_without_bulk_support(db, monkeypatch):
+    messages = [outbox.enqueue("retry", {"primaryKey": f"TT-{i}"}) for i in range(3)]
+
+    monkeypatch.setattr(outbox, "supports_bulk", lambda env: False)
+    assert _claimed_ids(outbox._claim_batch()) == [[messages[0].id]]
@@ -0,0 +1,23 @@
+from app.auth import passwords
+from app.auth.passwords import BCRYPT_MAX_BYTES, _truncate
+
+
+def test_truncate_counts_utf8_bytes():
+    password = "ñ" * 60  # 120 bytes en UTF-8
+    truncated = _truncate(password)
+    assert len(truncated.encode("utf-8")) <= BCRYPT_MAX_BYTES
+    assert truncated == "ñ" * 36
+
+
+def test_truncate_drops_a_split_character():
+    truncated = _truncate("a" + "€" * 30)  # 1 + 90 bytes: el byte 72 cae dentro de un €
+    assert truncated == "a" + "€" * 23
+    assert _truncate(("a" + "€" * 30).encode("utf-8")) == truncated
+
+
+def test_long_multibyte_password_verifies(monkeypatch):
+    monkeypatch.setattr(passwords, "pwd_context", passwords.CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    password = "contraseña-ñandú-" * 6
+    password_hash = passwords.hash_password(password)
+    assert passwords.verify_and_update(password, password_hash)[0]
+    assert not passwords.verify_and_update("otra", password_hash)[0]
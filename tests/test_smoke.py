@@ -0,0 +1,71 @@
+"""
+Pruebas de humo sobre cada backend de base de datos (ver conftest.db):
+migraciones, upsert del webhook, reserva del outbox y búsqueda de tickets.
+"""
+from sqlalchemy import inspect, text
+from sqlmodel import Session, select
+
+from app.migrations import MIGRATIONS
+from app.models import OutboxMessage, Ticket, TicketStateChange
+from app.services import outbox
+from app.services.ticket_search import search_tickets
+
+
+def test_migrations_create_current_schema(db):
+    tables = set(inspect(db).get_table_names())
+    assert {"ticket", "user", "log", "outboxmessage", "attachment", "ticket_event", "revoked_token",
+            "ticket_state_change", "ticket_state_time"} <= tables
+
+    ticket_columns = {column["name"] for column in inspect(db).get_columns("ticket")}
+    assert "state_changed_at" in ticket_columns
+    assert not ticket_columns & {"local_requests", "local_resolutions", "local_reports"}
+
+    with db.connect() as conn:
+        versions = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    assert versions == {version for version, _, _ in MIGRATIONS}
+
+
+def test_webhook_upsert_updates_ticket_and_queues_ack(db, client):
+    response = client.post("/webhook/adamo", json={"primaryKey": "TT-1", "mirrorKey": "M-1",
+                                                   "baseTroubleTicketState": "OPENQUEUED"})
+    assert response.status_code == 200
+    response = client.post("/webhook/adamo", json={"primaryKey": "TT-1", "baseTroubleTicketState": "OPENACTIVE",
+                                                   "dialog": "en curso"})
+    assert response.status_code == 200
+
+    with Session(db) as session:
+        tickets = session.exec(select(Ticket).where(Ticket.primary_key == "TT-1")).all()
+        assert len(tickets) == 1
+        assert tickets[0].state == "OPENACTIVE"
+        assert tickets[0].dialog == "en curso"
+        changes = session.exec(select(TicketStateChange.to_state).order_by(TicketStateChange.id)).all()
+        assert changes == ["OPENQUEUED", "OPENACTIVE"]
+        acks = session.exec(select(OutboxMessage).where(OutboxMessage.event_type == "webhook_ack")).all()
+        assert len(acks) == 2
+
+
+def test_outbox_claim_and_finish(db):
+    message = outbox.enqueue("ftth_send_report", {"primaryKey": "TT-2", "dialog": "hola"})
+
+    groups = outbox._claim_batch()
+    assert [[m.id for m in group] for group in groups] == [[message.id]]
+    assert outbox.get_message(message.id).status == "sending"
+    assert outbox._claim_batch() == []
+
+    outbox._finish(groups[0], {"status": "ok"})
+    delivered = outbox.get_message(message.id)
+    assert delivered.status == "delivered"
+    assert delivered.attempts == 1
+
+
+def test_search_tickets_by_text(db, client):
+    for primary_key, dialog in (("TT-10", "fibra cortada en la calle Mayor"), ("TT-11", "router sin sincronismo")):
+        client.post("/webhook/adamo", json={"primaryKey": primary_key, "baseTroubleTicketState": "OPENACTIVE",
+                                            "dialog": dialog})
+
+    rows, next_cursor = search_tickets(q="fibra")
+    assert [row.primary_key for row in rows] == ["TT-10"]
+    assert next_cursor is None
+
+    rows, _ = search_tickets(state="OPENACTIVE")
+    assert {row.primary_key for row in rows} == {"TT-10", "TT-11"}
@@ -0,0 +1,18 @@
+from app.services import ticket_stats
+
+
+def test_invalidation_during_compute_is_not_overwritten(db, monkeypatch):
+    compute = ticket_stats._compute_stats
+
+    def racing_compute():
+        value = compute()
+        # Un webhook hace commit e invalida mientras se calculaban las cifras
+        ticket_stats.invalidate_ticket_stats()
+        return value
+    monkeypatch.setattr(ticket_stats, "_compute_stats", racing_compute)
+    ticket_stats.get_ticket_stats()
+    assert ticket_stats._cache["value"] is None
+
+    monkeypatch.setattr(ticket_stats, "_compute_stats", compute)
+    stats = ticket_stats.get_ticket_stats()
+    assert ticket_stats._cache["value"] is stats
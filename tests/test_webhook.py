@@ -0,0 +1,118 @@
+import pytest
+from sqlmodel import Session, select
+
+from app.models import OutboxMessage, Ticket
+
+
+def _notify(client, **fields):
+    return client.post("/webhook/adamo", json={"primaryKey": "TT-1", **fields})
+
+
+def _ticket(db) -> Ticket:
+    with Session(db) as session:
+        return session.exec(select(Ticket).where(Ticket.primary_key == "TT-1")).one()
+
+
+def test_identical_retry_is_answered_as_duplicate(db, client):
+    first = _notify(client, baseTroubleTicketState="OPENQUEUED")
+    retry = _notify(client, baseTroubleTicketState="OPENQUEUED")
+
+    assert first.status_code == retry.status_code == 200
+    assert "duplicate" not in first.json()
+    assert retry.json() == {**first.json(), "duplicate": True}
+
+
+def test_a_b_a_change_is_applied_again(db, client):
+    _notify(client, baseTroubleTicketState="OPENQUEUED", dialog="a")
+    _notify(client, baseTroubleTicketState="OPENACTIVE", dialog="b")
+    response = _notify(client, baseTroubleTicketState="OPENQUEUED", dialog="a")
+
+    assert "duplicate" not in response.json()
+    ticket = _ticket(db)
+    assert (ticket.state, ticket.dialog) == ("OPENQUEUED", "a")
+
+
+def test_batch_invalidates_the_last_single_notification(db, client):
+    _notify(client, dialog="a")
+    client.post("/webhook/adamo/batch", json=[{"primaryKey": "TT-1", "dialog": "b"}])
+    response = _notify(client, dialog="a")
+
+    assert "duplicate" not in response.json()
+    assert _ticket(db).dialog == "a"
+
+
+def test_ticket_and_ack_are_saved_together(db, client):
+    response = _notify(client, mirrorKey="M-1", baseTroubleTicketState="OPENACTIVE")
+
+    with Session(db) as session:
+        ack = session.get(OutboxMessage, response.json()["delivery_id"])
+    assert ack.event_type == "webhook_ack"
+    assert ack.ticket_primary_key == "TT-1"
+    assert _ticket(db).mirror_key == "M-1"
+
+
+@pytest.mark.parametrize("body, detail", [
+    ([{"primaryKey": "TT-1"}], "La notificación debe ser un objeto JSON"),
+    ("TT-1", "La notificación debe ser un objeto JSON"),
+    ({}, "primaryKey es requerido"),
+    ({"primaryKey": 7}, "primaryKey es requerido"),
+    ({"primaryKey": "TT-1", "dialog": 3}, "dialog debe ser texto"),
+])
+def test_invalid_notifications_are_rejected(db, client, body, detail):
+    response = client.post("/webhook/adamo", json=body)
+    assert response.status_code == 400
+    assert response.json()["detail"] == detail
+
+
+def test_malformed_json_is_rejected(db, client):
+    response = client.post("/webhook/adamo", content=b"{no", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+
+
+def test_batch_saves_valid_notifications_and_reports_errors(db, client):
+    response = client.post("/webhook/adamo/batch", json=[
+        {"primaryKey": "TT-1", "baseTroubleTicketState": "OPENQUEUED"},
+        {"dialog": "sin clave"},
+        {"primaryKey": "TT-2", "baseTroubleTicketState": "OPENACTIVE"},
+    ])
+
+    body = response.json()
+    assert (body["received"], body["accepted"], body["rejected"]) == (3, 2, 1)
+    assert [result["status"] for result in body["results"]] == ["ok", "error", "ok"]
+    assert body["results"][1] == {"index": 1, "status": "error", "detail": "primaryKey es requerido"}
+    with Session(db) as session:
+        assert len(session.exec(select(Ticket)).all()) == 2
+        assert len(session.exec(select(OutboxMessage).where(OutboxMessage.event_type == "webhook_ack")).all()) == 2
+
+
+def test_batch_accepts_ndjson_with_invalid_lines(db, client):
+    lines = b'{"primaryKey": "TT-1"}\n\nno es json\n{"primaryKey": "TT-2"}'
+    response = client.post("/webhook/adamo/batch", content=lines, headers={"content-type": "application/x-ndjson"})
+
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["ok", "error", "ok"]
+    assert results[1]["detail"] == "JSON inválido"
+
+
+def test_batch_repeated_ticket_keeps_the_last_notification(db, client):
+    client.post("/webhook/adamo/batch", json=[
+        {"primaryKey": "TT-1", "dialog": "primero"},
+        {"primaryKey": "TT-1", "dialog": "último"},
+    ])
+    assert _ticket(db).dialog == "último"
+
+
+def test_batch_rejects_a_non_array_body(db, client):
+    response = client.post("/webhook/adamo/batch", json={"primaryKey": "TT-1"})
+    assert response.status_code == 400
+
+
+def test_batch_size_is_limited(db, client, monkeypatch):
+    from app.routes import webhook
+    monkeypatch.setattr(webhook, "WEBHOOK_BATCH_MAX_ITEMS", 2)
+    notifications = [{"primaryKey": f"TT-{i}"} for i in range(3)]
+
+    assert client.post("/webhook/adamo/batch", json=notifications).status_code == 413
+    ndjson = "\n".join(f'{{"primaryKey": "TT-{i}"}}' for i in range(3)).encode()
+    response = client.post("/webhook/adamo/batch", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 413